@@ -1,53 +1,77 @@
 from decimal import Decimal
 from typing import Dict, List, Union
 
-from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from cart.forms import CartAddProductForm
+from cart.storage import get_cart_storage
+from shop import inventory
 from shop.models import Product
 
+# поля товара, которые нужны корзине и оформлению заказа
+PRODUCT_FIELDS = ('id', 'id_category', 'title', 'author', 'price', 'quantity', 'image')
 
-class Cart:
-    def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get(settings.CART_ID)
-        if not cart:
-            cart = self.session[settings.CART_ID] = {}
-        self.cart = cart
 
-    def get_cart_total_price(self, cart_items: List[Dict[str, Union[str, int, Decimal]]]) -> Decimal:
-        return sum(Decimal(item['total_price']) for item in cart_items)
+class CartLine:
+    """
+    Строка корзины: товар, количество, цена на момент добавления и стоимость строки.
+    """
+    __slots__ = ('product', 'quantity', 'price', 'total_price')
+
+    def __init__(self, product: Product, quantity: int, price: Decimal):
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+        self.total_price = price * quantity
 
-    def get_cart_items_with_products(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart_items = []
 
-        for product in products:
-            cart_item = self.cart[str(product.id)]
-            cart_item['product'] = product
-            cart_item['total_price'] = Decimal(cart_item['price']) * cart_item['quantity']
-            cart_item['update_quantity_form'] = CartAddProductForm(initial={'quantity': cart_item['quantity']})
-            cart_items.append(cart_item)
+class Cart:
+    """Корзина текущего запроса. Где она хранится — в cookie, кэше или сессии — решает
+    хранилище из SHOP_CART_STORAGE (cart/storage.py); записывают его только методы, меняющие корзину.
+    В хранилище лежит только {id товара: [количество, цена]}, строки с товарами строятся при чтении.
+    При SHOP_STOCK_RESERVATIONS количество в корзине резервируется (shop/inventory.py) до изменения
+    корзины; если товара не хватает — InsufficientStock, и корзина не меняется."""
+
+    def __init__(self, request):
+        self.storage = get_cart_storage(request)
 
-        return cart_items
+    @property
+    def cart(self) -> Dict[str, List[Union[int, str]]]:
+        return self.storage.items
+
+    def get_cart_items_with_products(self) -> List[CartLine]:
+        """
+        Строки корзины с товарами — один запрос на запрос пользователя, результат общий
+        для всех экземпляров Cart, пока корзина не изменится. Товары, удаленные из каталога,
+        убираются из корзины, чтобы ее сумма и количество совпадали с показанными строками.
+        """
+        if self.storage.lines is None:
+            products = Product.objects.filter(id__in=self.cart.keys()).only(*PRODUCT_FIELDS).order_by('id')
+            lines = [
+                CartLine(product, self.cart[str(product.id)][0], Decimal(self.cart[str(product.id)][1]))
+                for product in products
+            ]
+            if len(lines) < len(self.cart):
+                found = {str(line.product.id) for line in lines}
+                self.storage.update({product_id: item for product_id, item in self.cart.items() if product_id in found})
+            self.storage.lines = lines
+        return self.storage.lines
 
     def add_to_cart(self, product_id: int, quantity: int, overwrite_qty: bool = False) -> None:
         """
         Добавляет товар в корзину или обновляет его количество, если товар уже в корзине.
         """
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.only('price'), id=product_id)
         product_id = str(product_id)
+        if not overwrite_qty and product_id in self.cart:
+            quantity += self.cart[product_id][0]
+        if inventory.reservations_enabled():
+            inventory.reserve_stock(self.storage.key, product.id, quantity)
 
         if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
+            self.cart[product_id] = [0, str(product.price)]
+        self.cart[product_id][0] = quantity
 
-        if overwrite_qty:
-            self.cart[product_id]['quantity'] = quantity
-        else:
-            self.cart[product_id]['quantity'] += quantity
-
-        self.session.modified = True
+        self.storage.update(self.cart)
 
     def remove_from_cart(self, product_id: int) -> None:
         """
@@ -56,29 +80,81 @@ class Cart:
         product_id = str(product_id)
 
         if product_id in self.cart:
+            if inventory.reservations_enabled():
+                inventory.release_reservations(self.storage.key, [int(product_id)])
             del self.cart[product_id]
-            self.session.modified = True
+            self.storage.update(self.cart)
+
+    def update_quantities(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        Задает количество сразу нескольким товарам (0 — удалить из корзины). Цены новых товаров
+        читаются одним запросом. Если каких-то товаров нет в каталоге, корзина не меняется,
+        а их id возвращаются.
+        """
+        new_ids = [product_id for product_id, quantity in quantities.items()
+                   if quantity and str(product_id) not in self.cart]
+        prices = dict(Product.objects.filter(id__in=new_ids).values_list('id', 'price')) if new_ids else {}
+        missing = [product_id for product_id in new_ids if product_id not in prices]
+        if missing:
+            return missing
+        if inventory.reservations_enabled():
+            self._reserve(quantities)
+
+        for product_id, quantity in quantities.items():
+            key = str(product_id)
+            if not quantity:
+                self.cart.pop(key, None)
+            elif key in self.cart:
+                self.cart[key][0] = quantity
+            else:
+                self.cart[key] = [quantity, str(prices[product_id])]
+        self.storage.update(self.cart)
+        return []
 
     def clear_cart(self) -> None:
         """
         Очищает корзину.
         """
-        self.session[settings.CART_ID] = {}
-        self.session.modified = True
+        if inventory.reservations_enabled() and self.cart:
+            inventory.release_reservations(self.storage.key)
+        self.storage.update({})
+
+    def _reserve(self, quantities: Dict[int, int]) -> None:
+        """Резервирует все количества или, если чего-то не хватает, ни одного."""
+        with transaction.atomic():
+            for product_id, quantity in sorted(quantities.items()):
+                if quantity:
+                    inventory.reserve_stock(self.storage.key, product_id, quantity)
+            removed = [product_id for product_id, quantity in quantities.items() if not quantity]
+            if removed:
+                inventory.release_reservations(self.storage.key, removed)
+
+    def get_reservation_key(self) -> str:
+        """
+        Ключ резервов корзины для оформления заказа (shop.inventory.take_stock).
+        """
+        return self.storage.key if inventory.reservations_enabled() else None
 
-    def get_cart(self) -> Dict[str, Dict[str, Union[str, int]]]:
+    def get_cart(self) -> Dict[str, List[Union[int, str]]]:
         """
-        Возвращает корзину из сессии или пустой словарь, если ее нет.
+        Возвращает позиции корзины {id товара: [количество, цена]} или пустой словарь, если ее нет.
         """
-        return self.session.get(settings.CART_ID, {})
+        return self.cart
+
+    def get_total_price(self) -> Decimal:
+        """
+        Сумма корзины, сохраненная вместе с ней: без запросов к базе и разбора позиций.
+        """
+        return self.storage.total
+
+    def get_total_quantity(self) -> int:
+        """
+        Количество экземпляров всех товаров в корзине.
+        """
+        return sum(quantity for quantity, _ in self.cart.values())
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        for product in products:
-            self.cart[str(product.id)]['product'] = product
-
-        for item in self.cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        return iter(self.get_cart_items_with_products())
+
+    def __len__(self):
+        return len(self.cart)
@@ -9,4 +9,8 @@ class CartAddProductForm(forms.Form):
             'class': 'form-control text-center px-3',
             'value': 1
         })
-    )
\ No newline at end of file
+    )
+
+class CartQuantityForm(forms.Form):
+    """Количество товара для JSON API корзины: 0 убирает товар из корзины."""
+    quantity = forms.IntegerField(min_value=0, max_value=10000)
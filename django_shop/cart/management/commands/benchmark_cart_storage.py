@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Product
+
+STORAGES = {
+    'session': 'cart.storage.SessionCartStorage',
+    'cookie': 'cart.storage.SignedCookieCartStorage',
+    'cache': 'cart.storage.CacheCartStorage',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает хранилища корзины на анонимном просмотре каталога: запросов в секунду '
+            'и записей в django_session. Каждый посетитель — новый клиент без cookie.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--visitors', type=int, default=50, help='Количество анонимных посетителей')
+        parser.add_argument('--pages', type=int, default=5, help='Страниц товаров на посетителя')
+        parser.add_argument('--storage', choices=sorted(STORAGES), action='append',
+                            help='Какие хранилища сравнивать (по умолчанию все)')
+        parser.add_argument('--no-page-cache', action='store_true',
+                            help='Отключить кэш страниц, чтобы каждая страница рендерилась заново')
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.select_related('id_category').order_by('pk')[:options['pages']])
+        if not products:
+            raise CommandError('В каталоге нет товаров')
+        urls = [reverse('shop:product_list')] + [product.get_absolute_url() for product in products]
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'testserver'
+
+        for name in options['storage'] or sorted(STORAGES):
+            overrides = {'SHOP_CART_STORAGE': STORAGES[name]}
+            if options['no_page_cache']:
+                overrides['SHOP_PAGE_CACHE'] = False
+            with override_settings(**overrides):
+                sessions_before = Session.objects.count()
+                times, session_writes = [], 0
+                for _ in range(options['visitors']):
+                    client = Client(HTTP_HOST=host)
+                    for url in urls:
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            response = client.get(url)
+                            times.append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            raise CommandError(f'{url}: HTTP {response.status_code}')
+                        session_writes += sum(
+                            1 for query in queries.captured_queries
+                            if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT'))
+                created = Session.objects.count() - sessions_before
+            times_ms = sorted(t * 1000 for t in times)
+            p95 = times_ms[int(len(times_ms) * 0.95) - 1]
+            self.stdout.write(f'{name}: {len(times) / sum(times):.0f} запросов/с, медиана {statistics.median(times_ms):.2f} мс, '
+                              f'p95 {p95:.2f} мс, записей в django_session {session_writes}, новых сессий {created}')
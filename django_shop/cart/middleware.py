@@ -0,0 +1,16 @@
+from .storage import REQUEST_ATTRIBUTE
+
+
+class CartMiddleware:
+    """Дает хранилищу корзины (cart/storage.py) записать изменения в ответ, например обновить cookie.
+    Хранилище создается только при обращении к корзине, остальные запросы middleware не затрагивает."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        storage = getattr(request, REQUEST_ATTRIBUTE, None)
+        if storage is not None:
+            storage.process_response(response)
+        return response
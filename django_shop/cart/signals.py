@@ -0,0 +1,13 @@
+from django.contrib.auth.signals import user_logged_out
+from django.dispatch import receiver
+
+from .cart_services import Cart
+
+
+@receiver(user_logged_out)
+def clear_cart_on_logout(sender, request, user, **kwargs):
+    """Корзина в cookie или кэше переживает выход пользователя, поэтому очищаем ее явно,
+    как прежде она пропадала вместе с сессией."""
+    cart = Cart(request)
+    if len(cart):
+        cart.clear_cart()
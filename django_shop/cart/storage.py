@@ -0,0 +1,250 @@
+"""Хранилища корзины (за API Cart из cart/cart_services.py).
+
+Раньше корзина всегда лежала в сессии, а Cart при каждом создании записывал в нее пустой словарь,
+поэтому любой просмотр страницы анонимом (контекстный процессор создает Cart) сохранял сессию —
+INSERT/UPDATE в django_session на каждый запрос. Теперь хранилище выбирается настройкой
+SHOP_CART_STORAGE и пишет только тогда, когда корзину меняют:
+- SignedCookieCartStorage — корзина в подписанной cookie, база и сессии не нужны вовсе;
+  подходит для обычных корзин (cookie ограничена ~4 КБ);
+- CacheCartStorage — корзина в кэше (SHOP_CART_CACHE_ALIAS), в cookie только случайный ключ;
+  кэш должен быть общим для всех воркеров и не вытеснять корзины (Redis, а не LocMemCache);
+- SessionCartStorage — прежний вариант в сессии Django.
+
+Позиции хранятся компактно — {id товара: [количество, цена на момент добавления]}, без товаров,
+Decimal и форм. Вместе с позициями хранится итоговая сумма, поэтому контекстный процессор показывает ее,
+не разбирая позиции и не обращаясь к базе. Cookie выставляет на ответ CartMiddleware.
+Резервы остатков (shop/inventory.py) привязаны к случайному ключу корзины, который хранится вместе с позициями.
+
+Корзины, оставшиеся в сессии от SessionCartStorage, cookie- и кэш-хранилища при первом чтении переносят к себе.
+При выходе пользователя корзина очищается (cart/signals.py) — как раньше, когда она пропадала вместе с сессией.
+"""
+import secrets
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEFAULT_STORAGE = 'cart.storage.SignedCookieCartStorage'
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 30
+REQUEST_ATTRIBUTE = '_cart_storage'
+
+
+def get_cart_max_age():
+    return getattr(settings, 'SHOP_CART_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def get_cart_storage(request):
+    """Хранилище корзины запроса — одно на запрос, чтобы изменения видели все экземпляры Cart."""
+    storage = getattr(request, REQUEST_ATTRIBUTE, None)
+    if storage is None:
+        storage_class = import_string(getattr(settings, 'SHOP_CART_STORAGE', DEFAULT_STORAGE))
+        storage = storage_class(request)
+        setattr(request, REQUEST_ATTRIBUTE, storage)
+    return storage
+
+
+def cart_total(items):
+    return sum((Decimal(price) * quantity for quantity, price in items.values()), Decimal(0))
+
+
+def compact_items(items):
+    """Принимает и корзины, сохраненные в прежнем виде {'quantity': ..., 'price': ...}."""
+    return {product_id: [item['quantity'], item['price']] if isinstance(item, dict) else item
+            for product_id, item in items.items()}
+
+
+class BaseCartStorage(ABC):
+    """Позиции корзины {id товара (str): [количество, цена строкой]}, их сумма и ключ резервов корзины.
+    Наследник читает сохраненные данные в load() и записывает их в save().
+    В lines Cart кэширует строки корзины с товарами до конца запроса или до изменения корзины."""
+
+    def __init__(self, request):
+        self.request = request
+        self._items = None
+        self._total = None
+        self._key = None
+        self.lines = None
+
+    @abstractmethod
+    def load(self):
+        """Возвращает (позиции, сумма строкой, ключ) или (None, None, None), если корзины нет."""
+
+    @abstractmethod
+    def save(self, items, total, key):
+        """Записывает позиции, сумму и ключ; пустые позиции означают, что корзину нужно удалить."""
+
+    def _load(self):
+        if self._items is None:
+            items, total, key = self.load()
+            migrated = not items and self._load_from_session()
+            if migrated:
+                items, total, key = migrated
+            self._items = compact_items(items or {})
+            self._total = Decimal(total) if total is not None else cart_total(self._items)
+            self._key = key
+            if migrated:
+                self.save(self._items, str(self._total), self._key)
+
+    def _load_from_session(self):
+        """Забирает корзину, сохраненную в сессии SessionCartStorage (до смены SHOP_CART_STORAGE).
+        Сессия читается, только если у посетителя есть ее cookie."""
+        session = getattr(self.request, 'session', None)
+        if session is None or not session.session_key:
+            return None
+        legacy = SessionCartStorage(self.request)
+        items, total, key = legacy.load()
+        if not items:
+            return None
+        legacy.save({}, None, None)
+        return items, total, key
+
+    @property
+    def items(self):
+        self._load()
+        return self._items
+
+    @property
+    def total(self):
+        self._load()
+        return self._total
+
+    @property
+    def key(self):
+        """Ключ корзины для резервов остатков; создается при первом обращении и сохраняется
+        со следующим изменением корзины."""
+        self._load()
+        if self._key is None:
+            self._key = secrets.token_urlsafe(16)
+        return self._key
+
+    def update(self, items):
+        """Сохраняет измененные позиции и пересчитывает сумму. У пустой корзины ключа нет."""
+        self._items = items
+        self._total = cart_total(items)
+        if not items:
+            self._key = None
+        self.lines = None
+        self.save(items, str(self._total), self._key)
+
+    def process_response(self, response):
+        """Вызывается CartMiddleware перед отдачей ответа."""
+
+
+class SessionCartStorage(BaseCartStorage):
+    """Корзина в сессии Django. Пустая корзина в сессию не записывается."""
+
+    @property
+    def total_key(self):
+        return f'{settings.CART_ID}_total'
+
+    @property
+    def key_key(self):
+        return f'{settings.CART_ID}_key'
+
+    def _load_from_session(self):
+        return None
+
+    def load(self):
+        session = self.request.session
+        return session.get(settings.CART_ID), session.get(self.total_key), session.get(self.key_key)
+
+    def save(self, items, total, key):
+        session = self.request.session
+        if items:
+            session[settings.CART_ID] = items
+            session[self.total_key] = total
+            if key:
+                session[self.key_key] = key
+        else:
+            session.pop(settings.CART_ID, None)
+            session.pop(self.total_key, None)
+            session.pop(self.key_key, None)
+
+
+class SignedCookieCartStorage(BaseCartStorage):
+    """Корзина в cookie, подписанной SECRET_KEY (signing.dumps со сжатием): подделать цену нельзя,
+    а прочитать корзину можно без обращения к базе и сессии."""
+    salt = 'cart.storage.SignedCookieCartStorage'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.modified = False
+
+    @property
+    def cookie_name(self):
+        return getattr(settings, 'SHOP_CART_COOKIE_NAME', settings.CART_ID)
+
+    def load(self):
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return None, None, None
+        try:
+            data = signing.loads(value, salt=self.salt, max_age=get_cart_max_age())
+        except signing.BadSignature:
+            return None, None, None
+        return data.get('items'), data.get('total'), data.get('key')
+
+    def save(self, items, total, key):
+        self.modified = True
+
+    def process_response(self, response):
+        if not self.modified:
+            return
+        if self._items:
+            data = {'items': self._items, 'total': str(self._total)}
+            if self._key:
+                data['key'] = self._key
+            value = signing.dumps(data, salt=self.salt, compress=True)
+            set_cart_cookie(response, self.cookie_name, value)
+        else:
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+
+
+class CacheCartStorage(BaseCartStorage):
+    """Корзина в кэше под случайным ключом из cookie. Cookie выставляется при первом изменении
+    корзины, так что анонимные просмотры ничего не пишут ни в кэш, ни в cookie."""
+    key_prefix = 'cart:'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_key = request.COOKIES.get(self.cookie_name)
+        self.new_key = False
+
+    @property
+    def cookie_name(self):
+        return getattr(settings, 'SHOP_CART_COOKIE_NAME', settings.CART_ID)
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SHOP_CART_CACHE_ALIAS', 'default')]
+
+    def load(self):
+        data = self.cache.get(self.key_prefix + self.cart_key) if self.cart_key else None
+        if not data:
+            return None, None, None
+        return data['items'], data['total'], data.get('key')
+
+    def save(self, items, total, key):
+        if not items:
+            if self.cart_key:
+                self.cache.delete(self.key_prefix + self.cart_key)
+            return
+        if not self.cart_key:
+            self.cart_key = secrets.token_urlsafe(24)
+            self.new_key = True
+        self.cache.set(self.key_prefix + self.cart_key, {'items': items, 'total': total, 'key': key},
+                       get_cart_max_age())
+
+    def process_response(self, response):
+        if self.new_key:
+            set_cart_cookie(response, self.cookie_name, self.cart_key)
+
+
+def set_cart_cookie(response, name, value):
+    response.set_cookie(
+        name, value, max_age=get_cart_max_age(), httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
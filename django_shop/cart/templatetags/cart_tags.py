@@ -0,0 +1,12 @@
+from django import template
+
+from cart.cart_services import Cart
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cart_quantity(context):
+    """Количество товаров в корзине для счетчика в шапке: берется из сохраненной корзины, без запросов к товарам."""
+    request = context.get('request')
+    return Cart(request).get_total_quantity() if request is not None else 0
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import inventory
+from shop.models import Product, StockReservation
+from shop.testing import CatalogTestCase, create_buyer
+
+from .cart_services import Cart
+from .storage import BaseCartStorage, SignedCookieCartStorage
+
+
+class CartTestCase(CatalogTestCase):
+    def add(self, product, quantity=1):
+        return self.client.post(f'/cart/api/add/{product.pk}/', {'quantity': quantity})
+
+    def cart(self):
+        """Cart нового запроса с cookie тестового клиента."""
+        request = RequestFactory().get('/')
+        request.COOKIES.update({name: morsel.value for name, morsel in self.client.cookies.items()})
+        return Cart(request)
+
+
+class CartStorageChecks:
+    """Общие проверки хранилищ; тестовые классы задают SHOP_CART_STORAGE."""
+
+    def summary(self):
+        return self.client.get(reverse('cart:api_summary')).json()['cart']
+
+    def test_round_trip(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        self.assertEqual(self.summary(), {'count': 2, 'quantity': 3, 'total_price': '400.00'})
+
+    def test_logout_clears_cart(self):
+        self.client.force_login(create_buyer())
+        self.add(self.products[0])
+        self.client.get(reverse('users:logout'))
+        self.assertEqual(self.summary()['count'], 0)
+
+
+@override_settings(SHOP_CART_STORAGE='cart.storage.SignedCookieCartStorage')
+class SignedCookieCartStorageTests(CartStorageChecks, CartTestCase):
+    def test_tampered_cookie_is_ignored(self):
+        self.add(self.products[0])
+        cookie = self.client.cookies[SignedCookieCartStorage(None).cookie_name]
+        cookie.set(cookie.key, cookie.value[:-2] + 'xx', cookie.coded_value[:-2] + 'xx')
+        self.assertEqual(self.summary()['count'], 0)
+
+    def test_session_cart_is_moved_to_cookie(self):
+        with self.settings(SHOP_CART_STORAGE='cart.storage.SessionCartStorage'):
+            self.add(self.products[0], 2)
+        self.assertEqual(self.summary()['quantity'], 2)
+        self.assertIn(SignedCookieCartStorage(None).cookie_name, self.client.cookies)
+        self.assertNotIn(settings.CART_ID, self.client.session)
+
+
+@override_settings(SHOP_CART_STORAGE='cart.storage.SessionCartStorage')
+class SessionCartStorageTests(CartStorageChecks, CartTestCase):
+    def test_base_storage_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BaseCartStorage(None)
+
+
+class DeletedProductTests(CartTestCase):
+    def test_lines_prune_deleted_products(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        self.products[1].delete()
+        cart = self.cart()
+        lines = cart.get_cart_items_with_products()
+        self.assertEqual([line.product.pk for line in lines], [self.products[0].pk])
+        self.assertEqual(len(cart), 1)
+        self.assertEqual(cart.get_total_quantity(), 2)
+        self.assertEqual(cart.get_total_price(), Decimal(200))
+
+
+class CartAddViewTests(CartTestCase):
+    def test_invalid_quantity_redirects_to_cart(self):
+        response = self.client.post(f'/cart/add/{self.products[0].pk}/', {})
+        self.assertRedirects(response, reverse('cart:cart_detail'), fetch_redirect_response=False)
+        self.assertEqual(len(self.cart()), 0)
+
+
+@override_settings(SHOP_STOCK_RESERVATIONS=True, SHOP_STOCK_RESERVATION_TTL=600)
+class StockReservationTests(CartTestCase):
+    def setUp(self):
+        self.product = self.products[0]
+        Product.objects.filter(pk=self.product.pk).update(quantity=3)
+        self.other = Client()
+
+    def test_reserved_stock_is_unavailable_to_other_carts(self):
+        self.assertEqual(self.add(self.product, 2).status_code, 200)
+        self.assertEqual(inventory.available_stock(self.product.pk), 1)
+
+        response = self.other.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 2})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['products'], [self.product.title])
+        self.assertEqual(self.other.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 1}).status_code, 200)
+        self.assertEqual(inventory.available_stock(self.product.pk), 0)
+
+        self.client.post(f'/cart/api/remove/{self.product.pk}/')
+        self.assertEqual(inventory.available_stock(self.product.pk), 2)
+
+    def test_expired_reservations_stop_counting_and_are_swept(self):
+        self.add(self.product, 3)
+        self.other.post(f'/cart/api/add/{self.products[1].pk}/', {'quantity': 1})
+        StockReservation.objects.filter(product=self.product).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(inventory.available_stock(self.product.pk), 3)
+        self.assertEqual(self.other.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 3}).status_code, 200)
+        self.assertEqual(inventory.sweep_reservations(batch_size=1), 1)
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+    def test_checkout_uses_own_reservation(self):
+        self.add(self.product, 2)
+        self.other.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 1})
+        key = self.cart().get_reservation_key()
+
+        with self.assertRaises(inventory.InsufficientStock), transaction.atomic():
+            inventory.take_stock({self.product.pk: 2})
+        with transaction.atomic():
+            inventory.take_stock({self.product.pk: 2}, reservation_key=key)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).quantity, 1)
+        self.assertFalse(StockReservation.objects.filter(key=key).exists())
+        self.assertEqual(inventory.available_stock(self.product.pk), 0)
@@ -7,4 +7,9 @@ urlpatterns = [
     path('', CartDetailView.as_view(), name='cart_detail'),
     path('add/<int:product_id>/', CartAddView.as_view(), name='cart_add'),
     path('remove/<int:product_id>/', CartRemoveView.as_view(), name='cart_remove'),
+    path('api/', CartApiSummaryView.as_view(), name='api_summary'),
+    path('api/add/<int:product_id>/', CartApiAddView.as_view(), name='api_add'),
+    path('api/set/<int:product_id>/', CartApiSetView.as_view(), name='api_set'),
+    path('api/remove/<int:product_id>/', CartApiRemoveView.as_view(), name='api_remove'),
+    path('api/update/', CartApiUpdateView.as_view(), name='api_update'),
 ]
@@ -1,8 +1,12 @@
+import json
+from decimal import Decimal
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect
 from django.views import View
-from .forms import CartAddProductForm
+from .forms import CartAddProductForm, CartQuantityForm
 from .cart_services import Cart
-from django.shortcuts import render
+from shop.inventory import InsufficientStock
 from django.contrib import messages
 
 
@@ -10,8 +14,8 @@ class CartDetailView(View):
     def get(self, request):
         cart = Cart(request)
         cart_items = cart.get_cart_items_with_products()
-        cart_total_price = cart.get_cart_total_price(cart_items)
-        all_products_available = all(item['product'].quantity >= item['quantity'] for item in cart_items)
+        cart_total_price = cart.get_total_price()
+        all_products_available = all(item.product.quantity >= item.quantity for item in cart_items)
         context = {
             'cart': cart_items,
             'cart_total_price': cart_total_price,
@@ -26,8 +30,13 @@ class CartAddView(View):
         form = CartAddProductForm(request.POST)
         if form.is_valid():
             cd = form.cleaned_data
-            cart.add_to_cart(product_id, cd['quantity'], request.POST.get('overwrite_qty'))
-            return redirect('cart:cart_detail')
+            try:
+                cart.add_to_cart(product_id, cd['quantity'], request.POST.get('overwrite_qty'))
+            except InsufficientStock as error:
+                messages.error(request, str(error))
+        else:
+            messages.error(request, 'Некорректное количество товара.')
+        return redirect('cart:cart_detail')
 
 
 class CartRemoveView(View):
@@ -37,3 +46,125 @@ class CartRemoveView(View):
         return redirect('cart:cart_detail')
 
 
+# JSON API корзины: фронтенд (frontend/src/cart.js) меняет корзину без перезагрузки страницы
+# и обновляет счетчик в шапке и итоги по одному ответу. Данные — JSON или обычная форма,
+# CSRF-токен передается в заголовке X-CSRFToken.
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _line_data(cart, product_id):
+    """Строка корзины по сохраненным данным (без запроса к базе) или None, если товара в корзине нет."""
+    item = cart.get_cart().get(str(product_id))
+    if item is None:
+        return None
+    quantity, price = item
+    return {
+        'product_id': product_id,
+        'quantity': quantity,
+        'price': price,
+        'total_price': str(Decimal(price) * quantity),
+    }
+
+
+def _summary_data(cart):
+    return {
+        'count': len(cart),
+        'quantity': cart.get_total_quantity(),
+        'total_price': str(cart.get_total_price()),
+    }
+
+
+def _error(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+class CartApiSummaryView(View):
+    """Итоги корзины и ее строки с сохраненными ценами."""
+
+    def get(self, request):
+        cart = Cart(request)
+        lines = [_line_data(cart, int(product_id)) for product_id in cart.get_cart()]
+        return JsonResponse({'cart': _summary_data(cart), 'lines': lines})
+
+
+class CartApiLineView(View):
+    """Изменение одной строки: ответ — строка после изменения (null, если товар убран) и итоги.
+    Наследник задает change(cart, product_id, quantity)."""
+    form_class = CartQuantityForm
+
+    def post(self, request, product_id):
+        data = _request_data(request)
+        if data is None:
+            return _error('Некорректный JSON')
+        form = self.form_class(data)
+        if not form.is_valid():
+            return _error('Некорректное количество', errors=form.errors)
+        cart = Cart(request)
+        try:
+            self.change(cart, product_id, form.cleaned_data['quantity'])
+        except Http404:
+            return _error('Товар не найден', status=404)
+        except InsufficientStock as error:
+            return _error(str(error), status=409, products=error.products)
+        return JsonResponse({'line': _line_data(cart, product_id), 'cart': _summary_data(cart)})
+
+
+class CartApiAddView(CartApiLineView):
+    """Добавляет quantity экземпляров товара."""
+    form_class = CartAddProductForm
+
+    def change(self, cart, product_id, quantity):
+        cart.add_to_cart(product_id, quantity)
+
+
+class CartApiSetView(CartApiLineView):
+    """Задает количество товара; 0 убирает его из корзины."""
+
+    def change(self, cart, product_id, quantity):
+        if quantity:
+            cart.add_to_cart(product_id, quantity, overwrite_qty=True)
+        else:
+            cart.remove_from_cart(product_id)
+
+
+class CartApiRemoveView(CartApiLineView):
+    def post(self, request, product_id):
+        cart = Cart(request)
+        cart.remove_from_cart(product_id)
+        return JsonResponse({'line': None, 'cart': _summary_data(cart)})
+
+
+class CartApiUpdateView(View):
+    """Пакетное изменение: {"items": {"<id товара>": количество, ...}}, 0 убирает товар.
+    Применяется все или ничего; в ответе — измененные строки и итоги."""
+
+    def post(self, request):
+        data = _request_data(request)
+        items = data.get('items') if data is not None else None
+        if not isinstance(items, dict) or not items:
+            return _error('Ожидается {"items": {"<id товара>": количество}}')
+        quantities = {}
+        for product_id, quantity in items.items():
+            form = CartQuantityForm({'quantity': quantity})
+            if not str(product_id).isdigit() or not form.is_valid():
+                return _error('Некорректное количество', product_id=product_id)
+            quantities[int(product_id)] = form.cleaned_data['quantity']
+        cart = Cart(request)
+        try:
+            missing = cart.update_quantities(quantities)
+        except InsufficientStock as error:
+            return _error(str(error), status=409, products=error.products)
+        if missing:
+            return _error('Товар не найден', status=404, product_ids=missing)
+        return JsonResponse({
+            'lines': {product_id: _line_data(cart, product_id) for product_id in quantities},
+            'cart': _summary_data(cart),
+        })
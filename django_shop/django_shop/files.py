@@ -0,0 +1,193 @@
+"""Отдача загруженных (media) и статических файлов.
+
+Вместо django.views.static.serve, который читает файл в Python:
+- при SHOP_SENDFILE = 'x-accel-redirect' (nginx) или 'x-sendfile' (Apache, lighttpd) представление
+  только проверяет файл и выставляет заголовки, а байты отдает веб-сервер;
+- без веб-сервера перед Django файл отдается через FileResponse (wsgi.file_wrapper / sendfile),
+  с поддержкой Range (206) и условных запросов (304);
+- если рядом с файлом лежит сжатая копия .br или .gz (их создает collectstatic, см. django_shop/storage.py)
+  и клиент ее принимает, отдается она;
+- файлы с хэшем содержимого в имени кэшируются браузером навсегда (immutable).
+"""
+import mimetypes
+import os
+import re
+import stat
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# (расширение сжатой копии, Content-Encoding) в порядке предпочтения
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+VITE_ASSET_RE = re.compile(r'^dist/assets/')  # файлы сборки Vite всегда содержат хэш в имени
+
+
+def _accepted_encodings(request):
+    header = request.headers.get('Accept-Encoding', '')
+    return {part.split(';')[0].strip().lower() for part in header.split(',') if part.strip()}
+
+
+def _find_precompressed(full_path, request):
+    """Сжатая копия файла, которую принимает клиент: (путь, encoding, stat) или None."""
+    accepted = _accepted_encodings(request)
+    for suffix, encoding in ENCODINGS:
+        if encoding in accepted:
+            try:
+                compressed_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            return full_path + suffix, encoding, compressed_stat
+    return None
+
+
+def _parse_range(header, size):
+    """(start, stop) для одного диапазона 'bytes=a-b' (stop не включается), 'invalid' для
+    невыполнимого диапазона и None, если заголовок не распознан (тогда отдается весь файл)."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # последние N байт
+        length = int(last)
+        if length == 0:
+            return 'invalid'
+        return max(size - length, 0), size
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if start >= size or start >= stop:
+        return 'invalid'
+    return start, stop
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(path, start, stop):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            data = file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _sendfile_response(kind, name, full_path):
+    backend = getattr(settings, 'SHOP_SENDFILE', None)
+    response = HttpResponse()
+    if backend == X_ACCEL_REDIRECT:
+        prefix = settings.SHOP_SENDFILE_PREFIXES[kind]
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name.lstrip('/')
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def serve_file(request, kind, root, path, immutable=False, max_age=0):
+    """Отдает файл path из каталога root. kind ('media' или 'static') выбирает префикс для X-Accel-Redirect."""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:  # путь выходит за пределы root
+        raise Http404('Файл не найден')
+    try:
+        file_stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404('Файл не найден')
+
+    range_header = request.headers.get('Range')
+    compressed = None if range_header else _find_precompressed(full_path, request)
+    send_name, send_path, send_stat, encoding = path, full_path, file_stat, None
+    if compressed:
+        send_path, encoding, send_stat = compressed
+        send_name = path + send_path[len(full_path):]
+    has_variants = bool(compressed) or any(os.path.exists(full_path + suffix) for suffix, _ in ENCODINGS)
+
+    last_modified = int(file_stat.st_mtime)
+    # сильный ETag свой у каждого представления: иначе кэши и If-Range смешали бы байты
+    # исходного и сжатого файлов
+    etag = f'"{send_stat.st_mtime_ns:x}-{send_stat.st_size:x}' + (f'-{encoding}"' if encoding else '"')
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    def finish(response):
+        response['Content-Type'] = content_type
+        response['Last-Modified'] = http_date(last_modified)
+        response['ETag'] = etag
+        if has_variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if immutable:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        elif max_age:
+            patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    if getattr(settings, 'SHOP_SENDFILE', None):
+        # Range, If-Range и отдачу байтов берет на себя веб-сервер
+        response = _sendfile_response(kind, send_name, send_path)
+    else:
+        size = file_stat.st_size
+        byte_range = _parse_range(range_header, size) if range_header else None
+        if byte_range and not _if_range_matches(request, etag, last_modified):
+            byte_range = None
+        if byte_range == 'invalid':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return finish(response)
+        if byte_range:
+            start, stop = byte_range
+            response = StreamingHttpResponse(_read_range(full_path, start, stop), status=206)
+            response['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+            response['Content-Length'] = stop - start
+        else:
+            response = FileResponse(open(send_path, 'rb'))
+            response['Content-Length'] = send_stat.st_size
+            response.headers.pop('Content-Disposition', None)  # иначе в имени будет .br/.gz
+    response['Accept-Ranges'] = 'bytes'
+    if compressed:
+        response['Content-Encoding'] = encoding
+    return finish(response)
+
+
+@lru_cache(maxsize=1)
+def _hashed_static_names():
+    """Имена файлов с хэшем из манифеста collectstatic (ManifestStaticFilesStorage)."""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return set(hashed_files.values())
+
+
+def serve_media(request, path):
+    return serve_file(request, 'media', settings.MEDIA_ROOT, path,
+                      max_age=getattr(settings, 'SHOP_MEDIA_MAX_AGE', 0))
+
+
+def serve_static(request, path):
+    immutable = bool(VITE_ASSET_RE.match(path)) or path in _hashed_static_names()
+    return serve_file(request, 'static', settings.STATIC_ROOT, path, immutable=immutable,
+                      max_age=getattr(settings, 'SHOP_STATIC_MAX_AGE', 0))
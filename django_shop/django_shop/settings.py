@@ -45,6 +45,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cart.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +83,33 @@ DATABASES = {
     }
 }
 
+# Кэш используется для ленты изменений товаров, по которой воркеры обновляют индексы поиска в памяти
+# (shop/local_index.py). LocMemCache живет внутри одного процесса — при запуске нескольких воркеров
+# (gunicorn/uwsgi) нужен общий кэш, например:
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django-shop',
+    },
+    # готовые страницы каталога (shop/page_cache.py); можно вынести в файлы или в Redis:
+    #     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache' / 'pages'
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django-shop-pages',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Кэширование страниц каталога и товаров с «дырками» под данные пользователя (shop/page_cache.py)
+SHOP_PAGE_CACHE = True
+SHOP_PAGE_CACHE_ALIAS = 'pages'
+SHOP_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Keyset-пагинация каталога (по курсору вместо номера страницы): без COUNT(*) и OFFSET,
+# поэтому глубокие страницы открываются так же быстро, как первая. См. shop/pagination.py
+SHOP_KEYSET_PAGINATION = False
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,6 +139,45 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'django_shop', 'static'),
 ]
 
+# collectstatic добавляет к именам хэш содержимого и создает сжатые копии .gz/.br (django_shop/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django_shop.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# Отдача media и static (django_shop/files.py). За nginx: SHOP_SENDFILE = 'x-accel-redirect' и internal-локации
+#     location /internal/media/ { internal; alias /app/django_shop/media/; }
+#     location /internal/static/ { internal; alias /app/django_shop/static/; }
+# за Apache (mod_xsendfile) или lighttpd: SHOP_SENDFILE = 'x-sendfile'. None — файл отдает сам Django,
+# только для разработки (runserver без веб-сервера): в production воркеры не должны отдавать байты файлов.
+SHOP_SENDFILE = None if DEBUG else 'x-accel-redirect'
+SHOP_SENDFILE_PREFIXES = {'media': '/internal/media/', 'static': '/internal/static/'}
+SHOP_MEDIA_MAX_AGE = 60 * 60 * 24  # имена загруженных файлов без хэша, кэшируем на сутки
+SHOP_STATIC_MAX_AGE = 60 * 60  # статика без хэша в имени; файлы с хэшем кэшируются навсегда (immutable)
+
+# «С этим товаром покупают» на странице товара (orders/recommendations.py, команда build_recommendations)
+SHOP_RECOMMENDATIONS_COUNT = 8
+
+# Сортировки «Бестселлеры» и «Тренды» (shop/sales.py): какие заказы считаются продажами
+# и за сколько дней вес продажи в «Трендах» уменьшается вдвое
+SHOP_SALES_STATUSES = ('wait', 'processing', 'shipped', 'delivered')
+SHOP_TRENDING_HALF_LIFE_DAYS = 7
+
+# Хранилище корзины (cart/storage.py). Подписанная cookie не требует ни сессии, ни базы: анонимные
+# посетители, которые ничего не кладут в корзину, не создают записей в django_session.
+# Варианты: 'cart.storage.CacheCartStorage' (кэш SHOP_CART_CACHE_ALIAS, нужен общий — Redis)
+# и 'cart.storage.SessionCartStorage' (сессия Django, как раньше).
+# Корзины, сохраненные в сессии до перехода на cookie или кэш, переносятся при первом чтении.
+SHOP_CART_STORAGE = 'cart.storage.SignedCookieCartStorage'
+SHOP_CART_CACHE_ALIAS = 'default'
+SHOP_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+# Резервы остатков для корзин (shop/inventory.py), например на время распродажи: товар, положенный
+# в корзину, откладывается на SHOP_STOCK_RESERVATION_TTL секунд. Истекшие резервы удаляет
+# команда sweep_reservations — ее нужно запускать по расписанию (cron, раз в несколько минут).
+SHOP_STOCK_RESERVATIONS = False
+SHOP_STOCK_RESERVATION_TTL = 15 * 60
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 INTERNAL_IPS = [
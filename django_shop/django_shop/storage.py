@@ -0,0 +1,59 @@
+"""Хранилище статических файлов: имена с хэшем содержимого (ManifestStaticFilesStorage)
+и сжатые копии .gz и .br, которые создаются один раз при collectstatic, а не на каждый запрос.
+Копии отдает django_shop/files.py (или веб-сервер: gzip_static / brotli_static в nginx).
+Пока collectstatic не запускали (нет манифеста или в нем нет файла), {% static %} дает имя без хэша,
+как StaticFilesStorage, а не падает с ValueError на каждой странице."""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli создаются только .gz
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico')
+MIN_SIZE = 512  # маленькие файлы не сжимаем — выигрыш меньше накладных расходов
+MAX_RATIO = 0.9  # сохраняем копию, только если она хотя бы на 10% меньше
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:  # файла нет в манифесте
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        """Создает сжатые копии файла, возвращает их имена."""
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < MIN_SIZE:
+            return []
+        variants = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+        created = []
+        for suffix, compress in variants:
+            compressed = compress(data)
+            if len(compressed) > len(data) * MAX_RATIO:
+                continue
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            os.utime(path + suffix, (os.path.getatime(path), os.path.getmtime(path)))
+            created.append(name + suffix)
+        return created
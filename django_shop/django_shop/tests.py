@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from shop.testing import PageTestCase
+
+from .files import serve_file
+
+
+@override_settings(SHOP_SENDFILE=None)
+class ServeFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for name, content in (('app.js', b'x' * 1000), ('app.js.br', b'b' * 100), ('app.js.gz', b'g' * 120)):
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(content)
+
+    def get(self, **headers):
+        request = RequestFactory().get('/static/app.js', **headers)
+        response = serve_file(request, 'static', self.root, 'app.js')
+        self.addCleanup(response.close)
+        return response
+
+    def test_etag_differs_per_encoding(self):
+        identity = self.get()
+        brotli = self.get(HTTP_ACCEPT_ENCODING='br, gzip')
+        gzip = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(brotli['Content-Encoding'], 'br')
+        self.assertEqual(gzip['Content-Encoding'], 'gzip')
+        etags = {identity['ETag'], brotli['ETag'], gzip['ETag']}
+        self.assertEqual(len(etags), 3)
+        for response in (identity, brotli, gzip):
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_modified_only_for_same_encoding(self):
+        brotli_etag = self.get(HTTP_ACCEPT_ENCODING='br')['ETag']
+        not_modified = self.get(HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=brotli_etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn('Accept-Encoding', not_modified['Vary'])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=brotli_etag).status_code, 200)
+
+    def test_if_range_with_compressed_etag_returns_full_file(self):
+        brotli_etag = self.get(HTTP_ACCEPT_ENCODING='br')['ETag']
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=brotli_etag)
+        self.assertEqual(response.status_code, 200)
+        identity_etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=identity_etag).status_code, 206)
+
+    @override_settings(SHOP_SENDFILE='x-accel-redirect')
+    def test_offload_sends_no_bytes(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/static/app.js.gz')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, b'')
+
+
+class PageRenderTests(PageTestCase):
+    """Страницы целиком, с DEBUG=False и без collectstatic: шаблоны используют {% static %}."""
+
+    def test_pages_render_without_manifest(self):
+        for url in ('/', self.category.get_absolute_url(), self.products[0].get_absolute_url(), '/cart/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from .files import serve_media, serve_static
 
 
 urlpatterns = [
@@ -10,6 +11,9 @@ urlpatterns = [
     path('orders/', include('orders.urls')),
     path('', include('shop.urls', namespace='shop')),  # копируем все urls из приложения shop
     path('', include('users.urls', namespace='users')),
-
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # файлы отдает django_shop/files.py: Range, сжатые копии, X-Accel-Redirect/X-Sendfile.
+    # В режиме DEBUG /static/ перехватывает runserver из django.contrib.staticfiles
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+    re_path(r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+]
 
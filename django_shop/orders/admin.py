@@ -1,6 +1,8 @@
 from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
 from django.http import HttpResponseRedirect
+from shop.exports import ExportActionsMixin
+from .exports import ORDER_COLUMNS, order_records
 from .models import Order, OrderProduct
 
 
@@ -8,11 +10,20 @@ class OrderProductInline(admin.TabularInline):
     model = OrderProduct
     extra = 0
     can_delete = True  # Изначально разрешаем удаление
+    fields = ['id_product', 'quantity', 'unit_price', 'cost']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('id_product')
 
     def get_readonly_fields(self, request, obj=None):
         if request.user.role == 'manager':
-            return ['id_product', 'quantity']
-        return []
+            return ['id_product', 'quantity', 'unit_price', 'cost']
+        return ['unit_price', 'cost']
+
+    @admin.display(description='Стоимость')
+    def cost(self, obj):
+        # цена позиции сохранена при оформлении — товар для расчета не нужен
+        return obj.get_cost() if obj.pk else '-'
 
     def has_change_permission(self, request, obj=None):
         if request.user.role == 'admin':
@@ -28,11 +39,17 @@ class OrderProductInline(admin.TabularInline):
         return request.user.is_active and request.user.is_staff
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportActionsMixin, admin.ModelAdmin):
     list_display = ['id', 'id_user', 'address', 'created_date', 'status']
     list_filter = ['created_date', 'status']
     list_editable = ['status']
     inlines = [OrderProductInline]
+    actions = ['export_csv', 'export_jsonl']
+    export_name = 'orders'
+    export_columns = ORDER_COLUMNS
+
+    def export_records(self, queryset, file_format):
+        return order_records(queryset, file_format)
 
     def get_list_editable(self, request):
         if request.user.role == 'manager':
@@ -0,0 +1,52 @@
+"""Выгрузка заказов вместе с позициями (см. shop/exports.py).
+
+Позиции подгружаются prefetch_related: iterator(chunk_size=...) выполняет его для каждой пачки
+заказов, то есть один дополнительный запрос на chunk_size заказов, а не на каждый заказ.
+В CSV — строка на каждую позицию (поля заказа повторяются), в JSONL — объект заказа со списком items.
+"""
+from django.db.models import Prefetch
+
+from shop.exports import CHUNK_SIZE, CSV
+
+from .models import OrderProduct
+
+ORDER_COLUMNS = ('order_id', 'created_date', 'status', 'user_id', 'user_email', 'address', 'total_cost',
+                 'product_id', 'product', 'price', 'quantity', 'cost')
+
+
+def _orders(queryset, chunk_size):
+    items = OrderProduct.objects.select_related('id_product').only(
+        'id', 'quantity', 'unit_price', 'id_order', 'id_product', 'id_product__title').order_by('pk')
+    queryset = queryset.select_related('id_user').prefetch_related(Prefetch('items', queryset=items)).order_by('pk')
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def _item(item):
+    return {
+        'product_id': item.id_product_id,
+        'product': item.id_product.title,
+        'price': item.unit_price,
+        'quantity': item.quantity,
+        'cost': item.get_cost(),
+    }
+
+
+def order_records(queryset, file_format=CSV, chunk_size=CHUNK_SIZE):
+    for order in _orders(queryset, chunk_size):
+        header = {
+            'order_id': order.pk,
+            'created_date': order.created_date,
+            'status': order.status,
+            'user_id': order.id_user_id,
+            'user_email': order.id_user.email if order.id_user else None,
+            'address': order.address,
+            'total_cost': order.total_cost,
+        }
+        items = [_item(item) for item in order.items.all()]
+        if file_format != CSV:
+            yield {**header, 'items': items}
+        elif not items:
+            yield header
+        else:
+            for item in items:
+                yield {**header, **item}
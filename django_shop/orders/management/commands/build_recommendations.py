@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.recommendations import ORDERS_BATCH_SIZE, rebuild_recommendations, update_recommendations
+
+
+class Command(BaseCommand):
+    help = ('Обновляет рекомендации «С этим товаром покупают» по новым доставленным заказам '
+            '(запускать по расписанию); --full пересчитывает их с нуля')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать матрицу совместных покупок целиком')
+        parser.add_argument('--batch-size', type=int, default=ORDERS_BATCH_SIZE, help='Заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        build = rebuild_recommendations if options['full'] else update_recommendations
+        touched, changed = build(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Товаров в новых заказах: {touched}, обновлено списков рекомендаций: {changed}, '
+            f'за {time.perf_counter() - started:.2f} с'))
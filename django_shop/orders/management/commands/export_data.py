@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from orders.exports import ORDER_COLUMNS, order_records
+from orders.models import Order
+from shop.exports import (CHUNK_SIZE, FORMATS, PRODUCT_COLUMNS, REVIEW_COLUMNS, product_records, review_records,
+                          stream_export)
+from shop.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Выгружает товары, заказы или отзывы в CSV или JSONL потоково, не загружая таблицу в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('data', choices=('products', 'orders', 'reviews'))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='Файл для записи (по умолчанию — stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Строк в одной выборке из базы')
+
+    def handle(self, *args, **options):
+        file_format, chunk_size = options['format'], options['chunk_size']
+        if options['data'] == 'products':
+            columns, records = PRODUCT_COLUMNS, product_records(Product.objects.all(), chunk_size)
+        elif options['data'] == 'reviews':
+            columns, records = REVIEW_COLUMNS, review_records(Review.objects.all(), chunk_size)
+        else:
+            columns, records = ORDER_COLUMNS, order_records(Order.objects.all(), file_format, chunk_size)
+        chunks = stream_export(file_format, columns, records)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                file.writelines(chunks)
+        else:
+            self.stdout.writelines(chunks)  # OutputWrapper передает writelines самому потоку
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import DeliveredPurchase
+from orders.purchases import rebuild_purchases
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля полученные покупки пользователей (право оставить отзыв) по доставленным заказам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_purchases()
+        self.stdout.write(self.style.SUCCESS(f'Полученных покупок: {DeliveredPurchase.objects.count()}'))
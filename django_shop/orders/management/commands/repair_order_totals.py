@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.totals import update_totals, wrong_totals
+
+
+class Command(BaseCommand):
+    help = ('Сверяет итоговую стоимость всех заказов с суммой их позиций одним агрегирующим запросом '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            wrong = wrong_totals()
+            for order_id, total_cost, expected in wrong[:20]:
+                self.stdout.write(f'Заказ {order_id}: сохранено {total_cost}, по позициям {expected}')
+            if wrong and not options['dry_run']:
+                update_totals([order_id for order_id, _, _ in wrong])
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('Все суммы заказов верны'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Заказов с неверной суммой: {len(wrong)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено сумм заказов: {len(wrong)}'))
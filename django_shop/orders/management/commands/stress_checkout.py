@@ -0,0 +1,141 @@
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+CATEGORY_TITLE = 'Нагрузочный тест'
+USER_EMAIL = 'stress-checkout@example.invalid'
+
+
+def _init_process():
+    import django
+
+    django.setup()
+
+
+def run_checkout(user_id, quantities):
+    """Одно оформление заказа. Возвращает (результат, длительность, время в операторах блокировки остатков).
+    Время блокировки — это длительность SELECT ... FOR UPDATE / UPDATE по товарам, то есть в основном ожидание."""
+    from django.db import OperationalError
+    from orders.models import Order
+    from orders.services import CheckoutError, place_order
+
+    lock_time = 0.0
+
+    def measure(execute, sql, params, many, context):
+        nonlocal lock_time
+        if 'shop_product' not in sql or not (sql.startswith('UPDATE') or 'FOR UPDATE' in sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            lock_time += time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(measure):
+            place_order(Order(id_user_id=user_id, address='stress'), quantities)
+        outcome = 'ok'
+    except CheckoutError:
+        outcome = 'rejected'
+    except OperationalError as error:  # например, «database is locked» после таймаута SQLite
+        outcome = f'error: {error}'
+    finally:
+        connection.close()
+    return outcome, time.perf_counter() - started, lock_time
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест оформления заказов: N параллельных покупателей разбирают несколько «горячих» товаров. '
+            'Показывает пропускную способность, ожидание блокировок и число перепроданных товаров (должно быть 0). '
+            'Создает в текущей базе временные категорию, товары и пользователя и удаляет их после теста.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=300, help='Сколько заказов оформить')
+        parser.add_argument('--workers', type=int, default=8, help='Параллельных покупателей')
+        parser.add_argument('--mode', choices=('threads', 'processes'), default='threads')
+        parser.add_argument('--products', type=int, default=3, help='Количество «горячих» товаров')
+        parser.add_argument('--stock', type=int, default=100, help='Начальный остаток каждого товара')
+        parser.add_argument('--max-quantity', type=int, default=3, help='Наибольшее количество товара в строке заказа')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        from django.db.models import Sum
+        from orders.models import Order, OrderProduct
+        from shop.models import Category, Product
+        from users.models import CustomUser
+
+        if Category.objects.filter(title=CATEGORY_TITLE).exists():
+            raise CommandError(f'Категория «{CATEGORY_TITLE}» осталась от запуска с --keep — удалите ее и ее товары')
+        user = CustomUser.objects.filter(email=USER_EMAIL).first()
+        if user is None:
+            phone_number = next(number for number in (f'{n:011d}' for n in range(10 ** 4))
+                                if not CustomUser.objects.filter(phone_number=number).exists())
+            user = CustomUser.objects.create_user(USER_EMAIL, phone_number=phone_number, name='stress')
+        category = Category.objects.create(title=CATEGORY_TITLE)
+        products = [Product.objects.create(title=f'Горячий товар {number}', author='stress', description='',
+                                           price=100 + number, quantity=options['stock'], id_category=category)
+                    for number in range(1, options['products'] + 1)]
+        product_ids = [product.pk for product in products]
+
+        rnd = random.Random(options['seed'])
+        jobs = []
+        for _ in range(options['checkouts']):
+            chosen = rnd.sample(product_ids, rnd.randint(1, len(product_ids)))
+            rnd.shuffle(chosen)  # строки в случайном порядке: блокировки должен упорядочить inventory
+            jobs.append({product_id: rnd.randint(1, options['max_quantity']) for product_id in chosen})
+        demand = sum(sum(job.values()) for job in jobs)
+
+        connections.close_all()  # у потоков и процессов свои соединения
+        if options['mode'] == 'threads':
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+        else:
+            executor = ProcessPoolExecutor(max_workers=options['workers'], mp_context=get_context('spawn'),
+                                           initializer=_init_process)
+        try:
+            with executor:
+                started = time.perf_counter()
+                results = list(executor.map(run_checkout, [user.pk] * len(jobs), jobs))
+                elapsed = time.perf_counter() - started
+
+            outcomes = [outcome for outcome, _, _ in results]
+            errors = [outcome for outcome in outcomes if outcome.startswith('error')]
+            latencies = sorted(duration * 1000 for _, duration, _ in results)
+            lock_waits = sorted(lock * 1000 for _, _, lock in results)
+
+            sold = dict(OrderProduct.objects.filter(id_order__id_user=user, id_product__in=product_ids)
+                        .values('id_product').annotate(total=Sum('quantity')).values_list('id_product', 'total'))
+            stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'quantity'))
+            oversold = [product_id for product_id in product_ids
+                        if stock[product_id] < 0 or sold.get(product_id, 0) > options['stock']
+                        or stock[product_id] != options['stock'] - sold.get(product_id, 0)]
+
+            self.stdout.write(
+                f'{options["mode"]}, {options["workers"]} покупателей: {len(jobs)} оформлений за {elapsed:.2f} с '
+                f'({len(jobs) / elapsed:.0f}/с), спрос {demand} шт. при запасе '
+                f'{options["stock"] * len(product_ids)} шт.')
+            self.stdout.write(
+                f'Оформлено {outcomes.count("ok")}, отказов из-за нехватки {outcomes.count("rejected")}, '
+                f'ошибок {len(errors)}; продано {sum(sold.values())} шт., остатки {sorted(stock.values())}')
+            self.stdout.write(
+                f'Время оформления: медиана {statistics.median(latencies):.1f} мс, '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} мс; ожидание блокировок остатков: '
+                f'медиана {statistics.median(lock_waits):.1f} мс, p95 {lock_waits[int(len(lock_waits) * 0.95) - 1]:.1f} мс, '
+                f'всего {sum(lock_waits) / 1000:.2f} с')
+            for error in sorted(set(errors))[:5]:
+                self.stderr.write(error)
+            if oversold:
+                raise CommandError(f'Перепродано товаров: {len(oversold)}')
+            self.stdout.write(self.style.SUCCESS('Перепроданных товаров: 0'))
+        finally:
+            if not options['keep']:
+                Order.objects.filter(id_user=user).delete()
+                Product.objects.filter(pk__in=product_ids).delete()
+                category.delete()
+                user.delete()
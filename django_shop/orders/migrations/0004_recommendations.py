@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_product_image_variants'),
+        ('orders', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='in_recommendations',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Учтен в рекомендациях'),
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Другой товар')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'совместная покупка',
+                'verbose_name_plural': 'совместные покупки',
+                'constraints': [models.UniqueConstraint(fields=('product', 'other'), name='orders_copurchase_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='shop.product', verbose_name='Товар')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Рекомендуемый товар')),
+            ],
+            options={
+                'verbose_name': 'рекомендация',
+                'verbose_name_plural': 'рекомендации',
+                'ordering': ('product', 'rank'),
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='orders_recommendation_rank_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_purchases(apps, schema_editor):
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    DeliveredPurchase = apps.get_model('orders', 'DeliveredPurchase')
+    db_alias = schema_editor.connection.alias
+    pairs = (OrderProduct.objects.using(db_alias).filter(id_order__status='delivered', id_order__id_user__isnull=False)
+             .values_list('id_order__id_user_id', 'id_product_id').distinct())
+    DeliveredPurchase.objects.using(db_alias).bulk_create(
+        [DeliveredPurchase(user_id=user_id, product_id=product_id) for user_id, product_id in pairs.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0010_product_sales'),
+        ('orders', '0004_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveredPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Товар')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivered_purchases', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель')),
+            ],
+            options={
+                'verbose_name': 'полученный товар',
+                'verbose_name_plural': 'полученные товары',
+                'constraints': [models.UniqueConstraint(fields=('user', 'product'), name='orders_deliveredpurchase_unique')],
+            },
+        ),
+        migrations.RunPython(fill_purchases, migrations.RunPython.noop),
+    ]
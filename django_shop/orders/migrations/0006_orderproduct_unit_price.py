@@ -0,0 +1,41 @@
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def fill_unit_prices(apps, schema_editor):
+    """Цены прошлых заказов не сохранялись — берется текущая цена товара, по которой
+    до сих пор и считалась стоимость позиций. Пачками по id, каждая в своей транзакции
+    (миграция неатомарная), чтобы не держать блокировки строк до конца заполнения."""
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    Product = apps.get_model('shop', 'Product')
+    db_alias = schema_editor.connection.alias
+    items = OrderProduct.objects.using(db_alias)
+    price = Subquery(Product.objects.using(db_alias).filter(pk=OuterRef('id_product_id')).values('price')[:1])
+    last_id = items.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        with transaction.atomic(using=db_alias):
+            items.filter(pk__gte=start, pk__lt=start + BATCH_SIZE, unit_price__isnull=True).update(unit_price=price)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('orders', '0005_deliveredpurchase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproduct',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=9, null=True, verbose_name='Цена'),
+        ),
+        migrations.RunPython(fill_unit_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderproduct',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=9, verbose_name='Цена'),
+        ),
+    ]
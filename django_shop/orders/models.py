@@ -19,8 +19,8 @@ class Order(models.Model):
 
         Методы:
         - __str__: Возвращает строковое представление заказа.
-        - get_total_cost: Вычисляет итоговую стоимость заказа, суммируя стоимости всех товаров.
-        - update_total_cost: Обновляет итоговую стоимость заказа в базе данных.
+        - get_total_cost: Вычисляет итоговую стоимость заказа одним агрегирующим запросом по позициям.
+        - update_total_cost: Пересчитывает итоговую стоимость заказа в базе одним UPDATE (orders/totals.py).
         - clean: Проверяет, что длина адреса не превышает 100 символов.
 
         Мета-класс:
@@ -40,6 +40,8 @@ class Order(models.Model):
         ('delivered', 'Доставлен')
     )
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='wait', verbose_name="Статус")
+    # заказ уже учтен в матрице совместных покупок (orders/recommendations.py)
+    in_recommendations = models.BooleanField(default=False, editable=False, verbose_name="Учтен в рекомендациях")
 
     class Meta:
         ordering = ('-created_date',)
@@ -50,11 +52,15 @@ class Order(models.Model):
         return 'Заказ {}'.format(self.id)
 
     def get_total_cost(self):
-        return sum(item.get_cost() for item in self.items.all())
+        from .totals import items_total
+
+        return Order.objects.filter(pk=self.pk).annotate(total=items_total()).values_list('total', flat=True).get()
 
     def update_total_cost(self):
-        self.total_cost = sum(item.get_cost() for item in self.items.all())
-        self.save()
+        from .totals import update_totals
+
+        update_totals([self.pk])
+        self.total_cost = Order.objects.filter(pk=self.pk).values_list('total_cost', flat=True).get()
 
     def clean(self):
         if self.address is not None and len(self.address) > 100:
@@ -68,17 +74,78 @@ class OrderProduct(models.Model):
        - id_order: Ссылка на заказ, к которому относятся товары. При удалении заказа все связанные товары также удаляются.
        - id_product: Ссылка на товар, входящий в состав заказа. При удалении товара все его связи с заказами удаляются.
        - quantity: Количество товара в заказе, по умолчанию установлено в 1.
+       - unit_price: Цена товара на момент оформления заказа. Если не задана, при сохранении берется
+                     текущая цена товара (orders/signals.py).
 
        Методы:
        - __str__: Возвращает строковое представление объекта.
-       - get_cost: Вычисляет стоимость позиции в заказе, умножая цену товара на его количество в заказе.
+       - get_cost: Вычисляет стоимость позиции по сохраненной цене, без обращения к товару.
        """
     id_order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, verbose_name="Заказ")
     id_product = models.ForeignKey(Product, related_name='order_items', on_delete=models.CASCADE, verbose_name="Товар")
     quantity = models.PositiveIntegerField(default=1, verbose_name="Количество")
+    unit_price = models.DecimalField(max_digits=9, decimal_places=2, editable=False, verbose_name="Цена")
 
     def __str__(self):
         return '{}'.format(self.id)
 
     def get_cost(self):
-        return self.id_product.price * self.quantity
+        return self.unit_price * self.quantity
+
+
+class CoPurchase(models.Model):
+    """
+       Разреженная матрица совместных покупок: в скольких доставленных заказах товары встречаются вместе.
+       Хранится в обе стороны (product, other) и (other, product); строка product == other — число
+       заказов с самим товаром. Из нее строятся рекомендации (ProductRecommendation).
+       """
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE, verbose_name="Товар")
+    other = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE, verbose_name="Другой товар")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        verbose_name = 'совместная покупка'
+        verbose_name_plural = 'совместные покупки'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='orders_copurchase_unique'),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    """
+       Готовый список «С этим товаром покупают»: до SHOP_RECOMMENDATIONS_COUNT товаров на каждый,
+       rank — место в списке (0 — самый похожий). Страница товара читает его одним запросом по индексу.
+       """
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE,
+                                verbose_name="Товар")
+    recommended = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE,
+                                    verbose_name="Рекомендуемый товар")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        ordering = ('product', 'rank')
+        verbose_name = 'рекомендация'
+        verbose_name_plural = 'рекомендации'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='orders_recommendation_rank_unique'),
+        ]
+
+
+class DeliveredPurchase(models.Model):
+    """
+       Товар, который пользователь купил и получил (есть в его доставленном заказе).
+       Поддерживается сигналами заказов (orders/purchases.py) и нужен, чтобы право оставить отзыв
+       проверялось одним поиском по уникальному индексу (user, product), без объединения
+       позиций заказа с заказами.
+       """
+    user = models.ForeignKey(CustomUser, related_name='delivered_purchases', on_delete=models.CASCADE,
+                             verbose_name="Покупатель")
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE, verbose_name="Товар")
+
+    class Meta:
+        verbose_name = 'полученный товар'
+        verbose_name_plural = 'полученные товары'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='orders_deliveredpurchase_unique'),
+        ]
@@ -0,0 +1,66 @@
+"""Полученные покупки пользователей (DeliveredPurchase) и право оставить отзыв.
+
+Строка (пользователь, товар) есть, пока у пользователя есть доставленный заказ с этим товаром.
+Когда заказ становится доставленным или в доставленный заказ добавляется позиция, строки
+добавляются (bulk_create с ignore_conflicts). Когда заказ перестает быть доставленным или из него
+удаляется позиция, строки затронутых товаров сверяются с заказами — это редкие операции админки.
+Пересчитать все с нуля — rebuild_purchases (используется и миграцией).
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
+
+from .models import DeliveredPurchase, OrderProduct
+
+DELIVERED = 'delivered'
+
+
+def add_purchases(user_id, product_ids, using='default'):
+    if user_id is None:
+        return
+    DeliveredPurchase.objects.using(using).bulk_create(
+        [DeliveredPurchase(user_id=user_id, product_id=product_id) for product_id in set(product_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_purchases(user_id, product_ids, using='default'):
+    """Удаляет строки товаров, которых больше нет ни в одном доставленном заказе пользователя."""
+    if user_id is None:
+        return
+    still_delivered = OrderProduct.objects.using(using).filter(
+        id_order__id_user_id=user_id, id_order__status=DELIVERED, id_product_id__in=product_ids,
+    ).values_list('id_product_id', flat=True)
+    (DeliveredPurchase.objects.using(using).filter(user_id=user_id, product_id__in=product_ids)
+     .exclude(product_id__in=still_delivered).delete())
+
+
+def order_product_ids(order_id, using='default'):
+    return list(OrderProduct.objects.using(using).filter(id_order_id=order_id)
+                .values_list('id_product_id', flat=True).distinct())
+
+
+def rebuild_purchases(using='default'):
+    pairs = (OrderProduct.objects.using(using).filter(id_order__status=DELIVERED, id_order__id_user__isnull=False)
+             .values_list('id_order__id_user_id', 'id_product_id').distinct())
+    DeliveredPurchase.objects.using(using).all().delete()
+    DeliveredPurchase.objects.using(using).bulk_create(
+        [DeliveredPurchase(user_id=user_id, product_id=product_id) for user_id, product_id in pairs.iterator()],
+        batch_size=1000,
+    )
+
+
+def has_delivered_purchase(user_id, product_id):
+    return DeliveredPurchase.objects.filter(user_id=user_id, product_id=product_id).exists()
+
+
+def review_eligibility(user, product_id):
+    """(может оставить отзыв, уже оставил отзыв) одним запросом: два EXISTS по уникальным
+    индексам (user, product) в DeliveredPurchase и (id_product, id_user) в Review."""
+    from shop.models import Review
+
+    # request.user — SimpleLazyObject, поэтому модель берем не из type(user)
+    row = get_user_model().objects.filter(pk=user.pk).values_list(
+        Exists(DeliveredPurchase.objects.filter(user=OuterRef('pk'), product_id=product_id)),
+        Exists(Review.objects.filter(id_product_id=product_id, id_user=OuterRef('pk'))),
+    ).first()
+    return row or (False, False)
@@ -0,0 +1,150 @@
+"""Рекомендации «С этим товаром покупают» по совместным покупкам.
+
+Матрица совместных покупок (CoPurchase) — разреженная: строки есть только у пар товаров,
+которые хоть раз были в одном доставленном заказе. Счетчики для пачки заказов считает сама база
+одним запросом (самообъединение позиций заказа по заказу с GROUP BY по паре товаров), в Python
+приходят только ненулевые клетки. Учтенные заказы помечаются Order.in_recommendations,
+поэтому команда build_recommendations без --full добавляет в матрицу только новые доставленные заказы.
+
+Сходство товаров a и b — косинусное: orders(a, b) / sqrt(orders(a) * orders(b)), где orders(a) —
+диагональ матрицы. Для каждого товара хранится SHOP_RECOMMENDATIONS_COUNT самых похожих
+(ProductRecommendation); пересчитываются только списки товаров из новых заказов и их соседей —
+у остальных сходство не изменилось.
+"""
+import heapq
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Now
+
+from shop.models import Product
+from shop.page_cache import PRODUCT_VERSION_KEY, bump_versions
+
+from .models import CoPurchase, Order, OrderProduct, ProductRecommendation
+
+ORDERS_BATCH_SIZE = 1000
+PRODUCTS_BATCH_SIZE = 500
+
+
+def get_recommendation_count():
+    return getattr(settings, 'SHOP_RECOMMENDATIONS_COUNT', 8)
+
+
+def get_recommendations(product_id):
+    """Рекомендуемые товары для страницы товара — один запрос по индексу (product, rank)."""
+    recommendations = (ProductRecommendation.objects.filter(product_id=product_id)
+                       .select_related('recommended').order_by('rank')[:get_recommendation_count()])
+    return [recommendation.recommended for recommendation in recommendations]
+
+
+def _pair_counts(order_ids):
+    """{(товар, другой товар): число заказов} для заказов order_ids, включая пары (товар, товар)."""
+    rows = (OrderProduct.objects.filter(id_order__in=order_ids)
+            .values('id_product', other=F('id_order__items__id_product'))
+            .annotate(orders=Count('id_order', distinct=True))
+            .values_list('id_product', 'other', 'orders'))
+    return {(product_id, other_id): orders for product_id, other_id, orders in rows}
+
+
+def _add_to_matrix(counts):
+    product_ids = {product_id for product_id, _ in counts}
+    existing = CoPurchase.objects.filter(product__in=product_ids).values_list('product', 'other', 'orders')
+    totals = dict(counts)
+    for product_id, other_id, orders in existing:
+        if (product_id, other_id) in totals:
+            totals[(product_id, other_id)] += orders
+    CoPurchase.objects.bulk_create(
+        [CoPurchase(product_id=product_id, other_id=other_id, orders=orders)
+         for (product_id, other_id), orders in totals.items()],
+        update_conflicts=True, unique_fields=['product', 'other'], update_fields=['orders'],
+    )
+
+
+def update_matrix(batch_size=ORDERS_BATCH_SIZE):
+    """Добавляет в матрицу доставленные заказы, которые еще не учтены. Возвращает id затронутых товаров."""
+    touched = set()
+    pending = Order.objects.filter(status='delivered', in_recommendations=False).order_by('pk')
+    while True:
+        order_ids = list(pending.values_list('pk', flat=True)[:batch_size])
+        if not order_ids:
+            return touched
+        with transaction.atomic():
+            counts = _pair_counts(order_ids)
+            _add_to_matrix(counts)
+            Order.objects.filter(pk__in=order_ids).update(in_recommendations=True)
+        touched.update(product_id for product_id, _ in counts)
+
+
+def _top_neighbours(product_ids, count):
+    """{товар: [(сходство, сосед), ...]} — count самых похожих товаров, по убыванию сходства."""
+    rows = list(CoPurchase.objects.filter(product__in=product_ids).values_list('product', 'other', 'orders'))
+    other_ids = {other_id for _, other_id, _ in rows}
+    frequency = dict(CoPurchase.objects.filter(product__in=other_ids | set(product_ids), other=F('product'))
+                     .values_list('product', 'orders'))
+    candidates = {product_id: [] for product_id in product_ids}
+    for product_id, other_id, orders in rows:
+        if product_id != other_id:
+            score = orders / math.sqrt(frequency[product_id] * frequency[other_id])
+            candidates[product_id].append((score, -other_id))  # при равенстве — товар с меньшим id
+    return {product_id: [(score, -negative_id) for score, negative_id in heapq.nlargest(count, scored)]
+            for product_id, scored in candidates.items()}
+
+
+def refresh_recommendations(product_ids, count=None):
+    """Пересчитывает списки для product_ids и их соседей по матрице. Возвращает число измененных списков."""
+    count = count or get_recommendation_count()
+    product_ids = set(product_ids)
+    affected = set(product_ids)
+    ordered = sorted(product_ids)
+    for start in range(0, len(ordered), PRODUCTS_BATCH_SIZE):
+        affected.update(CoPurchase.objects.filter(product__in=ordered[start:start + PRODUCTS_BATCH_SIZE])
+                        .values_list('other', flat=True))
+    changed = 0
+    ordered = sorted(affected)
+    for start in range(0, len(ordered), PRODUCTS_BATCH_SIZE):
+        changed += _refresh_batch(ordered[start:start + PRODUCTS_BATCH_SIZE], count)
+    return changed
+
+
+def _refresh_batch(product_ids, count):
+    current = {product_id: [] for product_id in product_ids}
+    for product_id, recommended_id in (ProductRecommendation.objects.filter(product__in=product_ids)
+                                       .order_by('product', 'rank').values_list('product', 'recommended')):
+        current[product_id].append(recommended_id)
+    neighbours = _top_neighbours(product_ids, count)
+    changed = [product_id for product_id in product_ids
+               if [other_id for _, other_id in neighbours[product_id]] != current[product_id]]
+    if not changed:
+        return 0
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(product__in=changed).delete()
+        ProductRecommendation.objects.bulk_create([
+            ProductRecommendation(product_id=product_id, recommended_id=other_id, rank=rank, score=score)
+            for product_id in changed
+            for rank, (score, other_id) in enumerate(neighbours[product_id])
+        ])
+        # страница товара изменилась: новый ETag/Last-Modified и новая версия в кэше страниц
+        Product.objects.filter(pk__in=changed).update(updated_at=Now())
+        transaction.on_commit(lambda: bump_versions([PRODUCT_VERSION_KEY.format(product_id)
+                                                     for product_id in changed]))
+    return len(changed)
+
+
+def update_recommendations(batch_size=ORDERS_BATCH_SIZE):
+    """Инкрементальное обновление: новые доставленные заказы -> матрица -> списки затронутых товаров."""
+    touched = update_matrix(batch_size)
+    return len(touched), refresh_recommendations(touched) if touched else 0
+
+
+def rebuild_recommendations(batch_size=ORDERS_BATCH_SIZE):
+    """Полный пересчет матрицы и всех списков с нуля."""
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        Order.objects.filter(in_recommendations=True).update(in_recommendations=False)
+        touched = update_matrix(batch_size)
+        # товары, которые выпали из матрицы (например, заказ вернули из доставленных), остаются без рекомендаций
+        stale = set(ProductRecommendation.objects.values_list('product', flat=True).distinct()) - touched
+        changed = refresh_recommendations(touched | stale)
+    return len(touched), changed
@@ -0,0 +1,54 @@
+"""Оформление заказа из корзины за постоянное число запросов.
+
+Раньше каждая строка корзины стоила OrderProduct.objects.create (а его сигнал пересчитывал
+total_cost по всем позициям, заново загружая каждый товар) и product.save() — сотни запросов
+на заказ из 20 товаров. Теперь, независимо от размера корзины:
+- остатки списываются одним условным UPDATE с блокировкой товаров по порядку id (shop/inventory.py);
+- заказ сохраняется один раз, сразу с итоговой суммой, посчитанной по прочитанным ценам;
+- позиции создаются одним bulk_create, с ценами, прочитанными под блокировкой остатков;
+- продажи для сортировок (shop/sales.py) сдвигаются одним UPDATE.
+Счетчики фильтра «В наличии» меняются, только если товар закончился.
+
+bulk_create не вызывает сигналы позиций заказа (orders/signals.py), поэтому то, что они делали
+бы для нового заказа, делается здесь явно.
+"""
+from django.db import transaction
+
+from shop.inventory import InsufficientStock, after_stock_change, take_stock
+from shop.sales import apply_sales, get_sales_statuses
+
+from .models import OrderProduct
+
+
+class CheckoutError(Exception):
+    """Заказ нельзя оформить: корзина пуста или товара не хватает на складе."""
+
+
+def place_order(order, quantities, reservation_key=None):
+    """Сохраняет заказ order (еще не сохраненный, с покупателем и адресом) с позициями
+    {id товара: количество} и списывает остатки. При нехватке товара — CheckoutError, ничего не сохраняется.
+    reservation_key — ключ корзины: ее резервы остатков (shop/inventory.py) списываются вместе с заказом."""
+    quantities = {int(product_id): quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        raise CheckoutError('Корзина пуста')
+    try:
+        with transaction.atomic():
+            order = _create_order(order, quantities, reservation_key)
+    except InsufficientStock as error:
+        raise CheckoutError(str(error)) from error
+    return order
+
+
+def _create_order(order, quantities, reservation_key=None):
+    products = take_stock(quantities, reservation_key=reservation_key)  # первым: остатки блокируются до записи заказа
+    order.total_cost = sum(products[product_id].price * quantity for product_id, quantity in quantities.items())
+    order.save()
+    OrderProduct.objects.bulk_create([
+        OrderProduct(id_order=order, id_product_id=product_id, quantity=quantity,
+                     unit_price=products[product_id].price)
+        for product_id, quantity in quantities.items()
+    ])
+    after_stock_change(quantities, products)
+    if order.status in get_sales_statuses():
+        apply_sales(quantities, order.created_date)
+    return order
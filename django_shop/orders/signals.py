@@ -1,11 +1,125 @@
-from django.db.models.signals import post_save, post_delete
+from collections import Counter
+
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import OrderProduct
+from shop.sales import apply_sales, get_sales_statuses, order_quantities
+from shop.models import Product
+from .models import Order, OrderProduct
+from .purchases import DELIVERED, add_purchases, order_product_ids, refresh_purchases
+from .totals import schedule_total_update
+
+# Итоговая стоимость заказа пересчитывается один раз при фиксации транзакции (orders/totals.py)
+
+@receiver(post_save, sender=OrderProduct)
+def update_order_total_on_save(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        schedule_total_update(instance.id_order_id, using=using)
+
+@receiver(post_delete, sender=OrderProduct)
+def update_order_total_on_delete(sender, instance, using, **kwargs):
+    schedule_total_update(instance.id_order_id, using=using)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, using, raw=False, **kwargs):
+    """Прежний статус заказа (_old_status). Сохраненный статус запоминается в экземпляре (_saved_status),
+    чтобы повторные save() не обращались к базе."""
+    instance._old_status = None
+    if raw or instance.pk is None:
+        return
+    if not hasattr(instance, '_saved_status'):
+        instance._saved_status = Order.objects.using(using).filter(pk=instance.pk).values_list(
+            'status', flat=True).first()
+    instance._old_status = instance._saved_status
+
+
+@receiver(post_save, sender=Order)
+def remember_saved_status(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._saved_status = instance.status
+
+
+# Продажи товаров для сортировок «Бестселлеры» и «Тренды» (shop/sales.py)
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, created, using, raw=False, **kwargs):
+    old_status = getattr(instance, '_old_status', None)
+    if raw or created or old_status is None:
+        return  # у нового заказа еще нет позиций
+    statuses = get_sales_statuses()
+    was_counted, is_counted = old_status in statuses, instance.status in statuses
+    if was_counted != is_counted:
+        sign = 1 if is_counted else -1
+        quantities = order_quantities(instance.pk, using=using)
+        apply_sales({product_id: sign * quantity for product_id, quantity in quantities.items()},
+                    instance.created_date, using=using)
+
+
+@receiver(pre_save, sender=OrderProduct)
+def remember_order_item(sender, instance, using, raw=False, **kwargs):
+    instance._old_item = None
+    if not raw and instance.pk is not None:
+        instance._old_item = OrderProduct.objects.using(using).filter(pk=instance.pk).values_list(
+            'id_product_id', 'quantity').first()
+
+
+@receiver(pre_save, sender=OrderProduct)
+def set_item_unit_price(sender, instance, using, raw=False, **kwargs):
+    """Цена позиции — цена товара на момент добавления (в админке) или замены товара в позиции.
+    Оформление заказа (orders/services.py) задает ее само."""
+    old = getattr(instance, '_old_item', None)
+    if raw or (instance.unit_price is not None and not (old and old[0] != instance.id_product_id)):
+        return
+    instance.unit_price = Product.objects.using(using).filter(pk=instance.id_product_id).values_list(
+        'price', flat=True).get()
+
+
+@receiver(post_save, sender=OrderProduct)
+def update_sales_on_item_save(sender, instance, using, raw=False, **kwargs):
+    if raw or instance.id_order.status not in get_sales_statuses():
+        return
+    deltas = Counter({instance.id_product_id: instance.quantity})
+    old = getattr(instance, '_old_item', None)
+    if old:
+        deltas[old[0]] -= old[1]
+    apply_sales(deltas, instance.id_order.created_date, using=using)
+
+
+@receiver(post_delete, sender=OrderProduct)
+def update_sales_on_item_delete(sender, instance, using, **kwargs):
+    # при удалении заказа позиции удаляются раньше него, так что заказ еще в базе
+    order = instance.id_order
+    if order.status in get_sales_statuses():
+        apply_sales({instance.id_product_id: -instance.quantity}, order.created_date, using=using)
+
+
+# Полученные покупки для проверки права на отзыв (orders/purchases.py)
+
+@receiver(post_save, sender=Order)
+def update_purchases_on_status_change(sender, instance, created, using, raw=False, **kwargs):
+    old_status = getattr(instance, '_old_status', None)
+    if raw or created or old_status is None or (old_status == DELIVERED) == (instance.status == DELIVERED):
+        return
+    product_ids = order_product_ids(instance.pk, using=using)
+    if instance.status == DELIVERED:
+        add_purchases(instance.id_user_id, product_ids, using=using)
+    else:
+        refresh_purchases(instance.id_user_id, product_ids, using=using)
+
 
 @receiver(post_save, sender=OrderProduct)
-def update_order_total_on_save(sender, instance, **kwargs):
-    instance.id_order.update_total_cost()
+def update_purchases_on_item_save(sender, instance, using, raw=False, **kwargs):
+    order = instance.id_order
+    if raw or order.status != DELIVERED:
+        return
+    add_purchases(order.id_user_id, [instance.id_product_id], using=using)
+    old = getattr(instance, '_old_item', None)
+    if old and old[0] != instance.id_product_id:
+        refresh_purchases(order.id_user_id, [old[0]], using=using)
+
 
 @receiver(post_delete, sender=OrderProduct)
-def update_order_total_on_delete(sender, instance, **kwargs):
-    instance.id_order.update_total_cost()
+def update_purchases_on_item_delete(sender, instance, using, **kwargs):
+    order = instance.id_order
+    if order.status == DELIVERED:
+        refresh_purchases(order.id_user_id, [instance.id_product_id], using=using)
@@ -0,0 +1,257 @@
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from shop.exports import JSONL
+from shop.models import Product, Review
+from shop.testing import CatalogTestCase, MigrationTestCase, create_buyer
+
+from .exports import order_records
+from .recommendations import get_recommendations, rebuild_recommendations, update_recommendations
+from .models import DeliveredPurchase, Order, OrderProduct, ProductRecommendation
+from .purchases import review_eligibility
+from .services import place_order
+from .totals import wrong_totals
+
+unit_price_migration = import_module('orders.migrations.0006_orderproduct_unit_price')
+
+
+class OrderTestCase(CatalogTestCase):
+    product_count = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = create_buyer()
+
+
+class OrderCreateViewTests(OrderTestCase):
+    def test_deleted_product_is_dropped_from_checkout(self):
+        self.client.force_login(self.user)
+        for product in self.products[:2]:
+            self.client.post(f'/cart/api/add/{product.pk}/', {'quantity': 1})
+        self.products[1].delete()
+
+        response = self.client.post(reverse('orders:order_create'), {'address': 'Москва'})
+
+        order = Order.objects.get(id_user=self.user)
+        self.assertRedirects(response, reverse('orders:order_created', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(list(order.items.values_list('id_product', 'quantity')), [(self.products[0].pk, 1)])
+        self.assertEqual(order.total_cost, 100)
+
+
+class UnitPriceTests(OrderTestCase):
+    def test_cost_uses_price_at_checkout(self):
+        product = self.products[0]
+        order = place_order(Order(id_user=self.user, address='Москва'), {product.pk: 3})
+        Product.objects.filter(pk=product.pk).update(price=999)
+
+        item = OrderProduct.objects.get(id_order=order)
+        with self.assertNumQueries(0):
+            self.assertEqual(item.get_cost(), 300)
+        self.assertEqual(order.get_total_cost(), 300)
+
+
+class UnitPriceMigrationTests(MigrationTestCase):
+    before = [('orders', '0005_deliveredpurchase')]
+    after = [('orders', '0006_orderproduct_unit_price')]
+
+    def test_backfills_unit_price_in_batches(self):
+        Category = self.old_apps.get_model('shop', 'Category')
+        Product = self.old_apps.get_model('shop', 'Product')
+        Order = self.old_apps.get_model('orders', 'Order')
+        OrderProduct = self.old_apps.get_model('orders', 'OrderProduct')
+        category = Category.objects.create(title='Проза')
+        products = [Product.objects.create(title=f'Книга {number}', author='Автор', description='',
+                                           price=10 * number, quantity=1, id_category=category)
+                    for number in range(1, 4)]
+        order = Order.objects.create(address='Москва')
+        OrderProduct.objects.bulk_create([
+            OrderProduct(id_order=order, id_product=products[number % 3], quantity=2) for number in range(5)
+        ])
+
+        with mock.patch.object(unit_price_migration, 'BATCH_SIZE', 2):
+            new_apps = self.migrate()
+
+        items = new_apps.get_model('orders', 'OrderProduct').objects.order_by('pk')
+        self.assertEqual([item.unit_price for item in items], [10, 20, 30, 10, 20])
+
+
+class PlaceOrderTests(OrderTestCase):
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for size in (1, 5, 20):
+            quantities = {product.pk: 1 for product in self.products[:size]}
+            # списание, чтение остатков, заказ, позиции, продажи и точки сохранения
+            with self.subTest(size=size), self.assertNumQueries(7):
+                place_order(Order(id_user=self.user, address='Москва'), quantities)
+
+
+class OrderTotalTests(OrderTestCase):
+    def total_updates(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "orders_order" SET "total_cost"')]
+
+    def test_total_recomputed_once_per_transaction(self):
+        order = Order.objects.create(id_user=self.user, address='Москва')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for product in self.products:
+                    OrderProduct.objects.create(id_order=order, id_product=product, quantity=1)
+                items = list(order.items.all())
+                for item in items[:5]:
+                    item.quantity = 2
+                    item.save()
+                items[-1].delete()
+                self.assertEqual(self.total_updates(queries.captured_queries), [])
+
+        self.assertEqual(len(self.total_updates(queries.captured_queries)), 1)
+        order.refresh_from_db()
+        expected = sum(product.price for product in self.products[:-1]) + sum(p.price for p in self.products[:5])
+        self.assertEqual(order.total_cost, expected)
+
+    def test_repair_order_totals(self):
+        order = place_order(Order(id_user=self.user, address='Москва'), {self.products[0].pk: 2})
+        self.assertEqual(wrong_totals(), [])
+        Order.objects.filter(pk=order.pk).update(total_cost=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(wrong_totals(), [(order.pk, 1, 200)])
+
+        call_command('repair_order_totals', stdout=StringIO())
+
+        self.assertEqual(wrong_totals(), [])
+        order.refresh_from_db()
+        self.assertEqual(order.total_cost, 200)
+
+
+class OrderExportTests(OrderTestCase):
+    def test_items_are_prefetched_per_chunk(self):
+        quantities = {product.pk: 1 for product in self.products[:3]}
+        orders = [place_order(Order(id_user=self.user, address='Москва'), quantities) for _ in range(3)]
+        Order.objects.create(address='Самовывоз')  # заказ без позиций — одна строка без товара
+
+        # заказы одним запросом и по запросу позиций на каждую пачку из двух заказов
+        with self.assertNumQueries(3):
+            rows = list(order_records(Order.objects.all(), chunk_size=2))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual((rows[0]['order_id'], rows[0]['user_email'], rows[0]['product'], rows[0]['cost']),
+                         (orders[0].pk, self.user.email, 'Книга 1', 100))
+        self.assertEqual((rows[-1]['user_email'], rows[-1].get('product')), (None, None))
+
+        records = list(order_records(Order.objects.all(), JSONL))
+        self.assertEqual([len(record['items']) for record in records], [3, 3, 3, 0])
+
+
+class RecommendationTests(OrderTestCase):
+    def order(self, *products, status='delivered'):
+        order = place_order(Order(id_user=self.user, address='Москва'), {product.pk: 1 for product in products})
+        order.status = status
+        order.save()
+        return order
+
+    def recommendations(self):
+        lists = {}
+        for product_id, recommended_id in ProductRecommendation.objects.order_by('product', 'rank').values_list(
+                'product', 'recommended'):
+            lists.setdefault(product_id, []).append(recommended_id)
+        return lists
+
+    def test_incremental_refresh_matches_rebuild(self):
+        a, b, c, d = (product.pk for product in self.products[:4])
+        self.order(self.products[0], self.products[1])
+        self.order(self.products[0], self.products[1])
+        self.order(self.products[0], self.products[2])
+        self.order(self.products[0], self.products[3], status='new')  # еще не доставлен — не учитывается
+
+        self.assertEqual(update_recommendations(), (3, 3))
+        self.assertEqual(self.recommendations(), {a: [b, c], b: [a], c: [a]})
+        self.assertEqual(update_recommendations(), (0, 0))
+
+        self.order(self.products[1], self.products[2])
+        # список a не изменился (b по-прежнему ближе c), пересчитаны только b и c
+        self.assertEqual(update_recommendations(), (2, 2))
+        incremental = self.recommendations()
+        self.assertEqual(incremental, {a: [b, c], b: [a, c], c: [a, b]})
+
+        self.assertEqual(rebuild_recommendations(), (3, 0))
+        self.assertEqual(self.recommendations(), incremental)
+
+    def test_command_builds_lists(self):
+        self.order(self.products[0], self.products[1])
+        call_command('build_recommendations', stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(get_recommendations(self.products[0].pk), [self.products[1]])
+
+
+class DeliveredPurchaseTests(OrderTestCase):
+    def deliver(self, *products, status='delivered'):
+        order = place_order(Order(id_user=self.user, address='Москва'), {product.pk: 1 for product in products})
+        order.status = status
+        order.save()
+        return order
+
+    def purchases(self):
+        return set(DeliveredPurchase.objects.filter(user=self.user).values_list('product', flat=True))
+
+    def test_rows_follow_delivered_orders(self):
+        first = self.deliver(self.products[0], self.products[1])
+        second = self.deliver(self.products[0])
+        self.deliver(self.products[2], status='shipped')
+        self.assertEqual(self.purchases(), {self.products[0].pk, self.products[1].pk})
+
+        second.status = 'shipped'
+        second.save()
+        self.assertEqual(self.purchases(), {self.products[0].pk, self.products[1].pk})  # есть в первом заказе
+
+        first.items.get(id_product=self.products[1]).delete()
+        self.assertEqual(self.purchases(), {self.products[0].pk})
+        first.status = 'shipped'
+        first.save()
+        self.assertEqual(self.purchases(), set())
+
+    def test_unique_pairs(self):
+        self.deliver(self.products[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DeliveredPurchase.objects.create(user=self.user, product=self.products[0])
+        Review.objects.create(id_product=self.products[0], id_user=self.user, rating=5, text='Отлично')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Review.objects.create(id_product=self.products[0], id_user=self.user, rating=1, text='Еще раз')
+
+    def test_review_eligibility(self):
+        user = SimpleLazyObject(lambda: self.user)  # как request.user
+        product_id = self.products[0].pk
+        self.assertEqual(review_eligibility(user, product_id), (False, False))
+        self.deliver(self.products[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(review_eligibility(user, product_id), (True, False))
+        Review.objects.create(id_product_id=product_id, id_user=self.user, rating=5, text='Отлично')
+        self.assertEqual(review_eligibility(user, product_id), (True, True))
+
+
+class DeliveredPurchaseMigrationTests(MigrationTestCase):
+    before = [('orders', '0004_recommendations'), ('shop', '0010_product_sales')]
+    after = [('orders', '0005_deliveredpurchase')]
+
+    def test_backfills_distinct_pairs(self):
+        Category = self.old_apps.get_model('shop', 'Category')
+        Product = self.old_apps.get_model('shop', 'Product')
+        User = self.old_apps.get_model('users', 'CustomUser')
+        Order = self.old_apps.get_model('orders', 'Order')
+        OrderProduct = self.old_apps.get_model('orders', 'OrderProduct')
+        category = Category.objects.create(title='Проза')
+        book, other = [Product.objects.create(title=title, author='Автор', description='', price=100, quantity=10,
+                                              id_category=category) for title in ('Книга', 'Другая книга')]
+        user = User.objects.create(email='buyer@example.com', phone_number='79990000000', name='Покупатель')
+        for status, product in (('delivered', book), ('delivered', book), ('shipped', other)):
+            order = Order.objects.create(id_user=user, address='Москва', status=status)
+            OrderProduct.objects.create(id_order=order, id_product=product, quantity=1)
+        Order.objects.create(address='Москва', status='delivered').items.create(id_product=other, quantity=1)
+
+        new_apps = self.migrate()
+
+        purchases = new_apps.get_model('orders', 'DeliveredPurchase').objects.values_list('user', 'product')
+        self.assertEqual(list(purchases), [(user.pk, book.pk)])
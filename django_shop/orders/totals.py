@@ -0,0 +1,61 @@
+"""Итоговая стоимость заказа (Order.total_cost).
+
+Раньше каждое сохранение или удаление позиции вызывало Order.update_total_cost: сумма get_cost()
+в Python с отдельным запросом товара на каждую позицию и save() всего заказа. Правка заказа
+с 50 позициями в админке пересчитывала его 50 раз, каждый раз за 50 с лишним запросов.
+Теперь сигналы позиций только отмечают заказ (schedule_total_update), а при фиксации транзакции
+отмеченные заказы пересчитываются одним UPDATE с SUM по позициям на стороне базы —
+один раз на транзакцию, сколько бы позиций ни менялось. Позиции хранят цену на момент оформления
+(OrderProduct.unit_price), так что сумма считается по одной таблице позиций, без shop_product.
+
+Сверить все заказы одним агрегирующим запросом и исправить расхождения — команда repair_order_totals.
+"""
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderProduct
+
+
+def items_total(order=OuterRef('pk'), using='default'):
+    """Выражение: сумма позиций заказа order (по умолчанию — заказа из внешнего запроса), 0 без позиций."""
+    total = (OrderProduct.objects.using(using).filter(id_order=order).order_by().values('id_order')
+             .annotate(total=Sum(F('quantity') * F('unit_price'))).values('total'))
+    return Coalesce(Subquery(total), 0, output_field=DecimalField(max_digits=11, decimal_places=2))
+
+
+def update_totals(order_ids, using='default'):
+    """Пересчитывает total_cost заказов одним UPDATE."""
+    return Order.objects.using(using).filter(pk__in=order_ids).update(total_cost=items_total(using=using))
+
+
+class _PendingTotals:
+    """Колбэк on_commit: заказы транзакции, чьи суммы нужно пересчитать."""
+
+    def __init__(self, using):
+        self.using = using
+        self.order_ids = set()
+
+    def __call__(self):
+        update_totals(self.order_ids, using=self.using)
+
+
+def schedule_total_update(order_id, using='default'):
+    """Пересчитать сумму заказа при фиксации текущей транзакции (вне транзакции — сразу).
+    Все заказы транзакции пересчитываются одним колбэком; если транзакция откатится,
+    колбэк отбрасывается вместе с ней."""
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for _, callback, _ in connection.run_on_commit:
+            if isinstance(callback, _PendingTotals):
+                callback.order_ids.add(order_id)
+                return
+    pending = _PendingTotals(using)
+    pending.order_ids.add(order_id)
+    transaction.on_commit(pending, using=using)
+
+
+def wrong_totals(using='default'):
+    """Заказы с неверной суммой одним запросом: [(id, сохраненная сумма, сумма позиций)]."""
+    return list(Order.objects.using(using).order_by('pk').annotate(expected=items_total(using=using))
+                .exclude(total_cost=F('expected')).values_list('pk', 'total_cost', 'expected'))
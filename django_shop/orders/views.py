@@ -1,23 +1,24 @@
+from django.db.models import Prefetch
 from django.shortcuts import render, redirect, get_object_or_404
 from .forms import OrderCreateForm
 from cart.cart_services import Cart
-from .models import OrderProduct, Order
-from shop.models import Product
+from .models import Order, OrderProduct
+from .services import CheckoutError, place_order
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 
 
 def my_orders(request):
     # Предполагается, что пользователь уже аутентифицирован и его id доступен.
     user_id = request.user.id
-    orders = Order.objects.filter(id_user=user_id)  # Получение заказов для пользователя
+    # Позиции всех заказов — одним запросом; цены и суммы берутся из заказа, товар нужен только для карточки
+    items = OrderProduct.objects.select_related('id_product').only(
+        'id', 'id_order', 'quantity', 'unit_price', 'id_product__id', 'id_product__id_category',
+        'id_product__title', 'id_product__author', 'id_product__image').order_by('pk')
+    orders = Order.objects.filter(id_user=user_id).prefetch_related(Prefetch('items', queryset=items))
 
     # Для каждого заказа получаем соответствующие продукты
-    orders_with_products = []
-    for order in orders:
-        products = order.items.all()  # Используя related_name для доступа к продуктам
-        orders_with_products.append((order, products))
+    orders_with_products = [(order, order.items.all()) for order in orders]
 
     return render(request, 'orders/my_orders.html', {'orders_with_products': orders_with_products})
 
@@ -28,36 +29,19 @@ def order_create(request):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            with transaction.atomic():
-                order = form.save(commit=False)
-                order.id_user = request.user
-                order.save()
-
-                for item in cart.get_cart_items_with_products():  # Используйте метод get_cart_items_with_products
-                    product = item['product']
-                    quantity = item['quantity']
-                    if product.quantity < quantity:
-                        # Если товара недостаточно, добавляем сообщение об ошибке
-                        messages.error(request, f'Недостаточно товара в наличии')
-                        # И перенаправляем пользователя обратно на страницу формы
-                        return redirect('orders:order_create')
-
-                    OrderProduct.objects.create(
-                        id_order=order,
-                        id_product=product,
-                        quantity=quantity
-                    )
-
-                    # Обновляем количество на складе
-                    product.quantity -= quantity
-                    product.save()
-
-                # Обновляем общую стоимость заказа и сохраняем заказ
-                order.update_total_cost()
-
-                cart.clear_cart()  # Очищаем корзину
-                # Перенаправляем пользователя на страницу подтверждения
-                return redirect('orders:order_created', order_id=order.id)
+            order = form.save(commit=False)
+            order.id_user = request.user
+            # по строкам корзины: товары, удаленные из каталога, из нее убираются
+            quantities = {line.product.id: line.quantity for line in cart.get_cart_items_with_products()}
+            try:
+                place_order(order, quantities, cart.get_reservation_key())
+            except CheckoutError as error:
+                messages.error(request, str(error))
+                return redirect('orders:order_create')
+
+            cart.clear_cart()  # Очищаем корзину
+            # Перенаправляем пользователя на страницу подтверждения
+            return redirect('orders:order_created', order_id=order.id)
         else:
             # Если форма не валидна, мы также добавим сообщение об ошибке
             messages.error(request, 'Ошибка в форме заказа.')
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from django.utils.safestring import mark_safe
+from django.utils.html import format_html
+from .exports import PRODUCT_COLUMNS, REVIEW_COLUMNS, ExportActionsMixin, product_records, review_records
 from .models import Product, Category, Review
 
 
@@ -14,18 +15,39 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ExportActionsMixin, admin.ModelAdmin):
     list_display = ['title', 'author', 'id_category', 'price', 'quantity', 'get_html_photo']
     list_filter = ['id_category']
     ordering = ['title']
     search_fields = ['title', 'author']
     inlines = [OrderReviewInline]  # связываем отзывы с товарами
+    actions = ['export_csv', 'export_jsonl']
+    export_name = 'products'
+    export_columns = PRODUCT_COLUMNS
+
+    def export_records(self, queryset, file_format):
+        return product_records(queryset)
 
     #  метод для отображения миниатюр в админке
     def get_html_photo(self, object):  # object тут ссылается на запись из таблицы (ЭК модели Product)
-        if object.image:
-            return mark_safe(
-                f"<img src='{object.image.url}' class='admin-thumbnail'>")  # ф-ия mark_safe позволяет не экранировать то, что мы в нее передаем
+        image = object.image_sources()
+        if image:
+            # самая маленькая копия из srcset (если уже создана), иначе оригинал
+            src = image['srcset'].split(' ', 1)[0] if image['srcset'] else image['src']
+            return format_html("<img src='{}' class='admin-thumbnail' loading='lazy'>", src)
 
     get_html_photo.short_description = 'Миниатюра '
 
+
+@admin.register(Review)
+class ReviewAdmin(ExportActionsMixin, admin.ModelAdmin):
+    list_display = ['id', 'id_product', 'id_user', 'rating', 'created_date']
+    list_filter = ['rating', 'created_date']
+    list_select_related = ['id_product', 'id_user']
+    raw_id_fields = ['id_product', 'id_user']
+    actions = ['export_csv', 'export_jsonl']
+    export_name = 'reviews'
+    export_columns = REVIEW_COLUMNS
+
+    def export_records(self, queryset, file_format):
+        return review_records(queryset)
@@ -7,4 +7,7 @@ class ShopConfig(AppConfig):
                                                           # по умолчанию для всех моделей в данном приложении. Если PK не задан-будет использоваться PK типа BigAutoField
     name = 'shop'
     verbose_name = 'Книжный магазин'  # это имя может быть использовано в разных модулях Джанго, в том числе для отображения в админке
-                                                # сработает только если мы зарегистрируем наше приложение в settings  с использованием ShopConfig
\ No newline at end of file
+                                                # сработает только если мы зарегистрируем наше приложение в settings  с использованием ShopConfig
+
+    def ready(self):
+        from . import signals  # подключаем обработчики сигналов (поисковый индекс и т.д.)
@@ -0,0 +1,139 @@
+"""Подсказки при вводе поискового запроса (search-as-you-type).
+
+Индекс — отсортированный список ключей (нормализованная строка, начиная с каждого
+слова названия или автора), по которому префикс ищется бинарным поиском (bisect).
+Живет в памяти процесса и обновляется по ленте изменений товаров (shop/local_index.py),
+поэтому ответ на запрос не обращается к базе данных. Исключение — несколько секунд после запуска
+воркера, пока индекс строится в фоне: тогда подсказки по названиям берутся из базы (suggest_from_database).
+"""
+from bisect import bisect_left, insort
+
+from django.db.models import Q
+
+from .local_index import ProcessLocalIndex
+from .search import normalize_search_text
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+SCAN_LIMIT = 200  # сколько ключей с подходящим префиксом просматривается для ранжирования
+
+TITLE = 'title'
+AUTHOR = 'author'
+
+
+def _word_suffixes(text):
+    """'лев толстой' -> [(0, 'лев толстой'), (1, 'толстой')]: по ключу с каждого слова."""
+    words = text.split()
+    return [(position, ' '.join(words[position:])) for position in range(len(words))]
+
+
+class PrefixIndex(ProcessLocalIndex):
+    """Ключи хранятся как кортежи (ключ, номер слова, вид, id товара) в отсортированном списке _keys.
+    Для каждого товара запоминаются его ключи, чтобы при изменении удалить старые."""
+
+    def __init__(self):
+        super().__init__()
+        self.clear()
+
+    def clear(self):
+        self._keys = []
+        self._product_keys = {}
+        self._products = {}  # id -> (название, автор, id категории)
+
+    def __len__(self):
+        return len(self._products)
+
+    def _make_keys(self, product_id, payload):
+        keys = []
+        for kind, text in ((TITLE, payload['title']), (AUTHOR, payload['author'])):
+            for position, key in _word_suffixes(normalize_search_text(text)):
+                keys.append((key, position, kind, product_id))
+        return keys
+
+    def load(self, rows):
+        """Быстрое построение: сначала все ключи, затем одна сортировка."""
+        for product_id, payload in rows:
+            keys = self._make_keys(product_id, payload)
+            self._product_keys[product_id] = keys
+            self._products[product_id] = (payload['title'], payload['author'], payload['category_id'])
+            self._keys.extend(keys)
+        self._keys.sort()
+
+    def add(self, product_id, payload):
+        self.remove(product_id)
+        keys = self._make_keys(product_id, payload)
+        for key in keys:
+            insort(self._keys, key)
+        self._product_keys[product_id] = keys
+        self._products[product_id] = (payload['title'], payload['author'], payload['category_id'])
+
+    def remove(self, product_id):
+        for key in self._product_keys.pop(product_id, ()):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        self._products.pop(product_id, None)
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Возвращает до limit подсказок: сначала совпадения с начала строки, затем с начала слова,
+        названия раньше авторов. Одинаковые названия и авторы выводятся один раз."""
+        prefix = normalize_search_text(prefix)
+        if not prefix:
+            return []
+        keys = self._keys
+        start = bisect_left(keys, (prefix,))
+        matches = []
+        for key, position, kind, product_id in keys[start:start + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            matches.append((position > 0, kind != TITLE, len(key), key, kind, product_id))
+        matches.sort()
+
+        suggestions = []
+        seen = set()
+        products = self._products
+        for _, _, _, _, kind, product_id in matches:
+            if product_id not in products:  # товар удален, пока шел поиск
+                continue
+            title, author, category_id = products[product_id]
+            value = title if kind == TITLE else author
+            if (kind, value) in seen:
+                continue
+            seen.add((kind, value))
+            suggestions.append({'type': kind, 'value': value, 'product_id': product_id, 'category_id': category_id})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+prefix_index = PrefixIndex()
+
+
+def suggest_from_database(prefix, limit=DEFAULT_LIMIT):
+    """Подсказки без индекса: товары, у которых с prefix начинается слово названия или автора
+    (по нормализованному search_text). Ранжирования, как у индекса, нет."""
+    from .models import Product
+
+    prefix = normalize_search_text(prefix)
+    if not prefix:
+        return []
+    rows = (Product.objects.filter(Q(search_text__startswith=prefix) | Q(search_text__contains=' ' + prefix))
+            .order_by('title', 'id').values_list('id', 'title', 'author', 'id_category_id')[:SCAN_LIMIT])
+    suggestions = []
+    seen = set()
+    for product_id, title, author, category_id in rows:
+        in_title = any(key.startswith(prefix) for _, key in _word_suffixes(normalize_search_text(title)))
+        kind, value = (TITLE, title) if in_title else (AUTHOR, author)
+        if (kind, value) in seen:
+            continue
+        seen.add((kind, value))
+        suggestions.append({'type': kind, 'value': value, 'product_id': product_id, 'category_id': category_id})
+        if len(suggestions) >= limit:
+            break
+    return suggestions
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    if not prefix_index.ensure_fresh():
+        return suggest_from_database(prefix, limit=limit)
+    return prefix_index.suggest(prefix, limit=limit)
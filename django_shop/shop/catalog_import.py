@@ -0,0 +1,344 @@
+"""Массовый импорт каталога из CSV или JSONL (команда import_catalog).
+
+Файл читается потоково, строка за строкой, и обрабатывается пачками фиксированного размера,
+поэтому память не зависит от размера файла. Для каждой пачки:
+- категории находятся по названию в словаре в памяти (новые создаются одним bulk_create);
+- строки проверяются по тем же правилам, что и Product.clean (длины полей, цена >= 0),
+  но сразу для всей пачки и без создания объектов модели для ошибочных строк;
+- уже существующие товары (совпадают название и автор) находятся одним запросом;
+- изображения скачиваются или копируются в media пулом потоков;
+- запись — bulk_create и один executemany UPDATE в одной транзакции на пачку.
+После каждой пачки в файл контрольной точки записывается число обработанных строк,
+и прерванный импорт можно продолжить с того же места (--resume).
+
+bulk-операции не вызывают сигналы модели, поэтому после импорта полнотекстовый индекс,
+счетчики фильтров, индексы в памяти воркеров и кэш страниц перестраиваются целиком.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlparse
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import page_cache, thumbnails
+from .facets import rebuild_facet_counts
+from .local_index import reset_feed
+from .models import Category, Product
+from .search import normalize_search_text, rebuild_fts_table
+
+COLUMNS = ('title', 'author', 'description', 'price', 'quantity', 'category', 'image')
+UPDATE_FIELDS = ('description', 'price', 'quantity', 'id_category', 'image', 'search_text', 'updated_at')
+IMAGE_DIR = 'catalog'
+DOWNLOAD_TIMEOUT = 30
+MAX_ERRORS_SHOWN = 20
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    images: int = 0
+    errors: list = field(default_factory=list)  # первые MAX_ERRORS_SHOWN ошибок: (номер строки, текст)
+    error_count: int = 0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS_SHOWN:
+            self.errors.append((line, message))
+
+
+def read_rows(path, file_format=None):
+    """Генератор словарей из CSV (с заголовком) или JSONL."""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _limits():
+    """Максимальные длины строковых полей и формат цены берутся из модели, как в Product.clean."""
+    meta = Product._meta
+    price = meta.get_field('price')
+    return ({name: meta.get_field(name).max_length for name in ('title', 'author', 'description')},
+            Decimal(1).scaleb(-price.decimal_places), price.max_digits - price.decimal_places)
+
+
+def validate_batch(rows, first_line, categories, stats):
+    """Проверяет пачку строк. Возвращает [(номер строки, значения полей)] для корректных строк
+    и названия неизвестных категорий."""
+    max_lengths, price_step, max_integer_digits = _limits()
+    valid = []
+    missing_categories = set()
+    for line, row in enumerate(rows, start=first_line):
+        values = {name: (str(row.get(name) or '')).strip() for name in COLUMNS}
+        problems = [f'{name}: не заполнено' for name in ('title', 'author', 'price', 'category') if not values[name]]
+        problems += [f'{name}: длиннее {limit} символов' for name, limit in max_lengths.items()
+                     if len(values[name]) > limit]
+        try:
+            price = Decimal(values['price'].replace(',', '.')).quantize(price_step)
+            if price < 0:
+                problems.append('price: цена должна быть положительной')
+            elif len(str(int(price))) > max_integer_digits:
+                problems.append('price: слишком большое значение')
+        except (InvalidOperation, ValueError):
+            price = None
+            if values['price']:
+                problems.append('price: не число')
+        try:
+            quantity = int(values['quantity'] or 0)
+            if quantity < 0:
+                problems.append('quantity: отрицательное количество')
+        except ValueError:
+            quantity = None
+            problems.append('quantity: не целое число')
+        if problems:
+            stats.add_error(line, '; '.join(problems))
+            continue
+        if values['category'] not in categories:
+            missing_categories.add(values['category'])
+        values.update(price=price, quantity=quantity, description=values['description'] or None)
+        valid.append((line, values))
+    return valid, missing_categories
+
+
+def _stored_name(source):
+    """Имя копии зависит от источника: повторный импорт (или продолжение после сбоя) не плодит файлы."""
+    basename = os.path.basename(urlparse(source).path) or 'image'
+    return f'{IMAGE_DIR}/{hashlib.sha1(source.encode()).hexdigest()[:12]}-{basename}'
+
+
+def resolve_image(source, cache):
+    """Имя файла в хранилище для значения колонки image: URL скачивается, абсолютный путь
+    или путь, которого нет в media, копируется, имя файла в media используется как есть.
+    Одинаковые источники обрабатываются один раз."""
+    if not source:
+        return ''
+    if source in cache:
+        return cache[source]
+    if urlparse(source).scheme in ('http', 'https'):
+        stored = _stored_name(source)
+        if not default_storage.exists(stored):
+            with urllib.request.urlopen(source, timeout=DOWNLOAD_TIMEOUT) as response:
+                stored = default_storage.save(stored, File(response, name=os.path.basename(stored)))
+    elif not os.path.isabs(source) and default_storage.exists(source):
+        stored = source
+    else:
+        stored = _stored_name(source)
+        if not default_storage.exists(stored):
+            with open(source, 'rb') as file:
+                stored = default_storage.save(stored, File(file))
+    cache[source] = stored
+    return stored
+
+
+def update_products(products):
+    """UPDATE по первичному ключу одним executemany. QuerySet.bulk_update строит выражение
+    CASE WHEN на каждое поле каждой строки, и на пачках в тысячи строк почти все время уходит
+    на сборку SQL в Python, а не на работу базы."""
+    if not products:
+        return
+    fields = [Product._meta.get_field(name) for name in UPDATE_FIELDS]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Product._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(Product._meta.pk.column),
+    )
+    params = [[field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields]
+              + [product.pk] for product in products]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=1000, create_categories=False, update_existing=True, image_workers=8,
+                 thumbnails_enabled=True, checkpoint_path=None, stdout=None):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.update_existing = update_existing
+        self.image_workers = image_workers
+        self.thumbnails_enabled = thumbnails_enabled
+        self.checkpoint_path = checkpoint_path
+        self.stdout = stdout
+        self.stats = ImportStats()
+        self.categories = {category.title: category.pk for category in Category.objects.all()}
+        self._image_cache = {}
+        self._pending_thumbnails = []
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    # контрольная точка
+
+    def load_checkpoint(self, path):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as file:
+            checkpoint = json.load(file)
+        if checkpoint.get('source') != os.path.abspath(path):
+            return 0
+        return checkpoint['rows']
+
+    def save_checkpoint(self, path, rows):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'source': os.path.abspath(path), 'rows': rows}, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # импорт
+
+    def run(self, path, file_format=None, resume=False):
+        skip = self.load_checkpoint(path) if resume else 0
+        if skip:
+            self.log(f'Продолжаем с контрольной точки: пропускаем {skip} строк')
+        started = time.perf_counter()
+        batch = []
+        line = 0
+        with ThreadPoolExecutor(max_workers=self.image_workers) as image_pool:
+            for line, row in enumerate(read_rows(path, file_format), start=1):
+                if line <= skip:
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch, line - len(batch) + 1, image_pool)
+                    self.save_checkpoint(path, line)
+                    batch = []
+                    self.report(started)
+            if batch:
+                self.import_batch(batch, line - len(batch) + 1, image_pool)
+                self.save_checkpoint(path, line)
+        self.wait_thumbnails()
+        self.finish()
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.report(started)
+        return self.stats
+
+    def report(self, started):
+        elapsed = time.perf_counter() - started
+        stats = self.stats
+        self.log(f'строк: {stats.rows}, создано: {stats.created}, обновлено: {stats.updated}, '
+                 f'ошибок: {stats.error_count}, {stats.rows / elapsed if elapsed else 0:.0f} строк/с')
+
+    def ensure_categories(self, titles):
+        if not titles or not self.create_categories:
+            return
+        Category.objects.bulk_create([Category(title=title) for title in titles], ignore_conflicts=True)
+        self.categories.update(Category.objects.filter(title__in=titles).values_list('title', 'pk'))
+
+    def import_batch(self, rows, first_line, image_pool):
+        self.stats.rows += len(rows)
+        valid, missing = validate_batch(rows, first_line, self.categories, self.stats)
+        self.ensure_categories(missing)
+        prepared = []
+        for line, values in valid:
+            if values['category'] not in self.categories:
+                self.stats.add_error(line, f'category: неизвестная категория «{values["category"]}»')
+            else:
+                prepared.append((line, values))
+
+        images = []
+        for (line, _), (image, error) in zip(prepared, image_pool.map(self._resolve_image_safe,
+                                                                      [values['image'] for _, values in prepared])):
+            if error:
+                self.stats.add_error(line, f'image: {error}')
+            images.append(image)
+
+        titles = {values['title'] for _, values in prepared}
+        existing = {}
+        for product in Product.objects.filter(title__in=titles).only('id', 'title', 'author', 'image', 'image_variants'):
+            existing.setdefault((product.title, product.author), product)
+
+        now = timezone.now()
+        to_create, to_update, seen = [], [], set()
+        for (line, values), image in zip(prepared, images):
+            key = (values['title'], values['author'])
+            if key in seen:  # повтор внутри пачки — берем первую строку
+                self.stats.skipped += 1
+                continue
+            seen.add(key)
+            product = existing.get(key)
+            if product is not None and not self.update_existing:
+                self.stats.skipped += 1
+                continue
+            if product is None:
+                product = Product(title=values['title'], author=values['author'])
+                to_create.append(product)
+            else:
+                to_update.append(product)
+            product.description = values['description']
+            product.price = values['price']
+            product.quantity = values['quantity']
+            product.id_category_id = self.categories[values['category']]
+            if image:
+                product.image = image
+            product.search_text = normalize_search_text(product.title, product.author)
+            product.updated_at = now
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            update_products(to_update)
+        self.stats.created += len(to_create)
+        self.stats.updated += len(to_update)
+        self.schedule_thumbnails(to_create + to_update)
+
+    def _resolve_image_safe(self, source):
+        """Выполняется в потоке пула: (имя файла, None) или ('', ошибка) — товар импортируется без изображения."""
+        try:
+            return resolve_image(source, self._image_cache), None
+        except (OSError, ValueError) as error:
+            return '', error
+
+    def schedule_thumbnails(self, products):
+        """Копии изображений генерируются в пуле процессов; ждем предыдущую пачку,
+        чтобы число незавершенных задач (и память) не росло с размером файла."""
+        if not self.thumbnails_enabled:
+            return
+        self.wait_thumbnails()
+        by_image = {}
+        for product in products:
+            if product.image and (product.image_variants or {}).get('source') != product.image.name:
+                by_image.setdefault(product.image.name, []).append(product.pk)
+        executor = thumbnails.get_executor()
+        for image_name, product_ids in by_image.items():
+            future = executor.submit(thumbnails.render_variants, default_storage.path(image_name),
+                                     thumbnails.build_targets(image_name))
+            self._pending_thumbnails.append((future, image_name, product_ids))
+
+    def wait_thumbnails(self):
+        for future, image_name, product_ids in self._pending_thumbnails:
+            try:
+                source_width, created = future.result()
+            except Exception as error:
+                self.stats.add_error(0, f'{image_name}: {error}')
+                continue
+            thumbnails.save_variants(product_ids, image_name, source_width, created)
+            self.stats.images += 1
+        self._pending_thumbnails = []
+
+    def finish(self):
+        """bulk-операции обходят сигналы — перестраиваем все, что сигналы поддерживают инкрементально."""
+        with transaction.atomic():
+            rebuild_fts_table()
+        rebuild_facet_counts()
+        reset_feed()
+        page_cache.invalidate_all()
@@ -0,0 +1,85 @@
+"""Список категорий, закэшированный в памяти каждого процесса (воркера).
+
+Категории нужны на каждой странице (меню в base.html), а меняются редко. Поэтому каждый
+воркер держит их у себя и перед обращением сверяет свою версию с ключом shop:categories:version
+в общем кэше (одно обращение к кэшу, без запросов к базе). Сигналы Category после коммита
+записывают в этот ключ новую версию, и все воркеры перечитывают категории при следующем запросе.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.http import Http404
+
+VERSION_KEY = 'shop:categories:version'
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # ключа еще нет или он вытеснен — заводим новую версию, все воркеры перечитают категории
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Сообщает всем воркерам, что категории изменились."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class CategoryRegistry:
+    """Категории в порядке Category.Meta.ordering и словарь id -> категория.
+    Объекты общие для всех запросов процесса, изменять их нельзя."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._categories = []
+        self._by_id = {}
+        self._last_modified = None
+
+    def _ensure_fresh(self):
+        version = _current_version()
+        if version == self._version:
+            return
+        from .models import Category
+
+        with self._lock:
+            if version == self._version:
+                return
+            # версия прочитана до запроса: если категории изменятся во время чтения, версия сменится
+            # и список будет перечитан при следующем обращении
+            categories = list(Category.objects.all())
+            self._categories = categories
+            self._by_id = {category.pk: category for category in categories}
+            self._last_modified = max((category.updated_at for category in categories), default=None)
+            self._version = version
+
+    def all(self):
+        self._ensure_fresh()
+        return self._categories
+
+    def state(self):
+        """(версия, время последнего изменения категорий) — для ETag и Last-Modified страниц."""
+        self._ensure_fresh()
+        return self._version, self._last_modified
+
+    def get(self, pk):
+        """Категория по id или None."""
+        self._ensure_fresh()
+        return self._by_id.get(pk)
+
+
+category_registry = CategoryRegistry()
+
+
+def get_categories():
+    return category_registry.all()
+
+
+def get_category_or_404(pk):
+    category = category_registry.get(pk)
+    if category is None:
+        raise Http404('Категория не найдена')
+    return category
@@ -0,0 +1,87 @@
+"""Условные GET-запросы (ETag / Last-Modified) для страниц каталога и товара.
+
+Валидаторы считаются без рендера страницы и без запросов к базе для списков: ETag каталога
+и категории строится из тех же версий, что и ключ кэша страниц (shop/page_cache.py), — их меняют
+сигналы товаров и отзывов после коммита. У версий нет времени изменения, поэтому Last-Modified
+для списков не выдается. Для страницы товара — по updated_at и рейтингу товара; во все ETag входит
+версия списка категорий из кэша процесса (меню на каждой странице). Порядок списков по продажам
+(?sort=bestsellers|trending) зависит от заказов, поэтому для них в ETag добавляется версия продаж.
+Если If-None-Match / If-Modified-Since совпадают, декоратор condition сразу отвечает 304.
+
+Страницы содержат данные пользователя (меню профиля, csrf-токен, кнопку отзыва), поэтому
+валидаторы выдаются только анонимным посетителям. Счетчик корзины в шапке у анонима свой, поэтому
+сумма и количество его корзины входят в ETag, а Last-Modified при непустой корзине не выдается:
+по одной дате нельзя понять, что корзина изменилась.
+"""
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .categories import category_registry
+from .page_cache import CATALOG_VERSION_KEY, CATEGORY_VERSION_KEY, SALES_VERSION_KEY, get_versions
+from .sales import get_ranking
+
+
+def _make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _cart_state(request):
+    """Сумма и количество товаров корзины посетителя (без запросов к базе) или None, если корзина пуста."""
+    from cart.storage import get_cart_storage
+
+    storage = get_cart_storage(request)
+    if not storage.items:
+        return None
+    return str(storage.total), sum(quantity for quantity, _ in storage.items.values())
+
+
+def _validators(request, key, compute):
+    """(etag, last_modified) для запроса; считаются один раз, хотя condition спрашивает их по отдельности."""
+    if request.user.is_authenticated:
+        return None, None
+    cache = request.__dict__.setdefault('_shop_validators', {})
+    if key not in cache:
+        categories_version, categories_modified = category_registry.state()
+        state, modified = compute()
+        if state is None:
+            cache[key] = None, None
+        else:
+            cart = _cart_state(request)
+            modified = None if cart else max(filter(None, (modified, categories_modified)), default=None)
+            cache[key] = _make_etag(key, categories_version, state, cart), modified
+    return cache[key]
+
+
+def catalog_validators(request, category_id=None):
+    ranking = get_ranking(request.GET)
+
+    def compute():
+        keys = [CATALOG_VERSION_KEY if category_id is None else CATEGORY_VERSION_KEY.format(category_id)]
+        if ranking:
+            keys.append(SALES_VERSION_KEY)
+        return tuple(get_versions(keys)), None
+
+    etag, _ = _validators(request, ('catalog', category_id, ranking), compute)
+    return etag, None
+
+
+def product_validators(request, product_id):
+    from .models import Product
+
+    def compute():
+        state = Product.objects.filter(pk=product_id).values_list('updated_at', 'rating_count', 'rating_sum').first()
+        return state, state[0] if state else None
+
+    return _validators(request, ('product', product_id), compute)
+
+
+def conditional_page(validators):
+    """Декоратор класса-представления: condition() для метода get. validators(request, **kwargs)
+    возвращает (etag, last_modified)."""
+    decorator = condition(
+        etag_func=lambda request, *args, **kwargs: validators(request, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: validators(request, **kwargs)[1],
+    )
+    return method_decorator(decorator, name='get')
@@ -0,0 +1,166 @@
+"""Фильтры каталога (автор, диапазон цены, наличие) и количество товаров для каждого значения.
+
+Количества не считаются GROUP BY на каждый запрос: они хранятся в таблице FacetCount
+и меняются на +1/-1 сигналами товаров (shop/signals.py). Для каждой категории есть своя
+«область» (scope = id категории), для всего каталога — scope = 0. Прочитанные из таблицы
+значения дополнительно кэшируются, кэш области сбрасывается при изменении товаров в ней.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+CATALOG_SCOPE = 0
+AUTHOR = 'author'
+PRICE = 'price'
+IN_STOCK = 'in_stock'
+AUTHORS_SHOWN = 15  # сколько авторов показывать в фильтре
+CACHE_KEY = 'shop:facets:{}'
+CACHE_TIMEOUT = 60 * 60
+
+# (значение в URL, подпись, нижняя граница включительно, верхняя граница не включительно)
+PRICE_RANGES = (
+    ('0-300', 'до 300 ₽', Decimal('0'), Decimal('300')),
+    ('300-600', '300 – 600 ₽', Decimal('300'), Decimal('600')),
+    ('600-1000', '600 – 1000 ₽', Decimal('600'), Decimal('1000')),
+    ('1000-', 'от 1000 ₽', Decimal('1000'), None),
+)
+
+
+def price_range_key(price):
+    for key, _, low, high in PRICE_RANGES:
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+def facet_values(author, price, quantity):
+    """Значения фильтров, к которым относится товар с такими полями."""
+    values = [(AUTHOR, author)]
+    price_key = price_range_key(price) if price is not None else None
+    if price_key:
+        values.append((PRICE, price_key))
+    if quantity and quantity > 0:
+        values.append((IN_STOCK, '1'))
+    return values
+
+
+def product_facet_keys(category_id, author, price, quantity):
+    """Ключи (scope, facet, value) товара: в его категории и во всем каталоге."""
+    values = facet_values(author, price, quantity)
+    return [(scope, facet, value) for scope in (CATALOG_SCOPE, category_id) for facet, value in values]
+
+
+def apply_deltas(deltas, using='default'):
+    """Применяет изменения количеств {(scope, facet, value): delta} через UPDATE ... count = count + delta."""
+    from .models import FacetCount
+
+    scopes = set()
+    for (scope, facet, value), delta in deltas.items():
+        if not delta:
+            continue
+        scopes.add(scope)
+        rows = FacetCount.objects.using(using).filter(scope=scope, facet=facet, value=value)
+        if rows.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                FacetCount.objects.using(using).create(scope=scope, facet=facet, value=value, count=delta)
+        except IntegrityError:  # строку успел создать параллельный запрос
+            rows.update(count=F('count') + delta)
+    for scope in scopes:
+        transaction.on_commit(lambda scope=scope: cache.delete(CACHE_KEY.format(scope)), using=using)
+
+
+def diff_keys(old_keys, new_keys):
+    deltas = Counter()
+    for key in old_keys:
+        deltas[key] -= 1
+    for key in new_keys:
+        deltas[key] += 1
+    return deltas
+
+
+def rebuild_facet_counts(using='default'):
+    """Пересчитывает всю таблицу FacetCount агрегатными запросами."""
+    from .models import FacetCount, Product
+
+    products = Product.objects.using(using)
+    counts = Counter()
+    for scope_field in (None, 'id_category_id'):
+        group = [scope_field] if scope_field else []
+        for row in products.values(*group, 'author').annotate(n=Count('id')):
+            counts[(row.get(scope_field, CATALOG_SCOPE), AUTHOR, row['author'])] += row['n']
+        for row in products.filter(quantity__gt=0).values(*group).annotate(n=Count('id')):
+            counts[(row.get(scope_field, CATALOG_SCOPE), IN_STOCK, '1')] += row['n']
+        for key, _, low, high in PRICE_RANGES:
+            in_range = products.filter(price__gte=low)
+            if high is not None:
+                in_range = in_range.filter(price__lt=high)
+            for row in in_range.values(*group).annotate(n=Count('id')):
+                counts[(row.get(scope_field, CATALOG_SCOPE), PRICE, key)] += row['n']
+
+    with transaction.atomic(using=using):
+        FacetCount.objects.using(using).all().delete()
+        FacetCount.objects.using(using).bulk_create(
+            [FacetCount(scope=scope, facet=facet, value=value, count=n)
+             for (scope, facet, value), n in counts.items() if n > 0],
+            batch_size=1000,
+        )
+    cache.delete_many([CACHE_KEY.format(scope) for scope in {key[0] for key in counts} | {CATALOG_SCOPE}])
+
+
+def get_facet_counts(scope=CATALOG_SCOPE):
+    """Возвращает {'author': [(значение, количество), ...], 'price': {...}, 'in_stock': n}."""
+    key = CACHE_KEY.format(scope)
+    facets = cache.get(key)
+    if facets is None:
+        from .models import FacetCount
+
+        rows = FacetCount.objects.filter(scope=scope, count__gt=0).values_list('facet', 'value', 'count')
+        authors, prices, in_stock = [], {}, 0
+        for facet, value, count in rows:
+            if facet == AUTHOR:
+                authors.append((value, count))
+            elif facet == PRICE:
+                prices[value] = count
+            elif facet == IN_STOCK:
+                in_stock = count
+        authors.sort(key=lambda item: (-item[1], item[0]))
+        facets = {AUTHOR: authors[:AUTHORS_SHOWN], PRICE: prices, IN_STOCK: in_stock}
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
+
+
+def apply_facet_filters(queryset, params):
+    """Применяет выбранные в GET-параметрах фильтры к queryset товаров."""
+    author = params.get(AUTHOR)
+    if author:
+        queryset = queryset.filter(author=author)
+    price = params.get(PRICE)
+    for key, _, low, high in PRICE_RANGES:
+        if price == key:
+            condition = Q(price__gte=low)
+            if high is not None:
+                condition &= Q(price__lt=high)
+            queryset = queryset.filter(condition)
+    if params.get(IN_STOCK):
+        queryset = queryset.filter(quantity__gt=0)
+    return queryset
+
+
+def build_facet_context(scope, params):
+    """Данные для панели фильтров в шаблоне list.html."""
+    counts = get_facet_counts(scope)
+    selected_author = params.get(AUTHOR, '')
+    selected_price = params.get(PRICE, '')
+    return {
+        'authors': [{'value': value, 'count': count, 'selected': value == selected_author}
+                    for value, count in counts[AUTHOR]],
+        'prices': [{'value': key, 'label': label, 'count': counts[PRICE].get(key, 0), 'selected': key == selected_price}
+                   for key, label, _, _ in PRICE_RANGES],
+        'in_stock': {'count': counts[IN_STOCK], 'selected': bool(params.get(IN_STOCK))},
+        'active': bool(selected_author or selected_price or params.get(IN_STOCK)),
+    }
@@ -0,0 +1,137 @@
+"""Нечеткий (устойчивый к опечаткам) поиск по названию и автору на триграммах.
+
+Каждое слово дополняется пробелами ("  лев ") и режется на триграммы, как в pg_trgm.
+Индекс — инвертированный словарь «триграмма -> список id товаров», который живет
+в памяти процесса (см. shop/local_index.py).
+
+Оценка совпадения: доля триграмм запроса, найденных у товара (аналог word_similarity
+из pg_trgm), при равенстве — коэффициент Жаккара по всем триграммам товара.
+
+Пока индекс процесса строится (в фоне, после запуска воркера), поиск идет в базе: товары,
+у которых совпало хотя бы одно слово запроса (search_database).
+"""
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .local_index import ProcessLocalIndex
+from .search import normalize_search_text
+
+DEFAULT_LIMIT = 100
+DEFAULT_THRESHOLD = 0.5
+COMPACT_RATIO = 0.25  # доля устаревших записей в списках, после которой списки пересобираются
+
+
+def make_trigrams(text):
+    trigrams = set()
+    for word in normalize_search_text(text).split():
+        padded = '  {} '.format(word)
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(trigrams)
+
+
+class TrigramIndex(ProcessLocalIndex):
+    """Инвертированный индекс триграмм.
+
+    Списки id в _postings только дополняются: при изменении или удалении товара
+    старые записи остаются «висеть», поэтому списки дают лишь кандидатов, а число
+    совпавших триграмм всегда считается по актуальным множествам из _documents.
+    Когда устаревших записей становится много, списки пересобираются (_maybe_compact)."""
+
+    def __init__(self):
+        super().__init__()
+        self.clear()
+
+    def clear(self):
+        self._postings = {}
+        self._documents = {}
+        self._entries = 0
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, product_id, payload):
+        trigrams = make_trigrams(payload['search_text'])
+        old = self._documents.get(product_id)
+        if old == trigrams:
+            return
+        self._documents[product_id] = trigrams
+        new = trigrams - old if old else trigrams
+        for trigram in new:
+            self._postings.setdefault(trigram, []).append(product_id)
+        self._entries += len(new)
+        if old:
+            self._stale += len(old - trigrams)
+            self._maybe_compact()
+
+    def remove(self, product_id):
+        old = self._documents.pop(product_id, None)
+        if old:
+            self._stale += len(old)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._stale > COMPACT_RATIO * max(self._entries, 1):
+            postings = {}
+            for product_id, trigrams in self._documents.items():
+                for trigram in trigrams:
+                    postings.setdefault(trigram, []).append(product_id)
+            self._postings = postings
+            self._entries = sum(len(ids) for ids in postings.values())
+            self._stale = 0
+
+    def search(self, query, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """Возвращает список пар (id товара, оценка) по убыванию оценки."""
+        query_trigrams = make_trigrams(query)
+        if not query_trigrams:
+            return []
+        min_common = math.ceil(threshold * len(query_trigrams))
+        # Принцип Дирихле: товар, у которого совпало не меньше min_common триграмм, обязательно
+        # содержит хотя бы одну из (len - min_common + 1) самых редких триграмм запроса.
+        # Поэтому кандидатов собираем только по коротким спискам, а длинные не перебираем вовсе.
+        postings = sorted((self._postings.get(trigram, ()) for trigram in query_trigrams), key=len)
+        candidates = set()
+        for ids in postings[:len(query_trigrams) - min_common + 1]:
+            candidates.update(ids)
+
+        scored = []
+        for product_id in candidates:
+            trigrams = self._documents.get(product_id)
+            if trigrams is None:
+                continue
+            common = len(query_trigrams & trigrams)
+            if common < min_common:
+                continue
+            similarity = common / len(query_trigrams)
+            jaccard = common / (len(query_trigrams) + len(trigrams) - common)
+            scored.append((similarity, jaccard, product_id))
+        scored.sort(reverse=True)
+        return [(product_id, round(similarity, 3)) for similarity, _, product_id in scored[:limit]]
+
+
+trigram_index = TrigramIndex()
+
+
+def search_database(query, limit=DEFAULT_LIMIT):
+    """Замена индекса на время его построения: [(id товара, доля совпавших слов запроса)] по товарам,
+    в search_text которых есть хотя бы одно слово запроса (длиной от 3 букв)."""
+    from .models import Product
+
+    words = [word for word in normalize_search_text(query).split() if len(word) >= 3]
+    if not words:
+        return []
+    rows = (Product.objects.filter(reduce(or_, (Q(search_text__contains=word) for word in words)))
+            .values_list('id', 'search_text')[:limit])
+    scored = [(sum(word in search_text for word in words) / len(words), product_id) for product_id, search_text in rows]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(product_id, round(similarity, 3)) for similarity, product_id in scored]
+
+
+def fuzzy_search(query, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+    """Ищет товары с учетом опечаток по индексу текущего процесса, пока он строится — в базе."""
+    if not trigram_index.ensure_fresh():
+        return search_database(query, limit=limit)
+    return trigram_index.search(query, limit=limit, threshold=threshold)
@@ -0,0 +1,181 @@
+"""Остатки товаров: атомарное списание без перепродажи при параллельных оформлениях заказа.
+
+Остаток никогда не вычитается в Python с последующим save() всей строки: двое покупателей
+последнего экземпляра прочитали бы одно и то же значение и оба оформили бы заказ.
+take_stock списывает все товары заказа одним условным UPDATE
+(quantity = quantity - x WHERE quantity >= x) и проверяет, что обновились все строки,
+иначе — InsufficientStock, и транзакция откатывается целиком.
+
+Порядок блокировок детерминирован, чтобы встречные заказы не взаимоблокировались:
+- PostgreSQL/MySQL: сначала SELECT ... FOR UPDATE ORDER BY id — строки блокируются по возрастанию id,
+  и два заказа с общими товарами всегда ждут друг друга в одном порядке;
+- SQLite (FOR UPDATE не поддерживается): первым оператором транзакции идет сам UPDATE, он сразу берет
+  блокировку записи всей базы. Если сначала читать, две транзакции с разделяемой блокировкой
+  не смогут повысить ее до записи и одна из них получит «database is locked» без ожидания.
+
+Резервы (SHOP_STOCK_RESERVATIONS): при добавлении в корзину reserve_stock откладывает экземпляры
+товара на SHOP_STOCK_RESERVATION_TTL секунд, и на распродаже покупатель узнает о нехватке сразу,
+а не после заполнения формы заказа. Доступный остаток — quantity минус действующие резервы других
+корзин, одна агрегатная выборка по индексу (product, expires_at, quantity). Истекшие резервы просто
+перестают учитываться; удаляет их пачками команда sweep_reservations (по расписанию), а не запросы покупателей.
+
+Проверить под нагрузкой — команда stress_checkout.
+"""
+import datetime
+from collections import Counter, namedtuple
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from . import facets, page_cache
+from .models import Product, StockReservation
+
+# остаток quantity — до списания; reserved — действующие резервы других корзин
+StockRow = namedtuple('StockRow', 'title category_id author price quantity reserved')
+SWEEP_BATCH_SIZE = 1000
+
+
+def reservations_enabled():
+    return getattr(settings, 'SHOP_STOCK_RESERVATIONS', False)
+
+
+def get_reservation_ttl():
+    return datetime.timedelta(seconds=getattr(settings, 'SHOP_STOCK_RESERVATION_TTL', 15 * 60))
+
+
+class InsufficientStock(Exception):
+    """Товара не хватает (или его нет в каталоге). products — названия таких товаров."""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f'Недостаточно товара в наличии: {", ".join(products)}' if products
+                         else 'Недостаточно товара в наличии')
+
+
+def _reserved(exclude_key=None, using='default'):
+    """Сумма действующих резервов товара OuterRef('pk') (без резервов корзины exclude_key)."""
+    reservations = StockReservation.objects.using(using).filter(product=OuterRef('pk'), expires_at__gt=Now())
+    if exclude_key:
+        reservations = reservations.exclude(key=exclude_key)
+    total = reservations.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(total), 0, output_field=IntegerField())
+
+
+def available_stock(product_id, exclude_key=None, using='default'):
+    """Доступный остаток товара: quantity минус действующие резервы (кроме резервов корзины exclude_key)."""
+    return (Product.objects.using(using).filter(pk=product_id)
+            .annotate(available=F('quantity') - _reserved(exclude_key, using))
+            .values_list('available', flat=True).first())
+
+
+def _read(quantities, using, lock=False, reservation_key=None):
+    queryset = Product.objects.using(using).filter(pk__in=quantities).order_by('pk')
+    if lock:
+        queryset = queryset.select_for_update()
+    reserved = _reserved(reservation_key, using) if reservations_enabled() else Value(0)
+    rows = queryset.annotate(reserved=reserved).values_list(
+        'pk', 'title', 'id_category_id', 'author', 'price', 'quantity', 'reserved')
+    return {row[0]: StockRow(*row[1:]) for row in rows}
+
+
+def _shortage(quantities, products):
+    """Названия товаров, которых не хватает; отсутствующие в каталоге — по id."""
+    return [products[product_id].title if product_id in products else f'#{product_id}'
+            for product_id, quantity in quantities.items()
+            if product_id not in products or products[product_id].quantity - products[product_id].reserved < quantity]
+
+
+def _decrement(quantities, using, reservation_key=None):
+    reserved = _reserved(reservation_key, using) if reservations_enabled() else None
+    in_stock = Q()
+    for product_id, quantity in quantities.items():
+        needed = Value(quantity) + reserved if reserved is not None else quantity
+        in_stock |= Q(pk=product_id, quantity__gte=needed)
+    taken = Case(*[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                 default=Value(0), output_field=IntegerField())
+    return Product.objects.using(using).filter(in_stock).update(quantity=F('quantity') - taken, updated_at=Now())
+
+
+def take_stock(quantities, using='default', reservation_key=None):
+    """Списывает {id товара: количество} одной операцией — все или ничего.
+    Резервы корзины reservation_key считаются своими: они не уменьшают доступный остаток и снимаются.
+    Возвращает {id товара: StockRow} с остатками до списания. Вызывать внутри transaction.atomic()
+    первым обращением к базе: при InsufficientStock транзакцию нужно откатить."""
+    quantities = dict(sorted(quantities.items()))
+    if connections[using].features.has_select_for_update:
+        products = _read(quantities, using, lock=True, reservation_key=reservation_key)
+        short = _shortage(quantities, products)
+        if short:
+            raise InsufficientStock(short)
+        _decrement(quantities, using, reservation_key)
+    elif _decrement(quantities, using, reservation_key) != len(quantities):
+        products = _read(quantities, using, reservation_key=reservation_key)
+        raise InsufficientStock(_shortage(quantities, products))
+    else:
+        products = {product_id: row._replace(quantity=row.quantity + quantities[product_id])
+                    for product_id, row in _read(quantities, using, reservation_key=reservation_key).items()}
+    if reservation_key and reservations_enabled():
+        release_reservations(reservation_key, using=using)
+    return products
+
+
+def reserve_stock(key, product_id, quantity, using='default'):
+    """Резервирует для корзины key quantity экземпляров товара (вместо прежнего резерва) на
+    SHOP_STOCK_RESERVATION_TTL. Если доступного остатка не хватает — InsufficientStock, резерв не меняется."""
+    with transaction.atomic(using=using):
+        if connections[using].features.has_select_for_update:
+            # резервы одного товара проверяются по очереди, как и списание в take_stock
+            list(Product.objects.using(using).select_for_update().filter(pk=product_id).values_list('pk'))
+        # на SQLite запись первой — она сразу берет блокировку базы (см. take_stock)
+        StockReservation.objects.using(using).bulk_create(
+            [StockReservation(key=key, product_id=product_id, quantity=quantity,
+                              expires_at=timezone.now() + get_reservation_ttl())],
+            update_conflicts=True, unique_fields=['key', 'product'], update_fields=['quantity', 'expires_at'],
+        )
+        available = available_stock(product_id, using=using)
+        if available is None or available < 0:
+            title = Product.objects.using(using).filter(pk=product_id).values_list('title', flat=True).first()
+            raise InsufficientStock([title or f'#{product_id}'])
+
+
+def release_reservations(key, product_ids=None, using='default'):
+    """Снимает резервы корзины key (все или только для product_ids)."""
+    reservations = StockReservation.objects.using(using).filter(key=key)
+    if product_ids is not None:
+        reservations = reservations.filter(product__in=product_ids)
+    reservations.delete()
+
+
+def sweep_reservations(batch_size=SWEEP_BATCH_SIZE, using='default'):
+    """Удаляет истекшие резервы пачками по индексу expires_at. Возвращает число удаленных."""
+    deleted = 0
+    now = timezone.now()
+    expired = StockReservation.objects.using(using).filter(expires_at__lte=now).order_by('expires_at')
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += StockReservation.objects.using(using).filter(pk__in=ids).delete()[0]
+
+
+def after_stock_change(quantities, products, using='default'):
+    """Для списанных take_stock товаров делает то, что сделали бы сигналы Product.save():
+    счетчики фильтра «В наличии» (только для закончившихся товаров) и сброс кэша страниц."""
+    deltas = Counter()
+    for product_id, quantity in quantities.items():
+        row = products[product_id]
+        if row.quantity - quantity <= 0 < row.quantity:
+            deltas.update(facets.diff_keys(
+                facets.product_facet_keys(row.category_id, row.author, row.price, row.quantity),
+                facets.product_facet_keys(row.category_id, row.author, row.price, 0),
+            ))
+    facets.apply_deltas(deltas, using=using)
+    keys = [page_cache.CATALOG_VERSION_KEY]
+    keys += [page_cache.PRODUCT_VERSION_KEY.format(product_id) for product_id in quantities]
+    keys += [page_cache.CATEGORY_VERSION_KEY.format(category_id)
+             for category_id in {products[product_id].category_id for product_id in quantities}]
+    transaction.on_commit(partial(page_cache.bump_versions, keys), using=using)
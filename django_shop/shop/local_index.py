@@ -0,0 +1,169 @@
+"""Индексы товаров, которые хранятся в памяти каждого процесса (воркера).
+
+Индекс строится один раз на процесс в фоновом потоке, начиная с первого обращения
+(на 200 тыс. товаров это секунды, запрос их не ждет — пока индекса нет, вызывающий код ищет в базе),
+а дальше обновляется инкрементально. Чтобы изменения, сделанные в одном воркере, увидели и остальные,
+сигналы товаров публикуют их в ленту изменений в кэше Django (CACHES['default']):
+- shop:product_feed:generation — поколение ленты, его смена означает «перестройте индекс целиком»;
+- shop:product_feed:seq — номер последнего изменения;
+- shop:product_feed:<n> — само изменение: (id товара, поля товара или None при удалении).
+
+Перед каждым поиском индекс сверяет свой номер с shop:product_feed:seq (одно обращение
+к кэшу) и применяет недостающие изменения. Если часть ленты уже вытеснена из кэша,
+индекс перестраивается из базы в фоновом потоке, не задерживая запрос.
+"""
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'shop:product_feed:generation'
+SEQ_KEY = 'shop:product_feed:seq'
+CHANGE_KEY = 'shop:product_feed:{}'
+CHANGE_TIMEOUT = 60 * 60  # сколько живет запись ленты; отставший дольше воркер перестроит индекс
+MAX_REPLAY = 1000  # если изменений больше, дешевле перестроить индекс целиком
+
+
+def product_payload(product):
+    """Поля товара, которые нужны индексам в памяти."""
+    return {
+        'title': product.title,
+        'author': product.author,
+        'search_text': product.search_text,
+        'category_id': product.id_category_id,
+    }
+
+
+def _feed_state():
+    state = cache.get_many([GENERATION_KEY, SEQ_KEY])
+    generation = state.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(GENERATION_KEY, generation, None):
+            generation = cache.get(GENERATION_KEY)
+    return generation, state.get(SEQ_KEY, 0)
+
+
+def publish_change(product_id, payload):
+    """Добавляет изменение товара в ленту. payload=None означает, что товар удален."""
+    if cache.add(SEQ_KEY, 0, None):
+        # счетчик начался заново (первое изменение или ключ вытеснен) — старые номера недействительны
+        reset_feed()
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:  # ключ успели вытеснить между add и incr
+        reset_feed()
+        return
+    cache.set(CHANGE_KEY.format(seq), (product_id, payload), CHANGE_TIMEOUT)
+
+
+def reset_feed():
+    """Начинает новое поколение ленты: все воркеры перестроят свои индексы при следующем обращении."""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+class ProcessLocalIndex(ABC):
+    """Базовый класс индекса в памяти процесса.
+
+    Наследники реализуют clear(), add(product_id, payload) и remove(product_id)
+    (и при необходимости load(rows)), а для чтения вызывают ensure_fresh() и, если он вернул False
+    (индекс еще строится), обращаются к базе.
+    Чтение идет без блокировки, поэтому поиск должен переносить несогласованные
+    структуры (id в одном словаре есть, а в другом уже нет)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._seq = 0
+        self._rebuilding = False
+
+    @abstractmethod
+    def clear(self):
+        """Делает индекс пустым."""
+
+    @abstractmethod
+    def add(self, product_id, payload):
+        """Добавляет товар или заменяет его прежние данные."""
+
+    @abstractmethod
+    def remove(self, product_id):
+        """Убирает товар из индекса (если он там есть)."""
+
+    def load(self, rows):
+        """Заполняет пустой индекс парами (id товара, поля). Наследник может переопределить
+        для более быстрой массовой загрузки."""
+        for product_id, payload in rows:
+            self.add(product_id, payload)
+
+    def rebuild(self):
+        """Строит индекс заново по всем товарам из базы."""
+        from .models import Product
+
+        with self._lock:
+            generation, seq = _feed_state()
+            self.clear()
+            rows = Product.objects.values_list('id', 'title', 'author', 'search_text', 'id_category_id')
+            self.load(
+                (product_id, {'title': title, 'author': author, 'search_text': search_text, 'category_id': category_id})
+                for product_id, title, author, search_text, category_id in rows.iterator(chunk_size=2000)
+            )
+            self._generation, self._seq = generation, seq
+
+    @property
+    def ready(self):
+        """Индекс построен хотя бы раз."""
+        return self._generation is not None
+
+    def _refresh(self):
+        """Индекс перестраивается в фоновом потоке. До первой сборки ensure_fresh() возвращает False,
+        после разрыва ленты запросы до конца перестройки используют прежний индекс."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            fresh = type(self)()
+            fresh.rebuild()
+            with self._lock:
+                state = dict(vars(fresh), _lock=self._lock, _rebuilding=False)
+                self.__dict__ = state  # подмена всех структур одним присваиванием
+        except Exception:
+            logger.exception('Не удалось перестроить индекс %s', type(self).__name__)
+            self._rebuilding = False
+        finally:
+            connection.close()
+
+    def ensure_fresh(self):
+        """Догоняет ленту изменений; при первом обращении или смене поколения перестраивает индекс.
+        Возвращает False, пока индекс не построен."""
+        generation, seq = _feed_state()
+        if generation != self._generation or seq - self._seq > MAX_REPLAY or seq < self._seq:
+            self._refresh()
+            return self.ready
+        if seq == self._seq:
+            return True
+        with self._lock:
+            if seq <= self._seq:  # другой поток уже применил эти изменения
+                return True
+            keys = [CHANGE_KEY.format(n) for n in range(self._seq + 1, seq + 1)]
+            changes = cache.get_many(keys)
+            missing = len(changes) != len(keys)
+            if not missing:
+                for key in keys:
+                    product_id, payload = changes[key]
+                    if payload is None:
+                        self.remove(product_id)
+                    else:
+                        self.add(product_id, payload)
+                self._seq = seq
+        if missing:
+            self._refresh()
+        return True
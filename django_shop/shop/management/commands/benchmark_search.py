@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.fuzzy_search import TrigramIndex
+from shop.search import normalize_search_text
+
+FIRST_NAMES = ['Лев', 'Фёдор', 'Антон', 'Михаил', 'Иван', 'Александр', 'Николай', 'Борис', 'Анна', 'Марина']
+LAST_NAMES = ['Толстой', 'Достоевский', 'Чехов', 'Булгаков', 'Тургенев', 'Пушкин', 'Гоголь', 'Пастернак',
+              'Ахматова', 'Цветаева', 'Лермонтов', 'Набоков', 'Шолохов', 'Солженицын', 'Бунин']
+SYLLABLES = [consonant + vowel for consonant in 'бвгджзклмнпрстфхцчш' for vowel in 'аеиоуыя']
+SUFFIXES = ['ов', 'ев', 'ин', 'ский', 'енко', 'ова', 'ина']
+TITLE_WORDS = ['война', 'мир', 'преступление', 'наказание', 'мастер', 'маргарита', 'отцы', 'дети', 'мертвые',
+               'души', 'герой', 'нашего', 'времени', 'тихий', 'дон', 'доктор', 'живаго', 'вишнёвый', 'сад',
+               'идиот', 'братья', 'карамазовы', 'записки', 'охотника', 'капитанская', 'дочка', 'собачье', 'сердце']
+
+
+def make_typo(word, rnd):
+    """Одна опечатка: пропуск, замена или перестановка соседних букв."""
+    if len(word) < 4:
+        return word
+    i = rnd.randrange(1, len(word) - 1)
+    kind = rnd.choice(('drop', 'replace', 'swap'))
+    if kind == 'drop':
+        return word[:i] + word[i + 1:]
+    if kind == 'replace':
+        return word[:i] + rnd.choice('абвгдеклмнопрст') + word[i + 1:]
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает прежний поиск (перебор всех товаров в Python) с триграммным индексом '
+            'на синтетическом каталоге. База данных не используется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000, help='Размер синтетического каталога')
+        parser.add_argument('--queries', type=int, default=200, help='Количество поисковых запросов')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        # как в реальном каталоге: несколько известных авторов и длинный хвост малоизвестных
+        authors = LAST_NAMES + [
+            (''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 3))) + rnd.choice(SUFFIXES)).capitalize()
+            for _ in range(options['products'] // 10)
+        ]
+        catalog = []
+        for product_id in range(1, options['products'] + 1):
+            title = ' '.join(rnd.sample(TITLE_WORDS, rnd.randint(1, 3))).capitalize() + f' {product_id}'
+            author = f'{rnd.choice(FIRST_NAMES)} {rnd.choice(authors)}'
+            catalog.append((product_id, title, author))
+
+        started = time.perf_counter()
+        index = TrigramIndex()
+        for product_id, title, author in catalog:
+            index.add(product_id, {'search_text': normalize_search_text(title, author)})
+        self.stdout.write(f'Каталог: {len(catalog)} товаров, построение индекса {time.perf_counter() - started:.2f} с')
+
+        queries = [make_typo(rnd.choice(authors), rnd).lower() for _ in range(options['queries'])]
+
+        scan_times, scan_hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            # так ShopHome.get_queryset искал раньше: перебор всех товаров и поиск подстроки
+            found = [product_id for product_id, title, author in catalog
+                     if query in title.lower() or query in author.lower()]
+            scan_times.append(time.perf_counter() - started)
+            scan_hits += bool(found)
+
+        index_times, index_hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            found = index.search(query)
+            index_times.append(time.perf_counter() - started)
+            index_hits += bool(found)
+
+        for name, times, hits in (('Перебор в Python', scan_times, scan_hits),
+                                  ('Триграммный индекс', index_times, index_hits)):
+            times_ms = sorted(t * 1000 for t in times)
+            p95 = times_ms[int(len(times_ms) * 0.95) - 1]
+            self.stdout.write(f'{name}: медиана {statistics.median(times_ms):.2f} мс, p95 {p95:.2f} мс, '
+                              f'найдено по {hits} из {len(queries)} запросов с опечаткой')
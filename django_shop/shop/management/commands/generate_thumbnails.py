@@ -0,0 +1,46 @@
+import time
+from collections import defaultdict
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+from shop import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии изображений товаров (AVIF/WebP/JPEG) для всего каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать копии, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        # один файл может быть у нескольких товаров — кодируем его один раз
+        images = defaultdict(list)
+        products = Product.objects.exclude(image='').values_list('id', 'image', 'image_variants')
+        for product_id, image_name, variants in products.iterator(chunk_size=500):
+            if options['force'] or (variants or {}).get('source') != image_name:
+                images[image_name].append(product_id)
+
+        started = time.perf_counter()
+        executor = thumbnails.get_executor()
+        futures = {
+            executor.submit(thumbnails.render_variants, thumbnails.default_storage.path(image_name),
+                            thumbnails.build_targets(image_name)): image_name
+            for image_name in images
+        }
+        done = failed = 0
+        for future in as_completed(futures):
+            image_name = futures[future]
+            try:
+                source_width, created = future.result()
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{image_name}: {error}')
+                continue
+            thumbnails.save_variants(images[image_name], image_name, source_width, created)
+            done += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done}, ошибок: {failed}, товаров: {sum(map(len, images.values()))}, '
+            f'за {elapsed:.1f} с'))
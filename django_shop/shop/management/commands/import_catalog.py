@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_import import COLUMNS, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = ('Импортирует товары из CSV или JSONL любого размера пачками. '
+            f'Колонки: {", ".join(COLUMNS)}; category — название категории, image — URL, путь к файлу или имя в media')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv или .jsonl')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одной транзакции')
+        parser.add_argument('--create-categories', action='store_true', help='Создавать отсутствующие категории')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Не обновлять товары, которые уже есть (совпадают название и автор)')
+        parser.add_argument('--image-workers', type=int, default=8, help='Потоков для загрузки изображений')
+        parser.add_argument('--no-thumbnails', action='store_true', help='Не создавать уменьшенные копии изображений')
+        parser.add_argument('--checkpoint', help='Файл контрольной точки (по умолчанию <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true', help='Продолжить с контрольной точки')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            update_existing=not options['skip_existing'],
+            image_workers=options['image_workers'],
+            thumbnails_enabled=not options['no_thumbnails'],
+            checkpoint_path=options['checkpoint'] or f'{path}.checkpoint',
+            stdout=self.stdout,
+        )
+        stats = importer.run(path, options['format'], resume=options['resume'])
+        for line, message in stats.errors:
+            self.stderr.write(f'строка {line}: {message}' if line else message)
+        if stats.error_count > len(stats.errors):
+            self.stderr.write(f'... и еще {stats.error_count - len(stats.errors)} ошибок')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен: создано {stats.created}, обновлено {stats.updated}, пропущено {stats.skipped}, '
+            f'ошибок {stats.error_count}, изображений обработано {stats.images}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from shop.page_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий в кэш страниц каталога по каждому представлению'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        if not stats:
+            self.stdout.write('Обращений к кэшу страниц еще не было')
+        for name, (hits, misses) in sorted(stats.items()):
+            total = hits + misses
+            rate = hits / total * 100 if total else 0
+            self.stdout.write(f'{name}: попаданий {hits}, промахов {misses}, доля попаданий {rate:.1f}%')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop.facets import rebuild_facet_counts
+from shop.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля количество товаров для фильтров каталога (таблица FacetCount)'
+
+    def handle(self, *args, **options):
+        rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {FacetCount.objects.count()} счетчиков'))
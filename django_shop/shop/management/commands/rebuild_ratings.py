@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля сумму оценок, количество отзывов и средний рейтинг всех товаров'
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Рейтинг пересчитан у {updated} товаров'))
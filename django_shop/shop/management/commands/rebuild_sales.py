@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля продажи товаров для сортировок «Бестселлеры» и «Тренды»'
+
+    def handle(self, *args, **options):
+        updated = rebuild_sales()
+        self.stdout.write(self.style.SUCCESS(f'Продажи пересчитаны, товаров с продажами: {updated}'))
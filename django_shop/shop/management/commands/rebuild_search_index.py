@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.fuzzy_search import TrigramIndex
+from shop.local_index import reset_feed
+from shop.models import Product
+from shop.search import normalize_search_text, rebuild_fts_table
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает поле search_text, перестраивает полнотекстовый индекс в базе '
+            'и заставляет воркеры заново построить индексы поиска в памяти')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки при пересчете search_text')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(Product.objects.filter(id__gt=last_id).order_by('id')
+                         .only('id', 'title', 'author', 'search_text')[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for product in batch:
+                search_text = normalize_search_text(product.title, product.author)
+                if product.search_text != search_text:
+                    product.search_text = search_text
+                    changed.append(product)
+            Product.objects.bulk_update(changed, ['search_text'])
+            updated += len(changed)
+            last_id = batch[-1].id
+
+        with transaction.atomic():
+            rebuild_fts_table()
+        reset_feed()
+        self.stdout.write(f'search_text обновлен у {updated} товаров, индекс в базе перестроен '
+                          f'за {time.perf_counter() - started:.2f} с')
+
+        started = time.perf_counter()
+        index = TrigramIndex()
+        index.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Триграммный индекс: {len(index)} товаров, {len(index._postings)} триграмм, '
+            f'построение {time.perf_counter() - started:.2f} с. Воркеры перестроят индексы при следующем поиске.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.inventory import SWEEP_BATCH_SIZE, sweep_reservations
+
+
+class Command(BaseCommand):
+    help = ('Удаляет истекшие резервы остатков корзин (SHOP_STOCK_RESERVATIONS). '
+            'Запускать по расписанию: истекшие резервы и так не учитываются, команда только освобождает таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Резервов за один DELETE')
+
+    def handle(self, *args, **options):
+        deleted = sweep_reservations(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено истекших резервов: {deleted}'))
@@ -0,0 +1,68 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def normalize(*parts):
+    # копия shop.search.normalize_search_text: миграции не должны зависеть от текущего кода приложения
+    text = ' '.join(part for part in parts if part)
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def fill_search_text(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    db_alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        batch = list(Product.objects.using(db_alias).filter(id__gt=last_id).order_by('id')
+                     .only('id', 'title', 'author')[:BATCH_SIZE])
+        if not batch:
+            break
+        for product in batch:
+            product.search_text = normalize(product.title, product.author)
+        Product.objects.using(db_alias).bulk_update(batch, ['search_text'])
+        last_id = batch[-1].id
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE shop_product_fts USING fts5(search_text, tokenize = 'unicode61 remove_diacritics 0')"
+            )
+        except Exception:
+            return  # SQLite собран без FTS5: поиск будет работать через search_text без индекса
+        schema_editor.execute(
+            'INSERT INTO shop_product_fts (rowid, search_text) SELECT id, search_text FROM shop_product'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX shop_product_search_text_trgm ON shop_product USING gin (search_text gin_trgm_ops)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS shop_product_search_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.CharField(default='', editable=False, max_length=201, verbose_name='Поисковая строка'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# копия диапазонов из shop.facets на момент создания миграции
+PRICE_RANGES = (
+    ('0-300', Decimal('0'), Decimal('300')),
+    ('300-600', Decimal('300'), Decimal('600')),
+    ('600-1000', Decimal('600'), Decimal('1000')),
+    ('1000-', Decimal('1000'), None),
+)
+
+
+def fill_facet_counts(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    FacetCount = apps.get_model('shop', 'FacetCount')
+    db_alias = schema_editor.connection.alias
+    counts = Counter()
+    rows = Product.objects.using(db_alias).values_list('id_category_id', 'author', 'price', 'quantity')
+    for category_id, author, price, quantity in rows.iterator(chunk_size=2000):
+        values = [('author', author)]
+        values += [('price', key) for key, low, high in PRICE_RANGES if price >= low and (high is None or price < high)]
+        if quantity > 0:
+            values.append(('in_stock', '1'))
+        for scope in (0, category_id):
+            for facet, value in values:
+                counts[(scope, facet, value)] += 1
+    FacetCount.objects.using(db_alias).bulk_create(
+        [FacetCount(scope=scope, facet=facet, value=value, count=n) for (scope, facet, value), n in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.BigIntegerField(default=0, verbose_name='Область')),
+                ('facet', models.CharField(choices=[('author', 'Автор'), ('price', 'Цена'), ('in_stock', 'В наличии')], max_length=20, verbose_name='Фильтр')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'счетчик фильтра',
+                'verbose_name_plural': 'счетчики фильтров',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('scope', 'facet', 'value'), name='shop_facetcount_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['author'], name='shop_product_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='shop_product_price_idx'),
+        ),
+        migrations.RunPython(fill_facet_counts, migrations.RunPython.noop),
+    ]
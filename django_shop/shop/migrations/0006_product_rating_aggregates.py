@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_ratings(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+    db_alias = schema_editor.connection.alias
+    reviews = Review.objects.using(db_alias).filter(id_product=OuterRef('pk')).order_by().values('id_product')
+    Product.objects.using(db_alias).update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0,
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0,
+                              output_field=IntegerField()),
+        rating_avg=Coalesce(Subquery(reviews.annotate(total=Avg('rating')).values('total')), 0.0,
+                            output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Средняя оценка'),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
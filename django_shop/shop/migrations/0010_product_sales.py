@@ -0,0 +1,60 @@
+import datetime
+from collections import Counter
+
+from django.db import migrations, models
+
+TREND_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+HALF_LIFE = datetime.timedelta(days=7)
+
+
+def fill_sales(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    db_alias = schema_editor.connection.alias
+    units, trend = Counter(), Counter()
+    items = OrderProduct.objects.using(db_alias).values_list('id_product', 'quantity', 'id_order__created_date')
+    for product_id, quantity, created in items.iterator(chunk_size=2000):
+        units[product_id] += quantity
+        trend[product_id] += quantity * 2.0 ** ((created - TREND_EPOCH) / HALF_LIFE)
+    Product.objects.using(db_alias).bulk_update(
+        [Product(pk=product_id, sales_units=units[product_id], sales_trend=trend[product_id]) for product_id in units],
+        ['sales_units', 'sales_trend'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_product_image_variants'),
+        ('orders', '0004_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sales_units',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Продано'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_trend',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-sales_units', 'id'], name='shop_product_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['id_category', '-sales_units', 'id'], name='shop_product_cat_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-sales_trend', 'id'], name='shop_product_trend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['id_category', '-sales_trend', 'id'], name='shop_product_cat_trend_idx'),
+        ),
+        migrations.RunPython(fill_sales, migrations.RunPython.noop),
+    ]
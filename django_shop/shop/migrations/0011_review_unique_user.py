@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicate_reviews(apps, schema_editor):
+    """Оставляет самый ранний отзыв пользователя на товар и пересчитывает рейтинг затронутых товаров."""
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+    db_alias = schema_editor.connection.alias
+    reviews = Review.objects.using(db_alias)
+    duplicates = (reviews.filter(id_user__isnull=False).values('id_product', 'id_user')
+                  .annotate(n=Count('id')).filter(n__gt=1).values_list('id_product', 'id_user'))
+    product_ids = set()
+    for product_id, user_id in duplicates:
+        ids = list(reviews.filter(id_product_id=product_id, id_user_id=user_id).order_by('id').values_list('id', flat=True))
+        reviews.filter(id__in=ids[1:]).delete()
+        product_ids.add(product_id)
+    if not product_ids:
+        return
+    product_reviews = reviews.filter(id_product=OuterRef('pk')).order_by().values('id_product')
+    Product.objects.using(db_alias).filter(pk__in=product_ids).update(
+        rating_sum=Coalesce(Subquery(product_reviews.annotate(total=Sum('rating')).values('total')), 0,
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(product_reviews.annotate(total=Count('id')).values('total')), 0,
+                              output_field=IntegerField()),
+        rating_avg=Coalesce(Subquery(product_reviews.annotate(total=Avg('rating')).values('total')), 0.0,
+                            output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_product_sales'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('id_product', 'id_user'), name='shop_review_product_user_unique'),
+        ),
+    ]
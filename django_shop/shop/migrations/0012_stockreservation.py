@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_review_unique_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, verbose_name='Корзина')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations',
+                                              to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'резерв товара',
+                'verbose_name_plural': 'резервы товаров',
+                'indexes': [
+                    models.Index(fields=['product', 'expires_at', 'quantity'], name='shop_reservation_active_idx'),
+                    models.Index(fields=['expires_at'], name='shop_reservation_expires_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=['key', 'product'], name='shop_reservation_key_product_unique'),
+                ],
+            },
+        ),
+    ]
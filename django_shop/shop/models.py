@@ -4,6 +4,12 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from users.models import CustomUser
 from django.conf import settings
+from .search import normalize_search_text
+from .ratings import RATING_FIELDS
+from .sales import SALES_FIELDS
+from .thumbnails import MIME_TYPES, variant_name
+
+DERIVED_FIELDS = RATING_FIELDS + SALES_FIELDS + ('image_variants',)  # поля, которые save() существующего товара не перезаписывает
 
 
 class Category(models.Model):
@@ -11,6 +17,7 @@ class Category(models.Model):
         Модель Category представляет собой категорию товаров в системе.
         Атрибуты:
         - title: Название категории. Должно быть уникальным и ограничено 30 символами.
+        - updated_at: Дата и время последнего изменения, обновляется автоматически.
 
         Методы:
         - __str__: Возвращает название категории.
@@ -24,6 +31,7 @@ class Category(models.Model):
     """
 
     title = models.CharField(max_length=30, unique=True, verbose_name='название категории')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='дата изменения')
 
     class Meta:
         """Используем для задания параметров в админке"""
@@ -53,12 +61,23 @@ class Product(models.Model):
         - quantity: Количество товара на складе. По умолчанию установлено в 0.
         - image: Изображение товара.
         - id_category: Ссылка на категорию, к которой относится товар.
+        - search_text: Нормализованные название и автор для поиска. Заполняется автоматически в save().
+        - rating_sum, rating_count, rating_avg: Сумма оценок, количество отзывов и средняя оценка.
+                     Меняются только сигналами отзывов (см. shop/ratings.py), save() их не перезаписывает.
+        - image_variants: Сведения об уменьшенных копиях изображения (shop/thumbnails.py): исходный файл,
+                     его ширина и ширины копий по форматам. Заполняется после генерации копий.
+        - updated_at: Дата и время последнего изменения товара или его отзывов. Используется для
+                     условных GET-запросов (ETag / Last-Modified, см. shop/conditional.py).
 
         Методы:
         - __str__: Возвращает название товара.
         - get_absolute_url: Возвращает URL для детального просмотра товара.
-        - get_average_review_score: Вычисляет средний рейтинг товара на основе отзывов.
+        - get_average_review_score: Возвращает средний рейтинг товара, округленный до десятых.
+        - image_sources: Возвращает srcset уменьшенных копий изображения для тега <picture>.
         - clean: Проверяет валидность данных: длины строк и положительность цены.
+        - save: Перед сохранением обновляет поле search_text; у существующего товара не трогает поля рейтинга
+                и image_variants.
+        - from_db: Запоминает значения полей на момент загрузки (_loaded_values).
 
         Мета-класс:
         - ordering: Сортировка товаров по названию.
@@ -72,25 +91,75 @@ class Product(models.Model):
     quantity = models.PositiveIntegerField(default=0, verbose_name='Количество')
     image = models.ImageField(verbose_name='Изображение')
     id_category = models.ForeignKey(Category, verbose_name='Категория', on_delete=models.CASCADE)
+    search_text = models.CharField(max_length=201, default='', editable=False, verbose_name='Поисковая строка')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок')
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов')
+    rating_avg = models.FloatField(default=0.0, editable=False, verbose_name='Средняя оценка')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Копии изображения')
+    sales_units = models.PositiveIntegerField(default=0, editable=False, verbose_name='Продано')
+    sales_trend = models.FloatField(default=0.0, editable=False, verbose_name='Популярность')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
 
     class Meta:
         verbose_name = 'товар'  # отображение названия в админке
         verbose_name_plural = 'товары'  # отображение названия в админке
         ordering = ('title',)
+        indexes = [
+            models.Index(fields=['author'], name='shop_product_author_idx'),  # фильтр по автору
+            models.Index(fields=['price'], name='shop_product_price_idx'),  # фильтр по диапазону цены
+            # keyset-пагинация по (title, id) для всего каталога и внутри категории
+            models.Index(fields=['title', 'id'], name='shop_product_title_id_idx'),
+            models.Index(fields=['id_category', 'title', 'id'], name='shop_product_cat_title_id_idx'),
+            # время последнего изменения каталога и категории для условных GET-запросов
+            models.Index(fields=['updated_at'], name='shop_product_updated_idx'),
+            models.Index(fields=['id_category', 'updated_at'], name='shop_product_cat_updated_idx'),
+            # сортировки «Бестселлеры» и «Тренды» с keyset-пагинацией (shop/sales.py)
+            models.Index(fields=['-sales_units', 'id'], name='shop_product_sales_idx'),
+            models.Index(fields=['id_category', '-sales_units', 'id'], name='shop_product_cat_sales_idx'),
+            models.Index(fields=['-sales_trend', 'id'], name='shop_product_trend_idx'),
+            models.Index(fields=['id_category', '-sales_trend', 'id'], name='shop_product_cat_trend_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем значения полей на момент загрузки из базы, чтобы сигналы
+        могли понять, что именно изменилось при сохранении."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('shop:product_detail', args=[self.id_category.id, self.id])
+        return reverse('shop:product_detail', args=[self.id_category_id, self.id])
 
     def get_average_review_score(self):
-        """Вычисляем средний рейтинг товара. self.reviews возвращает все связанные объекты Review для данного объекта Product"""
-        average_score = 0.0
-        if self.reviews.count() > 0:
-            total_score = sum([review.rating for review in self.reviews.all()])
-            average_score = total_score / self.reviews.count()
-        return round(average_score, 1)
+        """Средний рейтинг товара. Берется из денормализованного поля rating_avg, запросов к отзывам нет"""
+        return round(self.rating_avg, 1)
+
+    def image_sources(self):
+        """{'sources': [{'type': MIME-тип, 'srcset': ...}, ...], 'srcset': ..., 'src': ...} для <picture>:
+        AVIF и WebP в <source>, JPEG — в srcset самого <img>. Пока копий нет, src — оригинал."""
+        if not self.image:
+            return None
+        variants = self.image_variants or {}
+        if variants.get('source') != self.image.name:  # копии еще не готовы или от прежнего файла
+            return {'sources': [], 'srcset': '', 'src': self.image.url}
+        sources = []
+        formats = variants.get('formats', {})
+        for extension in (extension for extension in MIME_TYPES if extension in formats):
+            widths = formats[extension]
+            candidates = [f'{self.image.storage.url(variant_name(self.image.name, width, extension))} {width}w'
+                          for width in sorted(widths)]
+            candidates.append(f'{self.image.url} {variants["width"]}w')
+            sources.append({'type': MIME_TYPES[extension], 'srcset': ', '.join(candidates)})
+        jpeg = next((source for source in sources if source['type'] == 'image/jpeg'), None)
+        return {
+            'sources': [source for source in sources if source is not jpeg],
+            'srcset': jpeg['srcset'] if jpeg else '',
+            'src': self.image.url,
+        }
 
     def clean(self):
         if self.title is not None and len(self.title) > 100:
@@ -102,6 +171,23 @@ class Product(models.Model):
         if self.price is not None and self.price < 0:
             raise ValidationError({'price': 'Цена должна быть положительной.'})
 
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search_text(self.title, self.author)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # поля рейтинга обновляются параллельно F-выражениями, а image_variants — после генерации копий;
+            # устаревшие значения из памяти не записываем
+            kwargs['update_fields'] = [field.attname for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in DERIVED_FIELDS]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'title', 'author'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        if kwargs.get('update_fields') is not None:
+            # auto_now обновляется только если поле входит в update_fields
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'updated_at'}
+        super().save(*args, **kwargs)
+        # следующее сохранение этого же объекта сравнивается с только что записанными значениями
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
 
 class Review(models.Model):
     """
@@ -113,6 +199,7 @@ class Review(models.Model):
         - rating: Рейтинг товара, выставленный пользователем. Допустимые значения от 1 до 5.
         - text: Текст отзыва, может быть пустым. Ограничен 200 символами.
         - created_date: Дата и время создания отзыва, устанавливается автоматически при создании.
+        - updated_at: Дата и время последнего изменения отзыва.
 
         Методы:
         - clean: Проверяет, что текст отзыва не превышает 200 символов.
@@ -120,6 +207,8 @@ class Review(models.Model):
 
         Мета-класс:
         - ordering: Сортировка отзывов по убыванию даты создания.
+        - indexes: Индекс (товар, дата, id) для ленты отзывов товара по курсору.
+        - constraints: Один отзыв пользователя на товар — проверяет база, в том числе при параллельных запросах.
     """
     id_product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE, verbose_name='Продукт')
     id_user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
@@ -127,9 +216,16 @@ class Review(models.Model):
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], verbose_name='Рейтинг')
     text = models.TextField(null=True, max_length=200, blank=True, verbose_name='Текст')
     created_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
 
     class Meta:
         ordering = ('-created_date', )
+        indexes = [
+            models.Index(fields=['id_product', 'created_date', 'id'], name='shop_review_prod_date_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['id_product', 'id_user'], name='shop_review_product_user_unique'),
+        ]
 
     def clean(self):
         if self.text is not None and len(self.text) > 200:
@@ -139,3 +235,68 @@ class Review(models.Model):
         if self.rating < 1 or self.rating > 5:
             raise ValidationError("Неверный рейтинг")
         super().save(*args, **kwargs)
+
+
+class FacetCount(models.Model):
+    """
+        Модель FacetCount хранит предрасчитанное количество товаров для значения фильтра каталога.
+        Значения поддерживаются сигналами товаров (см. shop/facets.py), пересчитать их с нуля
+        можно командой rebuild_facet_counts.
+        Атрибуты:
+        - scope: Область подсчета: 0 — весь каталог, иначе id категории.
+        - facet: Фильтр: 'author', 'price' или 'in_stock'.
+        - value: Значение фильтра (автор, ключ диапазона цены, '1' для наличия).
+        - count: Количество товаров.
+    """
+    FACET_CHOICES = (
+        ('author', 'Автор'),
+        ('price', 'Цена'),
+        ('in_stock', 'В наличии'),
+    )
+    scope = models.BigIntegerField(default=0, verbose_name='Область')
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES, verbose_name='Фильтр')
+    value = models.CharField(max_length=100, verbose_name='Значение')
+    count = models.IntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'счетчик фильтра'
+        verbose_name_plural = 'счетчики фильтров'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'facet', 'value'], name='shop_facetcount_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.facet}={self.value}: {self.count}'
+
+
+class StockReservation(models.Model):
+    """
+        Модель StockReservation — экземпляры товара, отложенные корзиной на время SHOP_STOCK_RESERVATION_TTL
+        (режим SHOP_STOCK_RESERVATIONS, см. shop/inventory.py). Доступный остаток товара — quantity
+        минус сумма действующих резервов; истекшие резервы не учитываются и удаляются пачками
+        командой sweep_reservations.
+        Атрибуты:
+        - product: Зарезервированный товар.
+        - key: Ключ корзины, которой принадлежит резерв.
+        - quantity: Количество зарезервированных экземпляров.
+        - expires_at: Момент, после которого резерв не действует.
+    """
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE, verbose_name='Товар')
+    key = models.CharField(max_length=32, verbose_name='Корзина')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    expires_at = models.DateTimeField(verbose_name='Действует до')
+
+    class Meta:
+        verbose_name = 'резерв товара'
+        verbose_name_plural = 'резервы товаров'
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'product'], name='shop_reservation_key_product_unique'),
+        ]
+        indexes = [
+            # сумма действующих резервов товара читается только из индекса
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='shop_reservation_active_idx'),
+            models.Index(fields=['expires_at'], name='shop_reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} x{self.quantity} до {self.expires_at:%H:%M}'
@@ -0,0 +1,170 @@
+"""Кэширование готовых страниц каталога (ShopHome, ShopCategory, ProductDetailView).
+
+Страница кэшируется целиком, кроме «дырок» — кусков, зависящих от пользователя (меню профиля,
+csrf-токен в формах, кнопка отзыва). В шаблоне они подключаются тегом {% page_hole %}: при
+рендере для кэша вместо них вставляется метка, а перед отдачей ответа метки заменяются
+шаблонами, отрендеренными для текущего запроса.
+
+Ключ страницы содержит версии данных, от которых она зависит: список категорий, весь каталог,
+товары категории, конкретный товар, продажи (для сортировок по ним). Версии хранятся в общем кэше
+(CACHES['default']) и меняются сигналами после коммита (shop/signals.py, orders/signals.py),
+поэтому устаревшие страницы просто перестают запрашиваться и вытесняются.
+Сами страницы лежат в кэше SHOP_PAGE_CACHE_ALIAS.
+Количество попаданий и промахов по каждому представлению — в команде page_cache_stats.
+"""
+import base64
+import hashlib
+import json
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.template.context_processors import csrf
+from django.template.loader import get_template
+
+from .categories import VERSION_KEY as CATEGORIES_VERSION_KEY
+
+PAGE_KEY = 'shop:page:{}:{}'
+CATALOG_VERSION_KEY = 'shop:page_version:catalog'
+CATEGORY_VERSION_KEY = 'shop:page_version:category:{}'
+PRODUCT_VERSION_KEY = 'shop:page_version:product:{}'
+SALES_VERSION_KEY = 'shop:page_version:sales'  # списки с сортировкой по продажам (shop/sales.py)
+STATS_KEY = 'shop:page_stats:{}:{}'
+STATS_VIEWS_KEY = 'shop:page_stats:views'
+HIT = 'hit'
+MISS = 'miss'
+HEADER = 'X-Page-Cache'
+
+HOLE_MARKER = '<!--page-hole:{}-->'
+HOLE_RE = re.compile(r'<!--page-hole:([A-Za-z0-9_=-]+)-->')
+
+
+def is_enabled():
+    return getattr(settings, 'SHOP_PAGE_CACHE', False)
+
+
+def get_page_store():
+    return caches[getattr(settings, 'SHOP_PAGE_CACHE_ALIAS', 'default')]
+
+
+def get_versions(keys):
+    """Текущие версии для ключей; отсутствующие (новые или вытесненные) заводятся заново."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid.uuid4().hex
+            cache.add(key, version, None)
+            versions[key] = cache.get(key) or version
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def invalidate_product(product_id, category_ids=None):
+    """Сбрасывает страницы товара, его категорий и всего каталога.
+    Если категории не переданы, категория товара берется из базы."""
+    if category_ids is None:
+        from .models import Product
+
+        category_ids = Product.objects.filter(pk=product_id).values_list('id_category_id', flat=True)
+    keys = [CATALOG_VERSION_KEY, PRODUCT_VERSION_KEY.format(product_id)]
+    keys += [CATEGORY_VERSION_KEY.format(category_id) for category_id in set(category_ids) if category_id]
+    bump_versions(keys)
+
+
+def invalidate_all():
+    """Сбрасывает все страницы: каждая зависит от версии списка категорий (например, после массового импорта)."""
+    bump_versions([CATEGORIES_VERSION_KEY, CATALOG_VERSION_KEY])
+
+
+def page_key(name, request, versions):
+    raw = json.dumps([request.path, sorted(request.GET.lists()), versions])
+    return PAGE_KEY.format(name, hashlib.md5(raw.encode()).hexdigest())
+
+
+def hole_marker(template_name, params):
+    raw = json.dumps([template_name, params])
+    return HOLE_MARKER.format(base64.urlsafe_b64encode(raw.encode()).decode())
+
+
+def render_holes(html, request, extra_context):
+    """Заменяет метки «дырок» шаблонами, отрендеренными для текущего пользователя."""
+    base_context = {'request': request, 'user': request.user, **csrf(request), **extra_context}
+
+    def render_hole(match):
+        template_name, params = json.loads(base64.urlsafe_b64decode(match.group(1)))
+        return get_template(template_name).render({**base_context, **params})
+
+    return HOLE_RE.sub(render_hole, html)
+
+
+def record(name, outcome):
+    key = STATS_KEY.format(name, outcome)
+    if cache.add(key, 1, None):
+        views = cache.get(STATS_VIEWS_KEY) or []
+        if name not in views:
+            cache.set(STATS_VIEWS_KEY, views + [name], None)
+        return
+    try:
+        cache.incr(key)
+    except ValueError:  # счетчик вытеснен между add и incr
+        cache.add(key, 1, None)
+
+
+def get_stats():
+    """{представление: (попадания, промахи)}."""
+    views = cache.get(STATS_VIEWS_KEY) or []
+    counters = cache.get_many([STATS_KEY.format(name, outcome) for name in views for outcome in (HIT, MISS)])
+    return {name: (counters.get(STATS_KEY.format(name, HIT), 0), counters.get(STATS_KEY.format(name, MISS), 0))
+            for name in views}
+
+
+def reset_stats():
+    views = cache.get(STATS_VIEWS_KEY) or []
+    cache.delete_many([STATS_KEY.format(name, outcome) for name in views for outcome in (HIT, MISS)]
+                      + [STATS_VIEWS_KEY])
+
+
+class PageCacheMixin:
+    """Кэширует ответ GET-запроса представления. Наследник перечисляет ключи версий,
+    от которых зависит страница (get_page_cache_versions), и данные для «дырок» (get_hole_context)."""
+    page_cache_name = None
+    defer_page_holes = False
+
+    def get_page_cache_versions(self):
+        return [CATEGORIES_VERSION_KEY]
+
+    def get_hole_context(self):
+        return {}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['defer_page_holes'] = self.defer_page_holes
+        return context
+
+    def get(self, request, *args, **kwargs):
+        if not is_enabled():
+            return super().get(request, *args, **kwargs)
+        name = self.page_cache_name or type(self).__name__
+        key = page_key(name, request, get_versions(self.get_page_cache_versions()))
+        store = get_page_store()
+        html = store.get(key)
+        if html is not None:
+            record(name, HIT)
+            response = HttpResponse(html)
+            response[HEADER] = 'HIT'
+        else:
+            record(name, MISS)
+            self.defer_page_holes = True
+            response = super().get(request, *args, **kwargs)
+            response.render()
+            html = response.content.decode(response.charset)
+            if response.status_code == 200:
+                store.set(key, html, getattr(settings, 'SHOP_PAGE_CACHE_TIMEOUT', 60 * 60))
+            response[HEADER] = 'MISS'
+        response.content = render_holes(html, request, self.get_hole_context())
+        return response
@@ -0,0 +1,111 @@
+"""Keyset-пагинация (по курсору) для списков товаров.
+
+Вместо OFFSET страница выбирается условием (key, id) > (последний key, последний id)
+по составному индексу, а COUNT(*) не выполняется вовсе, поэтому глубина страницы не влияет
+на время запроса. По умолчанию key — название (индекс (title, id)); списки по продажам
+листаются по убыванию sales_units / sales_trend (индексы (-sales_units, id) и т.д., см. shop/sales.py).
+Курсор — непрозрачная строка (base64 от JSON), передается в GET-параметре cursor.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_KEY = 'title'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(value, pk, direction):
+    raw = json.dumps([value, pk, direction], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (значение ключа, id, направление) или None, если курсор пустой или испорчен."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk, direction = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if (not isinstance(value, (str, int, float)) or isinstance(value, bool)
+            or not isinstance(pk, int) or direction not in (NEXT, PREVIOUS)):
+        return None
+    return value, pk, direction
+
+
+class KeysetPage:
+    """Страница, совместимая с page_obj в шаблонах: has_next/has_previous/has_other_pages
+    и итерация по товарам. Вместо номеров страниц — курсоры next_cursor/previous_cursor."""
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, key=DEFAULT_KEY):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = self._cursor(object_list[-1], key, NEXT) if has_next and object_list else None
+        self.previous_cursor = self._cursor(object_list[0], key, PREVIOUS) if has_previous and object_list else None
+
+    @staticmethod
+    def _cursor(product, key, direction):
+        return encode_cursor(getattr(product, key), product.pk, direction)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """Листает queryset в порядке (key, id) или, при descending, (-key, id)."""
+
+    def __init__(self, queryset, per_page, key=DEFAULT_KEY, descending=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key = key
+        self.descending = descending
+
+    def _ordering(self, reverse=False):
+        key_descending = self.descending != reverse
+        return ('-' if key_descending else '') + self.key, '-id' if reverse else 'id'
+
+    def _after(self, value, pk, reverse=False):
+        """Условие «после позиции (value, pk)» в порядке списка (или перед ней при reverse).
+        Нестрогое условие по key отдельно, чтобы база могла начать с позиции в индексе."""
+        key_after = 'lt' if self.descending != reverse else 'gt'
+        key_from = key_after[0] + 'te'
+        id_after = 'lt' if reverse else 'gt'
+        return (self.queryset.filter(**{f'{self.key}__{key_from}': value})
+                .filter(Q(**{f'{self.key}__{key_after}': value}) | Q(**{f'id__{id_after}': pk})))
+
+    def page(self, cursor):
+        position = decode_cursor(cursor)
+        if position is None:
+            items = list(self.queryset.order_by(*self._ordering())[:self.per_page + 1])
+            return KeysetPage(items[:self.per_page], len(items) > self.per_page, False, self.key)
+
+        value, pk, direction = position
+        if direction == NEXT:
+            items = list(self._after(value, pk).order_by(*self._ordering())[:self.per_page + 1])
+            return KeysetPage(items[:self.per_page], len(items) > self.per_page, True, self.key)
+
+        items = list(self._after(value, pk, reverse=True).order_by(*self._ordering(reverse=True))[:self.per_page + 1])
+        has_previous = len(items) > self.per_page
+        return KeysetPage(items[:self.per_page][::-1], True, has_previous, self.key)
@@ -0,0 +1,48 @@
+"""Денормализованный рейтинг товара: сумма оценок, количество отзывов и средняя оценка
+хранятся прямо в Product и меняются атомарно (UPDATE с F-выражениями) сигналами отзывов."""
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
+
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg')
+
+
+def update_rating(product_id, delta_sum, delta_count, using='default'):
+    """Сдвигает сумму и количество оценок товара и пересчитывает среднее в одном UPDATE.
+    В UPDATE все выражения справа видят старые значения строки, поэтому среднее считается
+    от (rating_sum + delta_sum) / (rating_count + delta_count). Заодно обновляется updated_at товара."""
+    from .models import Product
+
+    new_count = F('rating_count') + delta_count
+    Product.objects.using(using).filter(pk=product_id).update(
+        rating_sum=F('rating_sum') + delta_sum,
+        rating_count=new_count,
+        rating_avg=Case(
+            When(Q(rating_count__gt=-delta_count),
+                 then=Cast(F('rating_sum') + delta_sum, FloatField()) / Cast(new_count, FloatField())),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        updated_at=Now(),
+    )
+
+
+def touch_product(product_id, using='default'):
+    """Отмечает товар измененным (например, после правки текста отзыва без изменения оценки)."""
+    from .models import Product
+
+    Product.objects.using(using).filter(pk=product_id).update(updated_at=Now())
+
+
+def rebuild_ratings(using='default'):
+    """Пересчитывает рейтинг всех товаров по таблице отзывов одним UPDATE с подзапросами."""
+    from .models import Product, Review
+
+    reviews = Review.objects.using(using).filter(id_product=OuterRef('pk')).order_by().values('id_product')
+    return Product.objects.using(using).update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0,
+                            output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0,
+                              output_field=IntegerField()),
+        rating_avg=Coalesce(Subquery(reviews.annotate(total=Avg('rating')).values('total')), 0.0,
+                            output_field=FloatField()),
+    )
@@ -0,0 +1,59 @@
+"""Постраничная лента отзывов на странице товара.
+
+Первая страница выводится сразу в detail.html, следующие подгружаются при прокрутке
+из shop:product_reviews. Страницы листаются по курсору (как списки товаров, см. shop/pagination.py):
+следующая страница — отзывы «раньше» последнего показанного, (created_date, id) < (дата, id),
+по индексу (id_product, created_date, id), без OFFSET, поэтому глубина ленты не влияет на время запроса.
+Вместо COUNT(*) выбирается лишняя (n + 1)-я строка: общее число отзывов уже хранится
+в Product.rating_count.
+"""
+import datetime
+
+from django.db.models import Q
+
+from .pagination import NEXT, decode_cursor, encode_cursor
+
+REVIEWS_PER_PAGE = 10
+ORDERING = ('-created_date', '-id')
+
+
+class ReviewPage:
+    def __init__(self, reviews, has_next):
+        self.reviews = reviews
+        self.has_next = has_next
+        last = reviews[-1] if has_next and reviews else None
+        self.next_cursor = encode_cursor(last.created_date.isoformat(), last.pk, NEXT) if last else None
+
+    def __iter__(self):
+        return iter(self.reviews)
+
+    def __len__(self):
+        return len(self.reviews)
+
+
+def _decode(cursor):
+    """(дата, id) последнего показанного отзыва или None — тогда выводится первая страница."""
+    decoded = decode_cursor(cursor)
+    if decoded is None or not isinstance(decoded[0], str):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(decoded[0]), decoded[1]
+    except ValueError:
+        return None
+
+
+def get_review_page(product_id, cursor=None, per_page=REVIEWS_PER_PAGE):
+    """Отзывы товара после курсора cursor (None — первая страница) вместе с авторами, одним запросом."""
+    from .models import Review
+
+    reviews = Review.objects.filter(id_product_id=product_id)
+    after = _decode(cursor)
+    if after:
+        created_date, pk = after
+        reviews = reviews.filter(Q(created_date__lt=created_date) | Q(created_date=created_date, id__lt=pk))
+    reviews = list(
+        reviews.select_related('id_user')
+        .only('id', 'id_product', 'id_user', 'rating', 'text', 'created_date', 'id_user__name')
+        .order_by(*ORDERING)[:per_page + 1]
+    )
+    return ReviewPage(reviews[:per_page], len(reviews) > per_page)
@@ -0,0 +1,107 @@
+"""Материализованные рейтинги продаж: «Бестселлеры» и «Тренды» (?sort=bestsellers|trending).
+
+Как и рейтинг отзывов, продажи хранятся прямо в Product и меняются атомарно
+(UPDATE с F-выражениями) сигналами заказов (orders/signals.py), а не считаются SUM по позициям
+заказов на каждый запрос:
+- sales_units — сколько экземпляров продано за все время;
+- sales_trend — продажи с экспоненциальным затуханием (период полураспада SHOP_TRENDING_HALF_LIFE_DAYS).
+
+Чтобы затухание не требовало периодически пересчитывать все товары, вес продажи растет со временем,
+а не старые продажи уменьшаются: продажа в момент t добавляет quantity * 2 ** ((t - TREND_EPOCH) / T½).
+Отношение весов двух продаж такое же, как при «честном» затухании, поэтому и порядок товаров тот же.
+
+Для сортировок есть индексы (-sales_units, id) и (id_category, -sales_units, id), то же для
+sales_trend: страницы листаются по курсору (shop/pagination.py) без COUNT(*) и OFFSET.
+Заказ учитывается, пока его статус входит в SHOP_SALES_STATUSES; смена статуса на статус
+вне списка снимает его продажи. Пересчитать все с нуля — команда rebuild_sales.
+"""
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Sum, Value, When
+
+from .page_cache import SALES_VERSION_KEY, bump_versions
+
+SALES_FIELDS = ('sales_units', 'sales_trend')
+SORT_PARAM = 'sort'
+# значение ?sort= -> (поле товара, подпись)
+RANKINGS = {
+    'bestsellers': ('sales_units', 'Бестселлеры'),
+    'trending': ('sales_trend', 'Тренды'),
+}
+TREND_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+DEFAULT_SALES_STATUSES = ('wait', 'processing', 'shipped', 'delivered')
+
+
+def get_sales_statuses():
+    return getattr(settings, 'SHOP_SALES_STATUSES', DEFAULT_SALES_STATUSES)
+
+
+def trend_weight(created):
+    """Вес продажи, сделанной в момент created. При T½ = 7 дней float хватает примерно до 2043 года,
+    дальше TREND_EPOCH нужно сдвинуть и выполнить rebuild_sales."""
+    half_life = datetime.timedelta(days=getattr(settings, 'SHOP_TRENDING_HALF_LIFE_DAYS', 7))
+    return 2.0 ** ((created - TREND_EPOCH) / half_life)
+
+
+def get_ranking(params):
+    """Поле товара для сортировки по ?sort= или None. К результатам поиска не применяется:
+    они отсортированы по релевантности."""
+    if params.get('q'):
+        return None
+    ranking = RANKINGS.get(params.get(SORT_PARAM))
+    return ranking[0] if ranking else None
+
+
+def apply_sales(deltas, created, using='default'):
+    """Сдвигает продажи товаров {id товара: изменение количества} для заказа, созданного в created.
+    Все товары обновляются одним UPDATE (CASE по id), сколько бы их ни было в заказе."""
+    from .models import Product
+
+    deltas = {product_id: quantity for product_id, quantity in deltas.items() if quantity}
+    if not deltas:
+        return
+    weight = trend_weight(created)
+    units = Case(*[When(pk=product_id, then=Value(quantity)) for product_id, quantity in deltas.items()],
+                 default=Value(0), output_field=IntegerField())
+    trend = Case(*[When(pk=product_id, then=Value(quantity * weight)) for product_id, quantity in deltas.items()],
+                 default=Value(0.0), output_field=FloatField())
+    Product.objects.using(using).filter(pk__in=deltas).update(
+        sales_units=F('sales_units') + units,
+        sales_trend=F('sales_trend') + trend,
+    )
+    # страницы с сортировкой по продажам устарели
+    transaction.on_commit(lambda: bump_versions([SALES_VERSION_KEY]), using=using)
+
+
+def order_quantities(order_id, using='default'):
+    """{id товара: количество} по всем позициям заказа."""
+    from orders.models import OrderProduct
+
+    rows = (OrderProduct.objects.using(using).filter(id_order_id=order_id)
+            .values('id_product').annotate(total=Sum('quantity')).values_list('id_product', 'total'))
+    return dict(rows)
+
+
+def rebuild_sales(using='default', chunk_size=2000):
+    """Пересчитывает продажи всех товаров по позициям заказов с подходящим статусом."""
+    from orders.models import OrderProduct
+    from .models import Product
+
+    units, trend = Counter(), Counter()
+    items = (OrderProduct.objects.using(using).filter(id_order__status__in=get_sales_statuses())
+             .values_list('id_product', 'quantity', 'id_order__created_date'))
+    for product_id, quantity, created in items.iterator(chunk_size=chunk_size):
+        units[product_id] += quantity
+        trend[product_id] += quantity * trend_weight(created)
+    with transaction.atomic(using=using):
+        Product.objects.using(using).update(sales_units=0, sales_trend=0.0)
+        Product.objects.using(using).bulk_update(
+            [Product(pk=product_id, sales_units=units[product_id], sales_trend=trend[product_id])
+             for product_id in units],
+            SALES_FIELDS, batch_size=500,
+        )
+        transaction.on_commit(lambda: bump_versions([SALES_VERSION_KEY]), using=using)
+    return len(units)
@@ -0,0 +1,110 @@
+"""Поиск товаров по названию и автору на стороне базы данных.
+
+У каждого товара есть нормализованное поле search_text (casefold, «ё» -> «е»,
+схлопнутые пробелы), которое заполняется в Product.save(). Поверх него:
+- в SQLite ведется FTS5-таблица shop_product_fts (rowid = id товара),
+  она синхронизируется сигналами post_save/post_delete из shop/signals.py;
+- в PostgreSQL по search_text построен GIN-индекс pg_trgm, поэтому
+  поиск подстроки не сканирует всю таблицу.
+
+FTS5 ищет слова по началу («толст» -> «Толстой»), но не середину слова («олсто»), которую
+находил прежний поиск icontains. Поэтому, если FTS ничего не нашел, вызывающий код повторяет
+поиск с substring=True — обычным поиском подстроки по search_text (см. ShopHome.get_paginator).
+"""
+import re
+
+from django.db import connections
+
+FTS_TABLE = 'shop_product_fts'
+
+_TOKEN_RE = re.compile(r'\w+')
+_fts_available = {}  # alias базы -> есть ли FTS5-таблица
+
+
+def normalize_search_text(*parts):
+    """Приводит строку к виду, в котором она хранится в Product.search_text.
+    str.casefold() корректно работает с кириллицей, в отличие от LOWER() в SQLite."""
+    text = ' '.join(part for part in parts if part)
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def has_fts_table(using='default'):
+    """Проверяет (один раз на процесс), создана ли FTS5-таблица в базе using."""
+    if using not in _fts_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                available = cursor.fetchone() is not None
+        _fts_available[using] = available
+    return _fts_available[using]
+
+
+def build_match_expression(query):
+    """Превращает поисковый запрос в выражение FTS5: каждое слово ищется по префиксу,
+    все слова должны присутствовать ("толст вой" -> "толст"* "вой"*)."""
+    tokens = _TOKEN_RE.findall(normalize_search_text(query))
+    return ' '.join('"{}"*'.format(token) for token in tokens)
+
+
+def uses_fts(using='default'):
+    """Ищет ли search_products по FTS5 (по началу слов), а не по подстроке."""
+    return connections[using].vendor == 'sqlite' and has_fts_table(using)
+
+
+def search_products(queryset, query, substring=False):
+    """Фильтрует queryset товаров по запросу и сортирует результаты по релевантности.
+    substring=True — искать подстроку и в SQLite с FTS5 (полный просмотр search_text)."""
+    needle = normalize_search_text(query)
+    if not needle:
+        return queryset.none()
+
+    using = queryset.db
+    vendor = connections[using].vendor
+    if not substring and uses_fts(using):
+        match = build_match_expression(query)
+        if not match:
+            return queryset.none()
+        # Соединяемся с FTS-таблицей: SQLite сначала выбирает совпадения из индекса,
+        # а затем достает товары по первичному ключу. rank — это bm25, чем меньше, тем лучше.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=['{0}.rowid = shop_product.id'.format(FTS_TABLE), '{0} MATCH %s'.format(FTS_TABLE)],
+            params=[match],
+            select={'search_rank': '{0}.rank'.format(FTS_TABLE)},
+        ).order_by('search_rank', 'title')
+
+    queryset = queryset.filter(search_text__contains=needle)
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return queryset.annotate(search_rank=TrigramSimilarity('search_text', needle)).order_by('-search_rank', 'title')
+    return queryset.order_by('title')
+
+
+def index_product(product, using='default'):
+    """Обновляет запись товара в FTS-таблице (вызывается из post_save)."""
+    if not has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(FTS_TABLE), [product.pk])
+        cursor.execute('INSERT INTO {0} (rowid, search_text) VALUES (%s, %s)'.format(FTS_TABLE),
+                       [product.pk, product.search_text])
+
+
+def unindex_product(product_id, using='default'):
+    """Удаляет товар из FTS-таблицы (вызывается из post_delete)."""
+    if not has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(FTS_TABLE), [product_id])
+
+
+def rebuild_fts_table(using='default'):
+    """Полностью перезаполняет FTS-таблицу из поля search_text."""
+    if not has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {0}'.format(FTS_TABLE))
+        cursor.execute('INSERT INTO {0} (rowid, search_text) SELECT id, search_text FROM shop_product'.format(FTS_TABLE))
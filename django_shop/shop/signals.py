@@ -0,0 +1,132 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, Review
+from . import search, facets, page_cache, thumbnails
+from .ratings import update_rating, touch_product
+from .local_index import product_payload, publish_change
+from .categories import bump_version as bump_categories_version
+
+FACET_FIELDS = ('id_category_id', 'author', 'price', 'quantity')
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, using, **kwargs):
+    search.index_product(instance, using=using)
+    # индексы в памяти воркеров узнают об изменении только после коммита транзакции
+    transaction.on_commit(partial(publish_change, instance.pk, product_payload(instance)), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, using, **kwargs):
+    search.unindex_product(instance.pk, using=using)
+    transaction.on_commit(partial(publish_change, instance.pk, None), using=using)
+
+
+@receiver(pre_save, sender=Product)
+def remember_facets_before_save(sender, instance, using, raw=False, **kwargs):
+    """Запоминаем, к каким значениям фильтров товар относился до сохранения."""
+    instance._old_facet_keys = []
+    if raw or instance.pk is None:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(field in loaded for field in FACET_FIELDS):
+        old = [loaded[field] for field in FACET_FIELDS]
+    else:  # товар загружен с .only()/.defer() — берем прежние значения из базы
+        old = Product.objects.using(using).filter(pk=instance.pk).values_list(*FACET_FIELDS).first()
+    if old:
+        instance._old_facet_keys = facets.product_facet_keys(*old)
+        instance._old_category_id = old[0]
+
+
+@receiver(post_save, sender=Product)
+def update_facets_on_save(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    new_keys = facets.product_facet_keys(*(getattr(instance, field) for field in FACET_FIELDS))
+    facets.apply_deltas(facets.diff_keys(getattr(instance, '_old_facet_keys', []), new_keys), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def update_facets_on_delete(sender, instance, using, **kwargs):
+    old_keys = facets.product_facet_keys(*(getattr(instance, field) for field in FACET_FIELDS))
+    facets.apply_deltas(facets.diff_keys(old_keys, []), using=using)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, using, raw=False, **kwargs):
+    """При редактировании отзыва запоминаем прежние товар и оценку."""
+    instance._old_rating = None
+    if not raw and instance.pk is not None:
+        instance._old_rating = Review.objects.using(using).filter(pk=instance.pk).values_list(
+            'id_product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, using, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_rating', None)
+    if created or old is None:
+        update_rating(instance.id_product_id, instance.rating, 1, using=using)
+    elif old != (instance.id_product_id, instance.rating):
+        update_rating(old[0], -old[1], -1, using=using)
+        update_rating(instance.id_product_id, instance.rating, 1, using=using)
+    else:  # изменился только текст — страница товара все равно изменилась
+        touch_product(instance.id_product_id, using=using)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, using, **kwargs):
+    update_rating(instance.id_product_id, -instance.rating, -1, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, using, **kwargs):
+    """Закэшированный в воркерах список категорий перечитывается после коммита."""
+    transaction.on_commit(bump_categories_version, using=using)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_pages_on_save(sender, instance, using, raw=False, **kwargs):
+    """Кэш страниц товара, каталога и категорий (включая прежнюю, если товар перенесен)."""
+    if raw:
+        return
+    category_ids = [instance.id_category_id, getattr(instance, '_old_category_id', None)]
+    transaction.on_commit(partial(page_cache.invalidate_product, instance.pk, category_ids), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages_on_delete(sender, instance, using, **kwargs):
+    """Версии страниц товара, каталога и его категории; от них же считаются ETag списков
+    (shop/conditional.py). Сами категории не меняются, их список воркеры не перечитывают."""
+    transaction.on_commit(partial(page_cache.invalidate_product, instance.pk, [instance.id_category_id]), using=using)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_pages(sender, instance, using, raw=False, **kwargs):
+    """Отзывы меняют рейтинг на карточках товара в списках и ленту отзывов на странице товара."""
+    if raw:
+        return
+    product_ids = {instance.id_product_id}
+    old = getattr(instance, '_old_rating', None)
+    if old:
+        product_ids.add(old[0])
+    for product_id in product_ids:
+        transaction.on_commit(partial(page_cache.invalidate_product, product_id), using=using)
+
+
+@receiver(post_save, sender=Product)
+def generate_thumbnails_on_save(sender, instance, created, using, raw=False, **kwargs):
+    """Новое изображение — ставим генерацию уменьшенных копий после коммита."""
+    if raw or not instance.image:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if not created and loaded.get('image', instance.image.name) == instance.image.name:
+        return
+    transaction.on_commit(partial(thumbnails.schedule_variants, instance.pk, instance.image.name,
+                                  instance.image_variants), using=using)
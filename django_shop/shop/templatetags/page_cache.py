@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from shop.page_cache import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_hole(context, template_name, **params):
+    """Кусок страницы, зависящий от пользователя. Если страница рендерится для кэша
+    (shop/page_cache.py), вместо него выводится метка, которая заполняется при каждом запросе."""
+    if context.get('defer_page_holes'):
+        return mark_safe(hole_marker(template_name, params))
+    with context.push(**params):
+        return context.template.engine.get_template(template_name).render(context)
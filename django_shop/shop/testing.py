@@ -0,0 +1,70 @@
+"""Общие данные для тестов магазина (cart, orders, shop)."""
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django_vite.core.asset_loader import DjangoViteAssetLoader
+
+from users.models import CustomUser
+
+from .models import Category, Product
+
+
+def create_buyer(email='buyer@example.com', name='Покупатель', phone_number='79990000000'):
+    return CustomUser.objects.create_user(email, password='secret', phone_number=phone_number, name=name)
+
+
+def create_products(count, category=None, **fields):
+    """count товаров «Книга N» по цене 100 * N (если цена не задана в fields) в категории category,
+    по умолчанию — новой «Проза»."""
+    category = category or Category.objects.create(title='Проза')
+    values = {'author': 'Автор', 'description': '', 'quantity': 10, **fields}
+    return [Product.objects.create(**{'title': f'Книга {number}', 'price': 100 * number, **values},
+                                   id_category=category)
+            for number in range(1, count + 1)]
+
+
+class CatalogTestCase(TestCase):
+    """Категория cls.category и product_count товаров cls.products (create_products с product_fields)."""
+    product_count = 3
+    product_fields = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Проза')
+        cls.products = create_products(cls.product_count, cls.category, **cls.product_fields)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Схема откатывается к миграциям before; тест создает данные моделями old_apps,
+    вызывает migrate() и проверяет результат моделями, которые она возвращает."""
+    before = []
+    after = []
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.addCleanup(self.migrate_to_latest)
+        self.old_apps = executor.loader.project_state(self.before).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        return executor.loader.project_state(self.after).apps
+
+
+@override_settings(DJANGO_VITE={'default': {**settings.DJANGO_VITE['default'], 'dev_mode': True}})
+class PageTestCase(CatalogTestCase):
+    """Для тестов, которые рендерят страницы целиком: в тестах нет сборки Vite (manifest.json),
+    поэтому теги Vite ведут на dev-сервер."""
+
+    def setUp(self):
+        patcher = mock.patch.object(DjangoViteAssetLoader, '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -0,0 +1,645 @@
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .categories import CategoryRegistry
+from .conditional import catalog_validators
+from . import autocomplete, fuzzy_search, page_cache
+from .autocomplete import PrefixIndex
+from .fuzzy_search import TrigramIndex
+from .inventory import InsufficientStock, take_stock
+from .local_index import CHANGE_KEY, SEQ_KEY, ProcessLocalIndex
+from .exports import product_records
+from .facets import CATALOG_SCOPE, get_facet_counts, rebuild_facet_counts
+from .models import Category, FacetCount, Product, Review
+from .pagination import KeysetPaginator
+from .page_cache import CATEGORIES_VERSION_KEY, CATEGORY_VERSION_KEY, get_versions
+from .reviews import get_review_page
+from .search import normalize_search_text, search_products, uses_fts
+from .ratings import rebuild_ratings
+from .sales import rebuild_sales
+from .testing import CatalogTestCase, MigrationTestCase, PageTestCase, create_buyer, create_products
+from .thumbnails import build_targets, delete_variants, render_variants, save_variants
+from .views import ShopHome
+
+
+class CatalogValidatorsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Проза')
+        cls.product = Product.objects.create(title='Война и мир', author='Лев Толстой', description='',
+                                             price=500, quantity=3, id_category=category)
+
+    def validators(self, cookies=None, category_id=None):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return catalog_validators(request, category_id)
+
+    def test_etag_follows_page_cache_versions(self):
+        category_id = self.product.id_category_id
+        self.validators()  # список категорий процесса загружен
+        with self.assertNumQueries(0):
+            etag, modified = self.validators()
+            category_etag = self.validators(category_id=category_id)[0]
+        self.assertIsNone(modified)
+        self.assertEqual(self.validators(), (etag, None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).save()
+        self.assertNotEqual(self.validators()[0], etag)
+        self.assertNotEqual(self.validators(category_id=category_id)[0], category_etag)
+
+    def test_product_delete_keeps_category_list(self):
+        category_id = self.product.id_category_id
+        keys = [CATEGORIES_VERSION_KEY, CATEGORY_VERSION_KEY.format(category_id)]
+        categories_version, category_version = get_versions(keys)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).delete()
+        new_categories_version, new_category_version = get_versions(keys)
+        self.assertEqual(new_categories_version, categories_version)
+        self.assertNotEqual(new_category_version, category_version)
+
+    def test_cart_change_changes_etag(self):
+        etag, modified = self.validators()
+        self.client.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 1})
+        cookies = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        cart_etag, cart_modified = self.validators(cookies)
+        self.assertNotEqual(cart_etag, etag)
+        self.assertIsNone(cart_modified)
+        self.client.post(f'/cart/api/add/{self.product.pk}/', {'quantity': 1})
+        cookies = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        self.assertNotEqual(self.validators(cookies)[0], cart_etag)
+
+
+class InventoryTestCase(CatalogTestCase):
+    product_count = 2
+    product_fields = {'quantity': 2}
+
+    def stock(self):
+        return sorted(Product.objects.filter(pk__in=[p.pk for p in self.products]).values_list('quantity', flat=True))
+
+
+class TakeStockTests(InventoryTestCase):
+    def test_last_items_are_sold_once(self):
+        product = self.products[0]
+        with transaction.atomic():
+            take_stock({product.pk: 2})
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            take_stock({product.pk: 1})
+        self.assertEqual(raised.exception.products, [product.title])
+        self.assertEqual(self.stock(), [0, 2])
+
+    def test_all_or_nothing(self):
+        first, second = self.products
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            take_stock({first.pk: 1, second.pk: 3})
+        self.assertEqual(self.stock(), [2, 2])
+
+    def test_missing_product(self):
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            take_stock({self.products[0].pk: 1, 10 ** 9: 1})
+        self.assertEqual(raised.exception.products, [f'#{10 ** 9}'])
+        self.assertEqual(self.stock(), [2, 2])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Параллельные покупатели разбирают последние экземпляры: продано не больше, чем было."""
+
+    def checkout(self, user_id, quantities):
+        from orders.models import Order
+        from orders.services import CheckoutError, place_order
+
+        try:
+            for _ in range(100):  # тестовая база SQLite в памяти отвечает «table is locked» без ожидания
+                try:
+                    place_order(Order(id_user_id=user_id, address='Москва'), quantities)
+                    return 'ok'
+                except OperationalError:
+                    time.sleep(0.01)
+            return 'error'
+        except CheckoutError:
+            return 'rejected'
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        from orders.models import OrderProduct
+
+        user = create_buyer()
+        products = create_products(3, quantity=5)
+        rnd = random.Random(1)
+        jobs = [{product.pk: rnd.randint(1, 2) for product in rnd.sample(products, rnd.randint(1, 3))}
+                for _ in range(30)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            outcomes = list(executor.map(self.checkout, [user.pk] * len(jobs), jobs))
+
+        self.assertNotIn('error', outcomes)
+        self.assertIn('rejected', outcomes)
+        sold = Counter()
+        for product_id, quantity in OrderProduct.objects.values_list('id_product', 'quantity'):
+            sold[product_id] += quantity
+        for product in products:
+            product.refresh_from_db()
+            self.assertGreaterEqual(product.quantity, 0)
+            self.assertEqual(product.quantity + sold[product.pk], 5)
+
+
+class LocalIndexTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(title='Проза')
+        self.create('Война и мир')
+
+    def create(self, title):
+        return Product.objects.create(title=title, author='Лев Толстой', description='', price=100, quantity=1,
+                                      id_category=self.category)
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ProcessLocalIndex()
+
+    def test_feed_gap_rebuilds_in_background(self):
+        index = PrefixIndex()
+        index.rebuild()
+        self.assertEqual({s['value'] for s in index.suggest('вой')}, {'Война и мир'})
+
+        self.create('Воскресение')
+        cache.delete(CHANGE_KEY.format(cache.get(SEQ_KEY)))  # запись ленты вытеснена
+        with mock.patch('shop.local_index.threading.Thread') as thread:
+            index.ensure_fresh()
+        # запрос не ждет перестройки и ищет по прежнему индексу
+        self.assertEqual({s['value'] for s in index.suggest('во')}, {'Война и мир'})
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        thread.call_args.kwargs['target']()
+        self.assertEqual({s['value'] for s in index.suggest('во')}, {'Война и мир', 'Воскресение'})
+        index.ensure_fresh()
+        self.assertEqual(len(index), 2)
+
+    def test_cold_index_does_not_block_search(self):
+        product = self.create('Анна Каренина')
+        with mock.patch.object(autocomplete, 'prefix_index', PrefixIndex()) as prefixes, \
+                mock.patch.object(fuzzy_search, 'trigram_index', TrigramIndex()) as trigrams, \
+                mock.patch('shop.local_index.threading.Thread') as thread:
+            # индексы строятся в фоне, а до тех пор ответы берутся из базы
+            self.assertEqual([s['value'] for s in autocomplete.suggest('каре')], ['Анна Каренина'])
+            self.assertEqual([s['type'] for s in autocomplete.suggest('толс')], ['author'])
+            self.assertEqual(fuzzy_search.fuzzy_search('каренина анн')[0], (product.pk, 1.0))
+            self.assertFalse(prefixes.ready or trigrams.ready)
+            self.assertEqual(thread.return_value.start.call_count, 2)
+
+            for call in thread.call_args_list:
+                call.kwargs['target']()
+            with self.assertNumQueries(0):
+                self.assertEqual([s['value'] for s in autocomplete.suggest('каре')], ['Анна Каренина'])
+                self.assertEqual(fuzzy_search.fuzzy_search('коренина')[0][0], product.pk)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Проза')
+        cls.product = Product.objects.create(title='Война и мир', author='Лев Толстой', description='', price=100,
+                                             quantity=1, id_category=category)
+
+    def paginator(self, q):
+        view = ShopHome()
+        view.setup(RequestFactory().get('/', {'q': q}))
+        return view.get_paginator(view.get_queryset(), 32)
+
+    def test_word_prefix(self):
+        self.assertEqual(list(search_products(Product.objects.all(), 'толст')), [self.product])
+
+    def test_middle_of_word_falls_back_to_substring(self):
+        self.assertTrue(uses_fts())
+        self.assertEqual(list(search_products(Product.objects.all(), 'олсто')), [])
+        self.assertEqual(list(search_products(Product.objects.all(), 'олсто', substring=True)), [self.product])
+        self.assertEqual(list(self.paginator('олсто').object_list), [self.product])
+
+
+class AutocompleteViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Проза')
+        for number in range(3):
+            Product.objects.create(title=f'Война {number}', author=f'Автор {number}', description='', price=100,
+                                   quantity=1, id_category=category)
+
+    def setUp(self):
+        cache.clear()
+        index = PrefixIndex()
+        index.rebuild()
+        patcher = mock.patch.object(autocomplete, 'prefix_index', index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def suggestions(self, limit):
+        response = self.client.get(reverse('shop:autocomplete'), {'q': 'вой', 'limit': limit})
+        return response.json()['suggestions']
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.suggestions(2)), 2)
+        self.assertEqual(len(self.suggestions(0)), 1)
+        self.assertEqual(len(self.suggestions(-5)), 1)
+
+
+class ReviewPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Отзывы')
+        cls.product = Product.objects.create(title='Товар', author='Автор', description='', price=100,
+                                             quantity=1, id_category=category)
+        reviews = [Review.objects.create(id_product=cls.product, rating=5, text=str(number)) for number in range(7)]
+        # у части отзывов одинаковая дата — порядок внутри нее задает id
+        same_date = timezone.now()
+        Review.objects.filter(pk__in=[review.pk for review in reviews[2:5]]).update(created_date=same_date)
+        cls.expected = list(Review.objects.filter(id_product=cls.product)
+                            .order_by('-created_date', '-id').values_list('pk', flat=True))
+
+    def test_cursor_walks_all_reviews_once(self):
+        seen, cursor = [], None
+        while True:
+            page = get_review_page(self.product.pk, cursor, per_page=2)
+            seen += [review.pk for review in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_view_pages_and_unknown_product(self):
+        url = reverse('shop:product_reviews', args=[self.product.pk])
+        first = self.client.get(url).json()
+        self.assertIsNone(first['next_cursor'])  # все 7 отзывов помещаются на первую страницу
+        self.assertEqual(self.client.get(url, {'cursor': 'испорчен'}).json(), first)
+        self.assertEqual(self.client.get(reverse('shop:product_reviews', args=[self.product.pk + 100])).status_code,
+                         404)
+
+
+class ThumbnailTests(CatalogTestCase):
+    product_count = 2
+
+    def setUp(self):
+        from PIL import Image
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Image.new('RGB', (400, 600), 'white').save(os.path.join(media.name, 'cover.jpg'))
+        Product.objects.filter(pk__in=[product.pk for product in self.products]).update(image='cover.jpg')
+
+    def generate(self):
+        source_width, created = render_variants(default_storage.path('cover.jpg'), build_targets('cover.jpg'))
+        save_variants([product.pk for product in self.products], 'cover.jpg', source_width, created)
+        return Product.objects.get(pk=self.products[0].pk).image_variants
+
+    def test_variants_saved_to_products(self):
+        metadata = self.generate()
+        self.assertEqual(metadata['source'], 'cover.jpg')
+        self.assertEqual(metadata['width'], 400)
+        self.assertEqual(metadata['formats']['jpg'], [160, 320])  # шире оригинала копий нет
+        self.assertTrue(default_storage.exists('cover.w320.jpg'))
+        sources = Product.objects.get(pk=self.products[1].pk).image_sources()
+        self.assertIn('cover.w160.jpg 160w', sources['srcset'])
+
+    def test_shared_source_variants_are_kept(self):
+        metadata = self.generate()
+        first, second = self.products
+        Product.objects.filter(pk=first.pk).update(image='other.jpg')
+        delete_variants(metadata)
+        self.assertTrue(default_storage.exists('cover.w320.jpg'))
+        self.assertIn('cover.w320.jpg', Product.objects.get(pk=second.pk).image_sources()['srcset'])
+
+        Product.objects.filter(pk=second.pk).update(image='other.jpg')
+        delete_variants(metadata)
+        self.assertFalse(default_storage.exists('cover.w320.jpg'))
+
+
+class FacetCountTests(CatalogTestCase):
+    def counts(self):
+        return set(FacetCount.objects.filter(count__gt=0).values_list('scope', 'facet', 'value', 'count'))
+
+    def test_counters_follow_price_stock_and_category_changes(self):
+        from orders.models import Order
+        from orders.services import place_order
+
+        first, second, third = (Product.objects.get(pk=product.pk) for product in self.products)
+        other = Category.objects.create(title='Поэзия')
+        with self.captureOnCommitCallbacks(execute=True):
+            third.price = 700
+            third.save()
+            first.quantity = 0
+            first.save()
+            second.id_category = other
+            second.save()
+            place_order(Order(id_user=create_buyer(), address='Москва'), {third.pk: 10})  # последние экземпляры
+            Product.objects.get(pk=self.products[1].pk).delete()
+
+        incremental = self.counts()
+        rebuild_facet_counts()
+        self.assertEqual(incremental, self.counts())
+        catalog = get_facet_counts(CATALOG_SCOPE)
+        self.assertEqual(catalog['in_stock'], 0)
+        self.assertEqual(catalog['price'], {'0-300': 1, '600-1000': 1})
+        self.assertEqual(get_facet_counts(other.pk)['author'], [])
+
+
+class KeysetPaginatorTests(CatalogTestCase):
+    product_count = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # одинаковые названия: порядок внутри них задает id
+        Product.objects.filter(pk__in=[product.pk for product in cls.products[2:5]]).update(title='Книга')
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append([product.pk for product in page])
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_walks_every_product_once_in_order(self):
+        expected = list(Product.objects.order_by('title', 'id').values_list('pk', flat=True))
+        pages = self.walk(KeysetPaginator(Product.objects.all(), 2))
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+    def test_cursor_is_stable_when_products_are_added_before_it(self):
+        paginator = KeysetPaginator(Product.objects.all(), 2)
+        first = paginator.page(None)
+        second = paginator.page(first.next_cursor)
+        Product.objects.create(title='Азбука', author='Автор', description='', price=100, quantity=1,
+                               id_category=self.category)
+        self.assertEqual(list(paginator.page(first.next_cursor)), list(second))
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    def test_descending_key(self):
+        for number, product in enumerate(self.products):
+            Product.objects.filter(pk=product.pk).update(sales_units=number % 3)
+        expected = list(Product.objects.order_by('-sales_units', 'id').values_list('pk', flat=True))
+        pages = self.walk(KeysetPaginator(Product.objects.all(), 3, key='sales_units', descending=True))
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+
+class RatingTests(CatalogTestCase):
+    product_count = 2
+
+    def ratings(self):
+        return list(Product.objects.order_by('pk').values_list('rating_sum', 'rating_count', 'rating_avg'))
+
+    def test_review_changes_keep_denormalized_rating(self):
+        first, second = self.products
+        reviews = [Review.objects.create(id_product=first, rating=rating) for rating in (5, 4, 2)]
+        self.assertEqual(self.ratings(), [(11, 3, 11 / 3), (0, 0, 0.0)])
+
+        reviews[0].rating = 3
+        reviews[0].save()
+        reviews[1].id_product = second
+        reviews[1].save()
+        reviews[2].delete()
+        self.assertEqual(self.ratings(), [(3, 1, 3.0), (4, 1, 4.0)])
+
+        Review.objects.filter(pk=reviews[0].pk).update(rating=1)  # мимо сигналов
+        rebuild_ratings()
+        self.assertEqual(self.ratings(), [(1, 1, 1.0), (4, 1, 4.0)])
+
+
+class RatingMigrationTests(MigrationTestCase):
+    before = [('shop', '0005_product_keyset_indexes')]
+    after = [('shop', '0006_product_rating_aggregates')]
+
+    def test_backfills_ratings(self):
+        Category = self.old_apps.get_model('shop', 'Category')
+        Product = self.old_apps.get_model('shop', 'Product')
+        Review = self.old_apps.get_model('shop', 'Review')
+        category = Category.objects.create(title='Проза')
+        rated, unrated = (Product.objects.create(title=title, author='Автор', description='', price=100, quantity=1,
+                                                 id_category=category) for title in ('Книга 1', 'Книга 2'))
+        for rating in (5, 2):
+            Review.objects.create(id_product=rated, rating=rating)
+
+        products = self.migrate().get_model('shop', 'Product').objects.order_by('pk')
+        self.assertEqual(list(products.values_list('rating_sum', 'rating_count', 'rating_avg')),
+                         [(7, 2, 3.5), (0, 0, 0.0)])
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = CategoryRegistry()
+
+    def test_reloads_only_after_category_changes(self):
+        category = Category.objects.create(title='Проза')
+        self.assertEqual([c.title for c in self.registry.all()], ['Проза'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.registry.get(category.pk).title, 'Проза')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.title = 'Классика'
+            category.save()
+        self.assertEqual(self.registry.get(category.pk).title, 'Классика')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertIsNone(self.registry.get(category.pk))
+
+    def test_evicted_version_reloads(self):
+        Category.objects.create(title='Проза')
+        self.registry.all()
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.registry.all()
+
+
+@override_settings(SHOP_PAGE_CACHE=True)
+class PageCacheTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = self.products[0].get_absolute_url()
+
+    def get(self, client):
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response[page_cache.HEADER], response.content.decode()
+
+    def test_holes_are_rendered_for_each_visitor(self):
+        first, second, anonymous = Client(), Client(), Client()
+        first.force_login(create_buyer())
+        second.force_login(create_buyer('second@example.com', name='Читатель', phone_number='79990000001'))
+        anonymous.post(f'/cart/api/add/{self.products[1].pk}/', {'quantity': 3})
+
+        outcome, html = self.get(first)
+        self.assertEqual(outcome, 'MISS')
+        self.assertIn('Покупатель', html)
+
+        outcome, html = self.get(second)
+        self.assertEqual(outcome, 'HIT')
+        self.assertIn('Читатель', html)
+        self.assertNotIn('Покупатель', html)
+
+        outcome, html = self.get(anonymous)
+        self.assertEqual(outcome, 'HIT')
+        self.assertNotIn('Покупатель', html)
+        self.assertNotIn('Читатель', html)
+        self.assertIn('>3</span>', html)  # счетчик корзины этого посетителя
+
+    def test_product_change_invalidates_page(self):
+        self.get(self.client)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[0].pk)
+            product.description = 'Новое описание'
+            product.save()
+        outcome, html = self.get(self.client)
+        self.assertEqual(outcome, 'MISS')
+        self.assertIn('Новое описание', html)
+
+
+class ImportCatalogTests(CatalogTestCase):
+    ROWS = [
+        'title,author,description,price,quantity,category,image',
+        'Книга 1,Автор,Новое описание,150,4,Проза,',  # уже есть — обновляется
+        'Новая книга,Автор,,"99,5",2,Поэзия,',
+        'Без цены,Автор,,,1,Проза,',
+        'Книга 2,Автор,,-1,1,Проза,',
+        'Книга 3,Автор,,много,два,Проза,',
+        'Новая книга,Автор,,1,1,Проза,',  # повтор — берется первая строка
+    ]
+
+    def import_rows(self, *args, rows=None):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'catalog.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(rows or self.ROWS) + '\n')
+        stderr = io.StringIO()
+        call_command('import_catalog', path, '--no-thumbnails', *args, stdout=io.StringIO(), stderr=stderr)
+        return path, stderr.getvalue()
+
+    def test_upsert_and_validation(self):
+        _, errors = self.import_rows('--create-categories')
+        updated = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual((updated.description, updated.price, updated.quantity), ('Новое описание', 150, 4))
+        created = Product.objects.get(title='Новая книга')
+        self.assertEqual((created.price, created.quantity, created.id_category.title), (Decimal('99.50'), 2, 'Поэзия'))
+        self.assertEqual(created.search_text, normalize_search_text('Новая книга', 'Автор'))
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertIn('строка 3: price: не заполнено', errors)
+        self.assertIn('строка 4: price: цена должна быть положительной', errors)
+        self.assertIn('строка 5: price: не число; quantity: не целое число', errors)
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).price, 200)
+
+    def test_unknown_category_and_skip_existing(self):
+        _, errors = self.import_rows('--skip-existing')
+        self.assertIn('строка 2: category: неизвестная категория «Поэзия»', errors)
+        self.assertFalse(Product.objects.filter(title='Новая книга', id_category__title='Поэзия').exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).price, 100)
+        self.assertEqual(get_facet_counts()['in_stock'], 4)
+
+    def test_resume_skips_processed_rows(self):
+        rows = self.ROWS[:3]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'catalog.checkpoint')
+        path, _ = self.import_rows('--create-categories', '--checkpoint', checkpoint, rows=[rows[0], rows[2]])
+        self.assertFalse(os.path.exists(checkpoint))  # удаляется после успешного импорта
+        with open(checkpoint, 'w') as file:
+            json.dump({'source': os.path.abspath(path), 'rows': 1}, file)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(rows) + '\n')
+        call_command('import_catalog', path, '--no-thumbnails', '--resume', '--checkpoint', checkpoint,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).price, 100)  # строка 1 уже обработана
+        self.assertEqual(Product.objects.filter(title='Новая книга').count(), 1)
+
+
+class ExportTests(CatalogTestCase):
+    def test_admin_action_streams_products(self):
+        admin = site._registry[Product]
+        with self.assertNumQueries(0):  # выборка выполняется только при отдаче тела ответа
+            response = admin.export_csv(None, Product.objects.filter(pk__in=[p.pk for p in self.products[:2]]))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="products-', response['Content-Disposition'])
+
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual([(row['title'], row['price'], row['category']) for row in rows],
+                         [('Книга 1', '100.00', 'Проза'), ('Книга 2', '200.00', 'Проза')])
+
+    def test_records_are_read_in_chunks(self):
+        create_products(3, self.category)
+        with self.assertNumQueries(1):
+            records = product_records(Product.objects.all(), chunk_size=2)
+            self.assertEqual(next(records)['id'], self.products[0].pk)
+        self.assertEqual(len(list(records)), 5)
+
+    def test_jsonl_command(self):
+        output = io.StringIO()
+        call_command('export_data', 'products', '--format', 'jsonl', stdout=output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([record['title'] for record in records], ['Книга 1', 'Книга 2', 'Книга 3'])
+        self.assertEqual(records[0]['price'], '100.00')
+
+
+class SalesRankingTests(PageTestCase):
+    def ranking(self, sort):
+        response = self.client.get(reverse('shop:product_list'), {'sort': sort})
+        return [product.pk for product in response.context['products']]
+
+    def test_bestsellers_and_trending(self):
+        from orders.models import Order
+        from orders.services import place_order
+
+        first, second, third = (product.pk for product in self.products)
+        buyer = create_buyer()
+        with self.captureOnCommitCallbacks(execute=True):
+            old = place_order(Order(id_user=buyer, address='Москва'), {second: 3})
+            place_order(Order(id_user=buyer, address='Москва'), {first: 2, third: 1})
+        self.assertEqual(self.ranking('bestsellers'), [second, first, third])
+        self.assertEqual(self.ranking('trending'), [second, first, third])
+
+        # месячной давности продажи весят в 2 ** (30 / 7) раз меньше: 3 старых < 2 новых
+        Order.objects.filter(pk=old.pk).update(created_date=timezone.now() - timedelta(days=30))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_sales(), 3)
+        self.assertEqual(self.ranking('bestsellers'), [second, first, third])
+        self.assertEqual(self.ranking('trending'), [first, third, second])
+
+    @override_settings(SHOP_SALES_STATUSES=('delivered',))
+    def test_status_change_moves_sales(self):
+        from orders.models import Order
+        from orders.services import place_order
+
+        order = place_order(Order(id_user=create_buyer(), address='Москва'), {self.products[2].pk: 1})
+        self.assertEqual(Product.objects.get(pk=self.products[2].pk).sales_units, 0)
+        for status, units in (('delivered', 1), ('shipped', 0)):
+            order.status = status
+            order.save()
+            self.assertEqual(Product.objects.get(pk=self.products[2].pk).sales_units, units)
@@ -0,0 +1,173 @@
+"""Уменьшенные копии обложек товаров (Product.image) в форматах AVIF, WebP и JPEG.
+
+Копии нескольких ширин сохраняются рядом с оригиналом: media/<имя>.w320.webp и т.д.
+Их генерирует Pillow в отдельных процессах (ProcessPoolExecutor), чтобы кодирование
+не занимало воркер, обрабатывающий запросы. Задача ставится после коммита сохранения товара
+с новым изображением (shop/signals.py), для уже загруженных товаров есть команда generate_thumbnails.
+
+Готовые копии записываются в Product.image_variants вместе с именем исходного файла;
+шаблоны получают srcset через Product.image_sources(), пока копий нет — выводится оригинал.
+Работает с хранилищем на локальном диске (FileSystemStorage).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models.functions import Now
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 480)
+# (формат Pillow, расширение, MIME-тип, параметры сохранения) в порядке предпочтения браузером
+FORMATS = (
+    ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 4}),
+    ('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+MIME_TYPES = {extension: mime for _, extension, mime, _ in FORMATS}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(image_name, width, extension):
+    """'books/cover.jpg' -> 'books/cover.w320.webp'."""
+    stem, _ = os.path.splitext(image_name)
+    return f'{stem}.w{width}.{extension}'
+
+
+def available_formats():
+    from PIL import features
+
+    return [(fmt, extension, options) for fmt, extension, _, options in FORMATS
+            if fmt == 'JPEG' or features.check(fmt.lower())]
+
+
+def render_variants(source_path, targets):
+    """Выполняется в дочернем процессе, без Django. targets — [(путь, ширина, формат, параметры)].
+    Возвращает (ширина оригинала, [(ширина, формат), ...] для созданных файлов)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        source_width, source_height = image.size
+        created = []
+        resized = {}
+        for path, width, fmt, options in targets:
+            if width >= source_width:  # не увеличиваем
+                continue
+            if width not in resized:
+                height = max(round(source_height * width / source_width), 1)
+                resized[width] = image.resize((width, height), Image.Resampling.LANCZOS)
+            variant = resized[width]
+            if fmt == 'JPEG' and variant.mode == 'RGBA':
+                variant = variant.convert('RGB')
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            variant.save(tmp_path, fmt, **options)
+            os.replace(tmp_path, path)  # браузер не должен увидеть недописанный файл
+            created.append((width, fmt))
+    return source_width, created
+
+
+def build_targets(image_name):
+    return [(default_storage.path(variant_name(image_name, width, extension)), width, fmt, options)
+            for width in WIDTHS for fmt, extension, options in available_formats()]
+
+
+def variants_metadata(image_name, source_width, created):
+    extensions = {fmt: extension for fmt, extension, _, _ in FORMATS}
+    formats = {}
+    for width, fmt in created:
+        formats.setdefault(extensions[fmt], []).append(width)
+    return {'source': image_name, 'width': source_width, 'formats': formats}
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерние процессы не наследуют потоки и соединения с базой воркера
+            _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'SHOP_THUMBNAIL_WORKERS', 2),
+                                            mp_context=get_context('spawn'))
+        return _executor
+
+
+def reset_executor():
+    """Отбрасывает пул, если его процесс аварийно завершился; следующая задача создаст новый."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def save_variants(product_ids, image_name, source_width, created):
+    """Записывает готовые копии в товары, у которых за это время изображение не заменили."""
+    from .models import Product
+    from .page_cache import invalidate_product
+
+    metadata = variants_metadata(image_name, source_width, created)
+    products = Product.objects.filter(pk__in=product_ids, image=image_name)
+    updated_ids = list(products.values_list('pk', flat=True))
+    products.update(image_variants=metadata, updated_at=Now())
+    for product_id in updated_ids:
+        invalidate_product(product_id)
+
+
+def delete_variants(metadata):
+    """Удаляет копии прежнего изображения, если оно больше не обложка ни одного товара:
+    generate_thumbnails и импорт каталога назначают один файл нескольким товарам."""
+    from .models import Product
+
+    if not metadata or not metadata.get('source'):
+        return
+    if Product.objects.filter(image=metadata['source']).exists():
+        return
+    for extension, widths in metadata.get('formats', {}).items():
+        for width in widths:
+            default_storage.delete(variant_name(metadata['source'], width, extension))
+
+
+def schedule_variants(product_id, image_name, old_metadata=None):
+    """Ставит генерацию копий в пул процессов; результат сохраняется в товар из потока обратного вызова."""
+    try:
+        targets = build_targets(image_name)
+        source_path = default_storage.path(image_name)
+    except NotImplementedError:
+        logger.warning('Хранилище не поддерживает локальные пути, копии изображения не созданы: %s', image_name)
+        return None
+
+    def on_done(future):
+        try:
+            source_width, created = future.result()
+        except BrokenProcessPool:
+            logger.exception('Пул процессов для копий изображений аварийно завершился')
+            reset_executor()
+            return
+        except Exception:
+            logger.exception('Не удалось создать копии изображения %s', image_name)
+            return
+        try:
+            save_variants([product_id], image_name, source_width, created)
+            if old_metadata and old_metadata.get('source') != image_name:
+                delete_variants(old_metadata)
+        except Exception:
+            logger.exception('Не удалось сохранить копии изображения %s', image_name)
+        finally:
+            connections.close_all()  # соединения потока обратного вызова
+
+    try:
+        future = get_executor().submit(render_variants, source_path, targets)
+    except BrokenProcessPool:
+        reset_executor()
+        future = get_executor().submit(render_variants, source_path, targets)
+    future.add_done_callback(on_done)
+    return future
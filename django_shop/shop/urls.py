@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ShopHome, ShopCategory, ProductDetailView, about
+from .views import ShopHome, ShopCategory, ProductDetailView, about, autocomplete, product_reviews
 
 app_name = 'shop'
 
@@ -7,5 +7,7 @@ urlpatterns = [
     path('', ShopHome.as_view(), name='product_list'),
     path('category/<int:category_id>/', ShopCategory.as_view(), name='product_list_by_category'),
     path('category/<int:category_id>/product/<int:product_id>/', ProductDetailView.as_view(), name='product_detail'),
+    path('product/<int:product_id>/reviews/', product_reviews, name='product_reviews'),
     path('about/', about, name='about'),
+    path('search/autocomplete/', autocomplete, name='autocomplete'),
 ]
@@ -1,4 +1,9 @@
-from .models import *
+from django.conf import settings
+
+from .facets import apply_facet_filters, build_facet_context, CATALOG_SCOPE
+from .pagination import KeysetPaginator, CURSOR_PARAM
+from .categories import get_categories
+from .sales import RANKINGS, SORT_PARAM, get_ranking
 
 
 class DataMixin:
@@ -7,9 +12,47 @@ class DataMixin:
     """
     paginate_by = 32  # класс представления нашей страницы со списком товаров наследуется от ListView, который
                      # в свою очередь автоматически передает в указанный шаблон 2 объекта: paginator и page_obj
+    keyset_pagination = getattr(settings, 'SHOP_KEYSET_PAGINATION', False)  # пагинация по курсору вместо номеров страниц
 
     def get_user_context(self, **kwargs):
         context = kwargs
-        categories = Category.objects.all()
-        context['categories'] = categories
+        context['categories'] = get_categories()
         return context
+
+    def paginate_queryset(self, queryset, page_size):
+        """Для списков в порядке по названию может использоваться keyset-пагинация (shop/pagination.py):
+        без COUNT(*) и OFFSET. Она включается настройкой SHOP_KEYSET_PAGINATION или параметром cursor.
+        Списки по продажам (?sort=bestsellers|trending) всегда листаются по курсору.
+        Списки с другой сортировкой (например, результаты поиска) листаются по номерам страниц."""
+        ranking = get_ranking(self.request.GET)
+        if ranking:
+            page = KeysetPaginator(queryset, page_size, key=ranking, descending=True).page(
+                self.request.GET.get(CURSOR_PARAM))
+            return None, page, page.object_list, page.has_other_pages()
+        use_keyset = self.keyset_pagination or CURSOR_PARAM in self.request.GET
+        if not use_keyset or queryset.query.order_by or queryset.query.extra_order_by:
+            return super().paginate_queryset(queryset, page_size)
+        page = KeysetPaginator(queryset, page_size).page(self.request.GET.get(CURSOR_PARAM))
+        return None, page, page.object_list, page.has_other_pages()
+
+    def filter_by_facets(self, queryset):
+        """Применяет фильтры из GET-параметров (автор, цена, наличие)."""
+        return apply_facet_filters(queryset, self.request.GET)
+
+    def get_facet_context(self, category_id=None):
+        """Панель фильтров с количеством товаров, варианты сортировки и GET-параметры для ссылок пагинации."""
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop(CURSOR_PARAM, None)
+        sort = params.pop(SORT_PARAM, [''])[-1]
+        sort = sort if sort in RANKINGS else ''
+        sort_query = params.urlencode() + '&' if params else ''
+        if sort:
+            params[SORT_PARAM] = sort
+        return {
+            'facets': build_facet_context(category_id or CATALOG_SCOPE, self.request.GET),
+            'page_query': params.urlencode() + '&' if params else '',
+            'sort': sort,
+            'sort_query': sort_query,
+            'sort_options': [('', 'По названию')] + [(value, label) for value, (_, label) in RANKINGS.items()],
+        }
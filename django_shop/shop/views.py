@@ -3,19 +3,40 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
 from .forms import ReviewForm
 from .models import *
-from orders.models import OrderProduct
+from orders.purchases import has_delivered_purchase, review_eligibility
+from orders.recommendations import get_recommendations
 from .utils import DataMixin
+from .search import search_products, uses_fts
+from .fuzzy_search import fuzzy_search
+from .autocomplete import suggest, DEFAULT_LIMIT, MAX_LIMIT
+from .reviews import get_review_page
+from .categories import category_registry, get_category_or_404
+from .conditional import conditional_page, catalog_validators, product_validators
+from .page_cache import (PageCacheMixin, CATEGORIES_VERSION_KEY, CATALOG_VERSION_KEY, CATEGORY_VERSION_KEY,
+                         PRODUCT_VERSION_KEY, SALES_VERSION_KEY)
+from .sales import get_ranking
 from cart.forms import CartAddProductForm
-from django.shortcuts import render
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Case, When
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from urllib.parse import urlencode
 
 logger.add("debug.log", format="{time} {level} {message}", level="DEBUG", rotation="10 MB")
 
 
-class ShopHome(DataMixin, ListView):
+@conditional_page(lambda request: catalog_validators(request))
+class ShopHome(PageCacheMixin, DataMixin, ListView):
     model = Product
     template_name = 'shop/product/list.html'
     context_object_name = 'products'
+    fuzzy_results = False  # True, если результаты найдены нечетким поиском
+
+    def get_page_cache_versions(self):
+        versions = [CATEGORIES_VERSION_KEY, CATALOG_VERSION_KEY]
+        return versions + [SALES_VERSION_KEY] if get_ranking(self.request.GET) else versions
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -23,59 +44,91 @@ class ShopHome(DataMixin, ListView):
         context['query'] = q  # Добавляем поисковый запрос в контекст
         if q:  # Проверяем, есть ли поисковый запрос
             products = context['products']
-            if products:  # Проверяем, есть ли результаты поиска
+            if products and self.fuzzy_results:
+                context['title'] = f'Возможно, вы искали «{q}»'
+                context['fuzzy_results'] = True
+            elif products:  # Проверяем, есть ли результаты поиска
                 context['title'] = f'Товары по запросу «{q}»'
             else:
                 context['title'] = f'По запросу «{q}» ничего не найдено'
         else:
             context['title'] = "Главная"
+        context.update(self.get_facet_context())
         return context
 
     def get_queryset(self):
         queryset = super().get_queryset().select_related('id_category')
         q = self.request.GET.get('q')  # получаем запрос поиска из параметров GET запроса
         if q:
-            # Фильтрация на уровне Python для корректной работы с кириллицей
-            q_lower = q.lower()
-            filtered_ids = [
-                product.id for product in queryset
-                if q_lower in product.title.lower() or q_lower in product.author.lower()
-            ]
-            queryset = queryset.filter(id__in=filtered_ids)
-        return queryset
-
-
-class ProductDetailView(DataMixin, DetailView):
+            # Поиск выполняется в базе по нормализованному полю search_text (см. shop/search.py),
+            # результаты отсортированы по релевантности
+            queryset = search_products(queryset, q)
+        return self.filter_by_facets(queryset)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        """Если поиск ничего не нашел, пробуются поиск подстроки (когда искали по FTS5 — он находит
+        только начала слов) и поиск с учетом опечаток. Пустоту показывает COUNT(*) пагинатора,
+        так что при найденных товарах лишних запросов нет."""
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        q = self.request.GET.get('q')
+        if not q or paginator.count:
+            return paginator
+        base = super().get_queryset().select_related('id_category')
+        if search_products(base, q).exists():
+            return paginator  # совпадения есть, их скрыли фильтры
+        if uses_fts(base.db):
+            found = search_products(base, q, substring=True)
+            if found.exists():
+                return super().get_paginator(self.filter_by_facets(found), per_page, **kwargs)
+        # Точных совпадений нет — ищем с учетом опечаток по триграммному индексу
+        self.fuzzy_results = True
+        fuzzy = self.filter_by_facets(self.get_fuzzy_queryset(base, q))
+        return super().get_paginator(fuzzy, per_page, **kwargs)
+
+    def get_fuzzy_queryset(self, queryset, q):
+        matches = fuzzy_search(q)
+        if not matches:
+            return queryset.none()
+        ordering = Case(*[When(id=product_id, then=position) for position, (product_id, _) in enumerate(matches)])
+        return queryset.filter(id__in=[product_id for product_id, _ in matches]).order_by(ordering)
+
+
+@conditional_page(lambda request, product_id, **kwargs: product_validators(request, product_id))
+class ProductDetailView(PageCacheMixin, DataMixin, DetailView):
     model = Product
     context_object_name = 'product'
     template_name = 'shop/product/detail.html'
 
+    def get_page_cache_versions(self):
+        return [CATEGORIES_VERSION_KEY, PRODUCT_VERSION_KEY.format(self.kwargs['product_id'])]
+
+    def get_hole_context(self):
+        """Данные для кнопки и формы отзыва — они свои у каждого пользователя и в кэш страницы не попадают."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return {'can_review': False, 'has_reviewed': False}
+        # оставить отзыв можно на полученный товар (orders/purchases.py) и только один раз
+        can_review, has_reviewed = review_eligibility(user, self.kwargs['product_id'])
+        return {'can_review': can_review, 'has_reviewed': has_reviewed}
+
     def get_object(self, queryset=None):
         product_id = self.kwargs.get('product_id')
-        return get_object_or_404(Product, pk=product_id)
+        product = get_object_or_404(Product, pk=product_id)
+        category = category_registry.get(product.id_category_id)
+        if category is not None:
+            product.id_category = category  # категория из кэша процесса вместо отдельного запроса
+        return product
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = context['product']
-        user = self.request.user
+        if not self.defer_page_holes:  # иначе «дырки» заполняются при каждом запросе, см. PageCacheMixin
+            context.update(self.get_hole_context())
 
-        if user.is_authenticated:
-            # Проверяем, есть ли у пользователя заказы, содержащие этот продукт со статусом 'delivered'
-            orders_with_product = OrderProduct.objects.filter(
-                id_order__id_user=user,
-                id_product=product,
-                id_order__status='delivered'  # предполагаем, что статус 'delivered' обозначает доставленный заказ
-            ).exists()
-            context['can_review'] = orders_with_product
-
-            # Проверяем, оставлял ли пользователь уже отзыв на этот продукт
-            existing_review = Review.objects.filter(id_product=product, id_user=user).exists()
-            context['has_reviewed'] = existing_review
-        else:
-            context['can_review'] = False
-            context['has_reviewed'] = False
-
-        context['category'] = get_object_or_404(Category, id=self.kwargs['category_id'])
+        context['category'] = get_category_or_404(self.kwargs['category_id'])
+        # Первая страница отзывов; следующие подгружаются при прокрутке через product_reviews
+        context['reviews'] = get_review_page(product.pk, self.request.GET.get('reviews_cursor'))
+        context['recommendations'] = get_recommendations(product.pk)
         context['review_form'] = ReviewForm()
         context['cart_product_form'] = CartAddProductForm()
         return context
@@ -85,16 +138,17 @@ class ProductDetailView(DataMixin, DetailView):
         review_form = ReviewForm(request.POST)
 
         if review_form.is_valid() and request.user.is_authenticated:
-            # Проверяем, оставлял ли пользователь уже отзыв на этот продукт
-            existing_review = Review.objects.filter(id_product=product, id_user=request.user).exists()
-            if not existing_review:
-                # Создаем новый отзыв, если предыдущий не найден
-                Review.objects.create(
-                    id_product=product,
-                    id_user=request.user,
-                    rating=review_form.cleaned_data['rating'],
-                    text=review_form.cleaned_data['text']
-                )
+            if has_delivered_purchase(request.user.pk, product.pk):
+                try:
+                    with transaction.atomic():
+                        Review.objects.create(
+                            id_product=product,
+                            id_user=request.user,
+                            rating=review_form.cleaned_data['rating'],
+                            text=review_form.cleaned_data['text']
+                        )
+                except IntegrityError:
+                    pass  # отзыв уже есть — это проверяет уникальный индекс (id_product, id_user), без отдельного запроса
             return redirect(product.get_absolute_url())
 
         context = self.get_context_data()
@@ -102,26 +156,62 @@ class ProductDetailView(DataMixin, DetailView):
         return self.render_to_response(context)
 
 
-class ShopCategory(DataMixin, ListView):
+@conditional_page(lambda request, category_id: catalog_validators(request, category_id))
+class ShopCategory(PageCacheMixin, DataMixin, ListView):
     model = Product
     template_name = 'shop/product/list.html'
     context_object_name = 'products'
     allow_empty = True  # разрешаем отображение пустых категорий
 
+    def get_page_cache_versions(self):
+        versions = [CATEGORIES_VERSION_KEY, CATEGORY_VERSION_KEY.format(self.kwargs['category_id'])]
+        return versions + [SALES_VERSION_KEY] if get_ranking(self.request.GET) else versions
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.kwargs.get('category_id'):
-            category = get_object_or_404(Category, pk=self.kwargs['category_id'])
+            category = get_category_or_404(self.kwargs['category_id'])
             context['category'] = category  # Добавляем категорию в контекст
             context['title'] = 'Категория - ' + category.title.upper()
         else:
             context['title'] = 'Новинки'
+        context.update(self.get_facet_context(self.kwargs.get('category_id')))
         return context
 
     def get_queryset(self):
-        return Product.objects.filter(id_category_id=self.kwargs['category_id'])
+        return self.filter_by_facets(Product.objects.filter(id_category_id=self.kwargs['category_id']))
+
+
+def product_reviews(request, product_id):
+    """Следующая страница отзывов для ленты на странице товара: готовый HTML-фрагмент
+    и курсор следующей страницы (null, если отзывы закончились)."""
+    cursor = request.GET.get('cursor')
+    if not cursor and not Product.objects.filter(pk=product_id).exists():
+        raise Http404('Товар не найден')
+    page = get_review_page(product_id, cursor)
+    html = render_to_string('shop/product/review_list.html', {'reviews': page}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
 
 
 def about(request):
     return render(request, 'shop/product/about.html')
 
+
+def autocomplete(request):
+    """JSON-подсказки для строки поиска. Данные берутся из индекса в памяти процесса
+    (shop/autocomplete.py); база используется, только пока индекс строится после запуска воркера."""
+    prefix = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    suggestions = []
+    for item in suggest(prefix, limit=limit):
+        if item['type'] == 'title':
+            url = reverse('shop:product_detail', args=[item['category_id'], item['product_id']])
+        else:
+            url = reverse('shop:product_list') + '?' + urlencode({'q': item['value']})
+        suggestions.append({'type': item['type'], 'value': item['value'], 'url': url})
+    response = JsonResponse({'query': prefix, 'suggestions': suggestions})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
@@ -1,5 +1,5 @@
 from .models import *
-from shop.models import Category
+from shop.categories import get_categories
 
 class DataMixin:
     """
@@ -10,6 +10,5 @@ class DataMixin:
 
     def get_user_context(self, **kwargs):
         context = kwargs
-        categories = Category.objects.all()
-        context['categories'] = categories
+        context['categories'] = get_categories()
         return context
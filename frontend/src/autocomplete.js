@@ -0,0 +1,58 @@
+// Подсказки в строке поиска: запрос к shop:autocomplete на каждое нажатие клавиши
+// (с небольшой задержкой), предыдущий незавершенный запрос отменяется.
+const DEBOUNCE_MS = 120;
+
+function createList(input) {
+  const list = document.createElement('ul');
+  list.className = 'absolute left-0 right-0 mt-1 bg-white rounded-md shadow-lg z-50 py-1 text-sm hidden';
+  input.parentElement.appendChild(list);
+  return list;
+}
+
+function render(list, suggestions) {
+  list.innerHTML = '';
+  suggestions.forEach((item) => {
+    const li = document.createElement('li');
+    const link = document.createElement('a');
+    link.href = item.url;
+    link.className = 'flex items-center gap-2 px-4 py-2 text-gray-700 dropdown-item-hover';
+    const icon = document.createElement('i');
+    icon.className = item.type === 'author' ? 'bi bi-person text-gray-400' : 'bi bi-book text-gray-400';
+    link.append(icon, document.createTextNode(item.value));
+    li.appendChild(link);
+    list.appendChild(li);
+  });
+  list.classList.toggle('hidden', suggestions.length === 0);
+}
+
+function attach(input) {
+  const list = createList(input);
+  let timer = null;
+  let controller = null;
+
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (!query) {
+      render(list, []);
+      return;
+    }
+    timer = setTimeout(async () => {
+      if (controller) controller.abort();
+      controller = new AbortController();
+      try {
+        const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+        const response = await fetch(url, { signal: controller.signal });
+        if (response.ok) render(list, (await response.json()).suggestions);
+      } catch (error) {
+        if (error.name !== 'AbortError') render(list, []);
+      }
+    }, DEBOUNCE_MS);
+  });
+
+  input.addEventListener('blur', () => setTimeout(() => render(list, []), 150));
+}
+
+export function initAutocomplete() {
+  document.querySelectorAll('input[data-autocomplete-url]').forEach(attach);
+}
@@ -0,0 +1,99 @@
+// Корзина без перезагрузки страницы: формы с data-cart-api отправляются в JSON API корзины
+// (cart/views.py), а по ответу обновляются счетчик в шапке, строка и итоги на странице корзины.
+// Без JavaScript те же формы работают как обычно — POST и редирект на страницу корзины.
+function csrfToken(form) {
+  const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+  if (input) return input.value;
+  const cookie = document.cookie.split('; ').find((item) => item.startsWith('csrftoken='));
+  return cookie ? decodeURIComponent(cookie.split('=')[1]) : '';
+}
+
+function rubles(value) {
+  return `${Math.round(value)} ₽`;
+}
+
+function updateSummary(cart) {
+  document.querySelectorAll('[data-cart-count]').forEach((badge) => {
+    badge.textContent = cart.quantity;
+    badge.classList.toggle('hidden', cart.quantity === 0);
+  });
+  document.querySelectorAll('[data-cart-positions]').forEach((element) => {
+    element.textContent = cart.count;
+  });
+
+  const total = parseFloat(cart.total_price);
+  const totalElement = document.querySelector('[data-cart-total]');
+  if (totalElement) {
+    totalElement.dataset.cartTotal = cart.total_price;
+    totalElement.textContent = rubles(total);
+  }
+  const discount = document.querySelector('[data-cart-discount]');
+  const percent = discount ? parseFloat(discount.dataset.cartDiscount) : 0;
+  if (discount) discount.textContent = `-${rubles(total * percent / 100)}`;
+  const final = document.querySelector('[data-cart-final]');
+  if (final) final.textContent = rubles(total * (100 - percent) / 100);
+}
+
+function updateLine(element, line, percent) {
+  const total = parseFloat(line.total_price);
+  element.querySelector('[data-cart-line-total]').textContent = rubles(total);
+  const original = element.querySelector('[data-cart-line-original]');
+  if (original && percent < 100) original.textContent = rubles(total * 100 / (100 - percent));
+  element.querySelector('[data-cart-line-quantity]').textContent = line.quantity;
+  element.querySelectorAll('[data-cart-step]').forEach((button) => {
+    const quantity = line.quantity + parseInt(button.dataset.cartStep, 10);
+    button.value = quantity;
+    button.disabled = quantity < 1;
+    button.classList.toggle('opacity-50', quantity < 1);
+    button.classList.toggle('cursor-not-allowed', quantity < 1);
+  });
+}
+
+function showAdded(form) {
+  const label = form.querySelector('[data-cart-added-text]');
+  if (!label) return;
+  const text = label.textContent;
+  label.textContent = label.dataset.cartAddedText;
+  setTimeout(() => { label.textContent = text; }, 1500);
+}
+
+async function submit(form, submitter) {
+  const body = new FormData(form);
+  if (submitter && submitter.name) body.set(submitter.name, submitter.value);
+  const response = await fetch(form.dataset.cartApi, {
+    method: 'POST',
+    body,
+    headers: { 'X-CSRFToken': csrfToken(form), Accept: 'application/json' },
+  });
+  if (!response.ok) {
+    // ошибку покажет обычная обработка формы; requestSubmit сохраняет нажатую кнопку (name="quantity")
+    delete form.dataset.cartApi;
+    form.requestSubmit(submitter);
+    return;
+  }
+  const data = await response.json();
+  updateSummary(data.cart);
+
+  const element = form.closest('[data-cart-line]');
+  if (!element) {
+    showAdded(form);
+  } else if (data.cart.count === 0) {
+    window.location.reload();  // пустую корзину показывает шаблон
+  } else if (!data.line) {
+    element.remove();
+  } else {
+    const discount = document.querySelector('[data-cart-discount]');
+    updateLine(element, data.line, discount ? parseFloat(discount.dataset.cartDiscount) : 0);
+  }
+}
+
+export function initCart() {
+  document.addEventListener('submit', (event) => {
+    const form = event.target;
+    if (!(form instanceof HTMLFormElement) || !form.dataset.cartApi) return;
+    event.preventDefault();
+    if (form.dataset.loading) return;
+    form.dataset.loading = '1';
+    submit(form, event.submitter).finally(() => { delete form.dataset.loading; });
+  });
+}
@@ -1 +1,10 @@
 import './main.css';
+import { initAutocomplete } from './autocomplete.js';
+import { initCart } from './cart.js';
+import { initReviews } from './reviews.js';
+
+document.addEventListener('DOMContentLoaded', () => {
+  initAutocomplete();
+  initCart();
+  initReviews();
+});
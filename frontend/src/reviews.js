@@ -0,0 +1,39 @@
+// Лента отзывов на странице товара: следующая страница (HTML-фрагмент от shop:product_reviews)
+// подгружается, когда кнопка «Показать еще отзывы» появляется в зоне видимости или по клику на нее.
+async function loadNextPage(container, more) {
+  if (container.dataset.loading || !container.dataset.nextCursor) return;
+  container.dataset.loading = '1';
+  try {
+    const url = `${container.dataset.reviewsUrl}?cursor=${encodeURIComponent(container.dataset.nextCursor)}`;
+    const response = await fetch(url, { headers: { Accept: 'application/json' } });
+    if (!response.ok) return;
+    const data = await response.json();
+    container.insertAdjacentHTML('beforeend', data.html);
+    container.dataset.nextCursor = data.next_cursor || '';
+    if (!data.next_cursor && more) more.remove();
+  } finally {
+    delete container.dataset.loading;
+  }
+}
+
+export function initReviews() {
+  const container = document.getElementById('reviews');
+  const more = document.querySelector('[data-reviews-more]');
+  if (!container || !more) return;
+
+  more.addEventListener('click', (event) => {
+    event.preventDefault();
+    loadNextPage(container, more);
+  });
+
+  if ('IntersectionObserver' in window) {
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries.some((entry) => entry.isIntersecting)) return;
+      await loadNextPage(container, more);
+      // кнопка может остаться в зоне видимости — переподписываемся, чтобы получить событие снова
+      observer.unobserve(more);
+      if (container.dataset.nextCursor) observer.observe(more);
+    }, { rootMargin: '300px' });
+    observer.observe(more);
+  }
+}